@@ -52,7 +52,7 @@ def register_extensions(app):
 # 注册蓝图
 def register_blueprints(app):
     # 导入蓝图
-    from .api import auth_bp, user_manage_bp, activity_bp, monitor_bp, copy_trade_bp
+    from .api import auth_bp, user_manage_bp, activity_bp, monitor_bp, copy_trade_bp, metrics_bp
     
     # 注册蓝图
     app.register_blueprint(auth_bp, url_prefix='/api/v1/auth')
@@ -60,3 +60,4 @@ def register_blueprints(app):
     app.register_blueprint(activity_bp, url_prefix='/api/v1/activity')
     app.register_blueprint(monitor_bp, url_prefix='/api/v1/monitor')
     app.register_blueprint(copy_trade_bp, url_prefix='/api/v1/copy-trade')
+    app.register_blueprint(metrics_bp, url_prefix='/api/v1/metrics')
@@ -6,6 +6,7 @@ user_manage_bp = Blueprint('user_manage', __name__)
 activity_bp = Blueprint('activity', __name__)
 monitor_bp = Blueprint('monitor', __name__)
 copy_trade_bp = Blueprint('copy_trade', __name__)
+metrics_bp = Blueprint('metrics', __name__)
 
 # 导入路由
 from . import auth
@@ -13,3 +14,4 @@ from . import user_manage
 from . import activity
 from . import monitor
 from . import copy_trade
+from . import metrics
@@ -1,10 +1,16 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from . import activity_bp
 from app.utils.auth_util import require_login, require_module_permission
 from app.utils.request_util import fetch_latest_trades
-from app.utils.dedup_util import get_unique_key, deduplicate_data
-from app.models import ActivityRecord
+from app.utils.rate_limit import PRIORITY_QUERY
+from app.utils.dedup_util import deduplicate_data
+from app.models import BackfillJob
+from app.services.backfill import start_backfill, cancel_backfill
+from app.services.write_behind import write_behind
 from app.extensions import db
+from app.config import Config
+from app.utils.cache_util import TwoTierCache, normalize_cache_key
+from app.utils.metrics_util import register_metrics
 import logging
 
 # 设置日志记录器
@@ -13,6 +19,32 @@ logger = logging.getLogger(__name__)
 # 默认输出字段
 DEFAULT_OUTPUT_FIELDS = ['timestamp', 'asset', 'side', 'size', 'price', 'transaction_hash']
 
+# /activity/query的两级响应缓存
+activity_cache = TwoTierCache(
+    'activity_query',
+    local_ttl=Config.ACTIVITY_CACHE_LOCAL_TTL,
+    shared_ttl=Config.ACTIVITY_CACHE_SHARED_TTL,
+    local_maxsize=Config.ACTIVITY_CACHE_LOCAL_MAXSIZE
+)
+register_metrics('activity_cache', activity_cache.stats)
+
+def load_activity(params, target_user):
+    """请求上游获取活动数据，去重后持久化，返回去重后的交易列表"""
+    # 调用Polymarket API获取最新交易数据
+    logger.info(f"Fetching latest trades with params {params}")
+    trades_data = fetch_latest_trades(params, priority=PRIORITY_QUERY)
+    logger.info(f"API returned {len(trades_data)} records")
+    
+    # 数据去重
+    unique_trades = deduplicate_data(trades_data)
+    logger.info(f"Deduplicated data: {len(unique_trades)} unique records from {len(trades_data)} total")
+    
+    # 数据持久化交给后写式写入器，不阻塞查询响应
+    write_behind.start(current_app._get_current_object())
+    write_behind.submit_activity(unique_trades, target_user)
+    
+    return unique_trades
+
 @activity_bp.route('/query', methods=['GET'])
 @require_login
 @require_module_permission('activity_query')
@@ -77,22 +109,9 @@ def query_activity():
         if type:
             params['type'] = type
         
-        # 调用Polymarket API获取最新交易数据
-        logger.info(f"Fetching latest trades for user {target_user}, limit {limit}, offset {offset}, type {type or 'TRADE'}")
-        trades_data = fetch_latest_trades(params)
-        logger.info(f"API returned {len(trades_data)} records")
-        if trades_data:
-            logger.debug(f"First trade sample: {trades_data[0]}")
-        
-        # 数据去重
-        unique_trades = deduplicate_data(trades_data)
-        logger.info(f"Deduplicated data: {len(unique_trades)} unique records from {len(trades_data)} total")
-        if unique_trades:
-            logger.debug(f"First unique trade sample: {unique_trades[0]}")
-        
-        # 添加调试日志：检查去重后的数据是否包含预期字段
-        if unique_trades:
-            logger.debug(f"All fields in first unique trade: {list(unique_trades[0].keys())}")
+        # 读取两级缓存，未命中时请求上游并持久化（相同查询并发时只请求一次）
+        cache_key = normalize_cache_key(params)
+        unique_trades = activity_cache.get_or_load(cache_key, lambda: load_activity(params, target_user))
         
         # 字段映射配置（后端字段 -> 前端字段）
         FIELD_MAPPING = {
@@ -106,45 +125,7 @@ def query_activity():
         logger.info(f"Field mapping: {FIELD_MAPPING}")
         logger.info(f"Request parameters: {dict(request.args)}")
         
-        # 确定最终输出字段
-        output_fields = fields if fields else DEFAULT_OUTPUT_FIELDS
-        
-        # 先处理数据持久化
-        new_records_count = 0
-        for trade in unique_trades:
-            # 生成唯一标识
-            unique_key = get_unique_key(trade)
-            
-            # 检查记录是否已存在
-            existing_record = ActivityRecord.query.filter_by(unique_key=unique_key).first()
-            if existing_record:
-                logger.debug(f"Record already exists: {unique_key}")
-                continue
-            
-            # 创建新记录
-            record = ActivityRecord(
-                target_user=target_user,
-                transaction_hash=trade.get('transactionHash'),
-                timestamp=trade.get('timestamp'),
-                asset=trade.get('tokenId') or trade.get('asset'),
-                side=trade.get('side'),
-                size=trade.get('size') or trade.get('usdcSize'),
-                price=trade.get('price'),
-                unique_key=unique_key
-            )
-            
-            # 添加到数据库
-            db.session.add(record)
-            new_records_count += 1
-        
-        # 提交数据库事务
-        if new_records_count > 0:
-            db.session.commit()
-            logger.info(f"Successfully saved {new_records_count} new activity records")
-        else:
-            logger.info("No new records to save")
-        
-        # 然后构建返回给前端的结果
+        # 构建返回给前端的结果
         results = []
         logger.info(f"Processing {len(unique_trades)} unique trades for response")
         
@@ -200,4 +181,136 @@ def query_activity():
             'code': 500,
             'msg': '查询失败',
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@activity_bp.route('/backfill/start', methods=['POST'])
+@require_login
+@require_module_permission('activity_query')
+def start_activity_backfill():
+    """启动（或恢复）钱包历史活动回填任务
+    
+    参数：
+        user: 目标用户钱包地址
+        start: 回填的最早时间戳（可选）
+    
+    返回：
+        回填任务信息
+    """
+    try:
+        data = request.get_json() or {}
+        target_user = data.get('user')
+        start_ts = data.get('start')
+        
+        # 参数验证
+        if not target_user:
+            return jsonify({
+                'code': 400,
+                'msg': 'user参数不能为空'
+            }), 400
+        
+        job = start_backfill(current_app._get_current_object(), target_user, int(start_ts) if start_ts else None)
+        
+        return jsonify({
+            'code': 200,
+            'msg': '回填任务已启动',
+            'data': job.to_dict()
+        })
+        
+    except Exception as e:
+        logger.error(f"Start backfill failed: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'code': 500,
+            'msg': '回填任务启动失败',
+            'error': str(e)
+        }), 500
+
+@activity_bp.route('/backfill/status', methods=['GET'])
+@require_login
+@require_module_permission('activity_query')
+def get_activity_backfill_status():
+    """获取回填任务进度
+    
+    参数：
+        job_id: 任务ID（可选）
+        user: 目标用户钱包地址（可选，返回该钱包的全部任务）
+    
+    返回：
+        回填任务列表
+    """
+    try:
+        job_id = request.args.get('job_id')
+        target_user = request.args.get('user')
+        
+        # 参数验证
+        if not job_id and not target_user:
+            return jsonify({
+                'code': 400,
+                'msg': 'job_id或user参数不能为空'
+            }), 400
+        
+        query = BackfillJob.query
+        if job_id:
+            query = query.filter_by(job_id=job_id)
+        if target_user:
+            query = query.filter_by(target_user=target_user.lower())
+        jobs = query.order_by(BackfillJob.id.desc()).all()
+        
+        return jsonify({
+            'code': 200,
+            'msg': '查询成功',
+            'data': [job.to_dict() for job in jobs]
+        })
+        
+    except Exception as e:
+        logger.error(f"Get backfill status failed: {str(e)}")
+        return jsonify({
+            'code': 500,
+            'msg': '查询失败',
+            'error': str(e)
+        }), 500
+
+@activity_bp.route('/backfill/cancel', methods=['POST'])
+@require_login
+@require_module_permission('activity_query')
+def cancel_activity_backfill():
+    """取消回填任务（当前批次完成后停止，检查点保留，可再次启动恢复）
+    
+    参数：
+        job_id: 任务ID
+    
+    返回：
+        回填任务信息
+    """
+    try:
+        data = request.get_json() or {}
+        job_id = data.get('job_id')
+        
+        # 参数验证
+        if not job_id:
+            return jsonify({
+                'code': 400,
+                'msg': 'job_id参数不能为空'
+            }), 400
+        
+        job = cancel_backfill(job_id)
+        if not job:
+            return jsonify({
+                'code': 404,
+                'msg': '回填任务不存在'
+            }), 404
+        
+        return jsonify({
+            'code': 200,
+            'msg': '回填任务正在取消',
+            'data': job.to_dict()
+        })
+        
+    except Exception as e:
+        logger.error(f"Cancel backfill failed: {str(e)}")
+        db.session.rollback()
+        return jsonify({
+            'code': 500,
+            'msg': '回填任务取消失败',
+            'error': str(e)
+        }), 500
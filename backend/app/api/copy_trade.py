@@ -1,11 +1,18 @@
-from flask import request, jsonify, current_app
+from flask import request, jsonify
 from flask_jwt_extended import get_jwt_identity
 from . import copy_trade_bp
 from app.utils.auth_util import require_login, require_module_permission
+from app.utils.db_router import use_replica
+from app.utils.projection_util import Projection, epoch
 from app.utils.encrypt_util import encrypt_str, decrypt_str
-from app.models import CopyTradeConfig, CopyTradeRecord
+from app.models import CopyTradeConfig, CopyTradeRecord, Asset, Wallet
 from app.extensions import db
-from app.utils.request_util import fetch_latest_trades
+from app.services.ingest_engine import subscribe, unsubscribe
+from app.services.write_behind import write_behind
+from app.services.cold_archive import with_archived, column_bound
+from app.services.copy_trade_stats import get_copy_trade_stat as read_copy_trade_stat, copied_target_tx_hashes
+from app.utils.dedup_util import HighWaterMark
+from app.utils.rate_limit import PRIORITY_COPY_TRADE
 import logging
 import threading
 import time
@@ -14,6 +21,32 @@ import uuid
 # 设置日志记录器
 logger = logging.getLogger(__name__)
 
+# 跟单记录的列投影（timestamp为创建时间的秒级时间戳，钱包地址、代币ID和事件信息从维度表取）
+RECORD_PROJECTION = Projection(
+    [
+        CopyTradeRecord.id,
+        CopyTradeRecord.task_id,
+        Wallet.address.label('target_user'),
+        CopyTradeRecord.target_tx_hash,
+        CopyTradeRecord.tx_hash,
+        CopyTradeRecord.amount,
+        CopyTradeRecord.price,
+        CopyTradeRecord.size,
+        CopyTradeRecord.side,
+        Asset.token_id,
+        Asset.event_title,
+        Asset.event_slug,
+        CopyTradeRecord.status,
+        CopyTradeRecord.created_at,
+        CopyTradeRecord.created_at.label('timestamp')
+    ],
+    {'created_at': epoch, 'timestamp': epoch},
+    joins=[
+        (Wallet, Wallet.id == CopyTradeRecord.wallet_id),
+        (Asset, Asset.id == CopyTradeRecord.asset_id)
+    ]
+)
+
 # 内存中的跟单任务字典
 copy_trade_tasks = {}
 # 跟单任务线程字典
@@ -36,7 +69,6 @@ def copy_trade_worker(task_id, target_user, my_proxy_wallet, pk, poll_seconds=1)
     from py_clob_client.clob_types import OrderArgs, OrderType
     from py_clob_client.order_builder.constants import BUY, SELL
     from py_clob_client.exceptions import PolyApiException
-    import requests
     
     # 创建Flask应用实例（用于线程中的应用上下文）
     flask_app = create_app()
@@ -56,36 +88,29 @@ def copy_trade_worker(task_id, target_user, my_proxy_wallet, pk, poll_seconds=1)
             )
             client.set_api_creds(client.create_or_derive_api_creds())
             
-            # 初始化：读取当前记录，建立"已见集合"
-            seen = set()
-            params = {'user': target_user, 'type': 'TRADE', 'limit': 100, 'sortBy': 'TIMESTAMP', 'sortDirection': 'DESC'}
-            activity_list = fetch_latest_trades(params)
-            
-            for it in activity_list:
-                tx = it.get('transactionHash')
-                if tx:
-                    seen.add(tx)
+            # 跟单记录交给后写式写入器，数据库延迟不阻塞下单
+            write_behind.start(flask_app)
             
-            logger.info(f"Initialized copy trade. Loaded {len(activity_list)} latest trades. Start monitoring...")
+            # 读取已持久化的高水位，订阅钱包轮询器（同一钱包的多个跟单配置共享一次请求）
+            config = CopyTradeConfig.query.filter_by(task_id=task_id).first()
+            cursor = HighWaterMark.from_columns(config.hwm_timestamp, config.hwm_tx_hashes) if config else None
+            subscription = subscribe(target_user, task_id, poll_seconds, cursor=cursor, priority=PRIORITY_COPY_TRADE)
+            cursor = cursor or HighWaterMark()
+            logger.info("Initialized copy trade. Start monitoring...")
             
-            # 持续轮询
+            # 持续接收新交易
             while copy_trade_tasks.get(task_id, {}).get('status') == 'running':
                 try:
-                    # 获取最新交易数据
-                    params = {'user': target_user, 'type': 'TRADE', 'limit': 100, 'sortBy': 'TIMESTAMP', 'sortDirection': 'DESC'}
-                    new_list = fetch_latest_trades(params)
+                    new_items = subscription.get(timeout=poll_seconds)
                     
-                    # 找出新记录
-                    new_items = []
-                    for it in new_list:
-                        tx = it.get('transactionHash')
-                        if tx and tx not in seen:
-                            new_items.append(it)
-                            seen.add(tx)
+                    # 去重窗口淘汰过标识的时间范围内的交易可能已跟单，按已写入的跟单记录过滤
+                    unverified = cursor.unverified(new_items)
+                    if unverified:
+                        copied = copied_target_tx_hashes(task_id, [it.get("transactionHash") for it in unverified])
+                        new_items = [it for it in new_items if not it.get("transactionHash") or it["transactionHash"] not in copied]
                     
                     # 有新记录就处理跟单
                     if new_items:
-                        new_items.sort(key=lambda x: x.get('timestamp', 0))
                         for it in new_items:
                             try:
                                 # 从 activity 提取字段
@@ -93,7 +118,8 @@ def copy_trade_worker(task_id, target_user, my_proxy_wallet, pk, poll_seconds=1)
                                 target_size = float(it["size"])
                                 target_side = it["side"]
                                 token_id = str(it["asset"])
-                                target_tx_hash = it.get("transactionHash", "")
+                                # 没有交易哈希时记为NULL，不与唯一约束(task_id, target_tx_hash)中的其他记录冲突
+                                target_tx_hash = it.get("transactionHash") or None
                                 
                                 # 构造跟单参数
                                 order_args = OrderArgs(
@@ -112,7 +138,7 @@ def copy_trade_worker(task_id, target_user, my_proxy_wallet, pk, poll_seconds=1)
                                 status = resp.get('status', 'unknown')
                                 
                                 # 保存到数据库
-                                record = CopyTradeRecord(
+                                record = dict(
                                     task_id=task_id,
                                     target_user=target_user,
                                     target_tx_hash=target_tx_hash,
@@ -126,18 +152,17 @@ def copy_trade_worker(task_id, target_user, my_proxy_wallet, pk, poll_seconds=1)
                                     event_slug=it.get('slug', ''),
                                     status='success' if status in ['live', 'matched'] else 'failed'
                                 )
-                                db.session.add(record)
-                                db.session.commit()
+                                write_behind.submit_copy_trade(record)
                                 
                                 logger.info(f"Copy trade completed: target={target_user}, tx={target_tx_hash}, status={status}")
                                 
                             except PolyApiException as e:
                                 logger.error(f"Copy trade failed (PolyApiException): {str(e)}")
                                 # 记录失败交易
-                                record = CopyTradeRecord(
+                                record = dict(
                                     task_id=task_id,
                                     target_user=target_user,
-                                    target_tx_hash=it.get("transactionHash", ""),
+                                    target_tx_hash=it.get("transactionHash") or None,
                                     tx_hash=f"failed_{uuid.uuid4()}",
                                     amount=0,
                                     price=float(it.get("price", 0)),
@@ -148,15 +173,14 @@ def copy_trade_worker(task_id, target_user, my_proxy_wallet, pk, poll_seconds=1)
                                     event_slug=it.get('slug', ''),
                                     status='failed'
                                 )
-                                db.session.add(record)
-                                db.session.commit()
+                                write_behind.submit_copy_trade(record)
                             except Exception as e:
                                 logger.error(f"Copy trade failed (Exception): {str(e)}")
                                 # 记录失败交易
-                                record = CopyTradeRecord(
+                                record = dict(
                                     task_id=task_id,
                                     target_user=target_user,
-                                    target_tx_hash=it.get("transactionHash", ""),
+                                    target_tx_hash=it.get("transactionHash") or None,
                                     tx_hash=f"failed_{uuid.uuid4()}",
                                     amount=0,
                                     price=float(it.get("price", 0)),
@@ -167,14 +191,16 @@ def copy_trade_worker(task_id, target_user, my_proxy_wallet, pk, poll_seconds=1)
                                     event_slug=it.get('slug', ''),
                                     status='failed'
                                 )
-                                db.session.add(record)
-                                db.session.commit()
-                    
-                    time.sleep(poll_seconds)
+                                write_behind.submit_copy_trade(record)
+                        
+                        # 推进跟单配置的高水位（在本批跟单记录之后写入）
+                        cursor.advance(new_items)
+                        write_behind.submit_cursor(CopyTradeConfig, task_id, cursor.to_columns())
                 
                 except Exception as e:
                     logger.error(f"Error in copy_trade_worker for task {task_id}: {str(e)}")
-                    time.sleep(poll_seconds * 2)
+                    db.session.rollback()
+                    time.sleep(poll_seconds)
             
             logger.info(f"Copy trade task {task_id} stopped")
             
@@ -188,6 +214,8 @@ def copy_trade_worker(task_id, target_user, my_proxy_wallet, pk, poll_seconds=1)
                     db.session.commit()
             except:
                 pass
+        finally:
+            unsubscribe(task_id)
 
 @copy_trade_bp.route('/config', methods=['POST'])
 @require_login
@@ -224,7 +252,10 @@ def save_copy_trade_config():
         user_id = get_jwt_identity()
         config = CopyTradeConfig.query.filter_by(user_id=user_id).first()
         if config:
-            # 更新现有配置
+            # 更新现有配置；更换目标钱包时原钱包的高水位不再适用
+            if config.target_user != target_user:
+                config.hwm_timestamp = None
+                config.hwm_tx_hashes = None
             config.target_user = target_user
             config.my_proxy_wallet = wallet_address
             config.pk_encrypted = private_key_encrypted
@@ -268,10 +299,18 @@ def save_copy_trade_config():
 def start_copy_trade():
     """启动自动跟单任务
     
+    参数：
+        fresh: 可选，为true时清空高水位，从目标钱包的最新交易开始跟单；
+            默认从上次停止时处理到的位置继续（停止期间的交易会被补跟）
+    
     返回：
         任务启动结果
     """
     try:
+        # 获取请求参数（请求体可以为空）
+        data = request.get_json(silent=True) or {}
+        fresh = bool(data.get('fresh', False))
+        
         # 获取当前登录用户
         user_id = get_jwt_identity()
         
@@ -296,9 +335,12 @@ def start_copy_trade():
         # 生成任务ID
         task_id = str(uuid.uuid4())
         
-        # 更新配置
+        # 更新配置；保留高水位从上次停止的位置继续，要求重新开始时才清空
         config.task_id = task_id
         config.status = 'running'
+        if fresh:
+            config.hwm_timestamp = None
+            config.hwm_tx_hashes = None
         db.session.commit()
         
         # 保存任务到内存
@@ -394,6 +436,7 @@ def stop_copy_trade():
 @copy_trade_bp.route('/stat', methods=['GET'])
 @require_login
 @require_module_permission('copy_trade')
+@use_replica
 def get_copy_trade_stat():
     """获取跟单统计信息
     
@@ -412,10 +455,8 @@ def get_copy_trade_stat():
                 'msg': '未找到跟单配置'
             }), 404
         
-        # 查询交易记录获取统计信息
-        total_trades = CopyTradeRecord.query.filter_by(task_id=config.task_id).count()
-        success_trades = CopyTradeRecord.query.filter_by(task_id=config.task_id, status='success').count()
-        failed_trades = CopyTradeRecord.query.filter_by(task_id=config.task_id, status='failed').count()
+        # 读取随跟单记录增量维护的任务统计
+        stat = read_copy_trade_stat(config.task_id)
         
         logger.info(f"Retrieved copy trade stats for user {user_id}")
         
@@ -423,9 +464,11 @@ def get_copy_trade_stat():
             'code': 200,
             'msg': '统计信息获取成功',
             'data': {
-                'total_trades': total_trades,
-                'success_trades': success_trades,
-                'failed_trades': failed_trades
+                'total_trades': stat['total_trades'],
+                'success_trades': stat['success_trades'],
+                'failed_trades': stat['failed_trades'],
+                'volume': stat['volume'],
+                'last_trade_at': stat['last_trade_at']
             }
         })
         
@@ -440,14 +483,17 @@ def get_copy_trade_stat():
 @copy_trade_bp.route('/records', methods=['GET'])
 @require_login
 @require_module_permission('copy_trade')
+@use_replica
 def get_copy_trade_records():
     """获取跟单据
     
     参数：
         limit: 限制条数
+        start: 可选，创建时间下限（秒级时间戳）
+        end: 可选，创建时间上限（秒级时间戳）
     
     返回：
-        跟单据列表
+        跟单据列表（target_user为小写的钱包地址）
     """
     try:
         # 获取当前登录用户
@@ -463,15 +509,23 @@ def get_copy_trade_records():
         
         # 获取请求参数
         limit = request.args.get('limit', 50, type=int)
-        
-        # 查询交易记录
-        records = CopyTradeRecord.query.filter_by(task_id=config.task_id)\
-            .order_by(CopyTradeRecord.created_at.desc())\
-            .limit(limit)\
-            .all()
+        start = request.args.get('start', type=int)
+        end = request.args.get('end', type=int)
+        
+        # 查询交易记录（只查询投影列）
+        query = RECORD_PROJECTION.select().where(CopyTradeRecord.task_id == config.task_id)
+        if start is not None:
+            query = query.where(CopyTradeRecord.created_at >= column_bound('created_at', start))
+        if end is not None:
+            query = query.where(CopyTradeRecord.created_at <= column_bound('created_at', end))
+        records = RECORD_PROJECTION.fetch(
+            query.order_by(CopyTradeRecord.created_at.desc(), CopyTradeRecord.id.desc()).limit(limit)
+        )
+        # 时间范围早于归档水位时合并冷数据归档中的记录
+        records = with_archived('copy_trade_record', records, start, end, {'task_id': config.task_id}, limit=limit)[:limit]
         
         # 转换为字典列表
-        record_list = [record.to_dict() for record in records]
+        record_list = RECORD_PROJECTION.to_dicts(records)
         
         logger.info(f"Retrieved {len(record_list)} copy trade records for user {user_id}")
         
@@ -0,0 +1,28 @@
+from flask import jsonify
+from . import metrics_bp
+from app.utils.auth_util import require_super_admin
+from app.utils.metrics_util import collect_metrics
+import logging
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+
+@metrics_bp.route('', methods=['GET'])
+@require_super_admin
+def get_metrics():
+    """获取运行指标接口（缓存命中率、采集引擎状态等）"""
+    try:
+        return jsonify({
+            'code': 200,
+            'msg': '获取运行指标成功',
+            'data': collect_metrics()
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"获取运行指标失败: {str(e)}")
+        return jsonify({
+            'code': 500,
+            'msg': '获取运行指标失败，请稍后重试',
+            'data': None
+        }), 500
@@ -1,134 +1,41 @@
 from flask import request, jsonify, current_app
 from . import monitor_bp
 from app.utils.auth_util import require_login, require_module_permission
-from app.models import MonitorTask, ActivityRecord
+from app.utils.db_router import use_replica
+from app.utils.pagination_util import encode_cursor, decode_cursor, keyset_before, record_key
+from app.utils.projection_util import Projection, epoch
+from app.utils.dedup_util import HighWaterMark
+from app.models import MonitorTask, ActivityRecord, Asset, Wallet
 from app.extensions import db
-from app.utils.request_util import fetch_latest_trades
-from app.utils.dedup_util import get_unique_key, deduplicate_data
+from app.services.ingest_engine import ingest_engine
+from app.services.cold_archive import with_archived
 import logging
-import threading
-import time
 import uuid
 
 # 设置日志记录器
 logger = logging.getLogger(__name__)
 
-# 内存中的监控任务字典
-monitoring_tasks = {}
-# 监控任务线程字典
-monitoring_threads = {}
-
-def monitor_worker(task_id, target_user, poll_seconds):
-    """监控工作线程
-    
-    持续轮询Polymarket API获取最新交易数据，数据去重后持久化到activity_record表
-    
-    参数：
-        task_id: 任务ID
-        target_user: 目标用户钱包地址
-        poll_seconds: 轮询间隔（秒）
-    """
-    # 延迟导入避免循环依赖
-    from app import create_app
-    
-    # 创建Flask应用实例（用于线程中的应用上下文）
-    flask_app = create_app()
-    
-    # 在Flask应用上下文中运行
-    with flask_app.app_context():
-        logger.info(f"Starting activity monitoring for user {target_user}, task_id: {task_id}, poll interval: {poll_seconds}s")
-        
-        # 初始化：读取当前记录，建立"已见集合"
-        try:
-            params = {'user': target_user, 'type': 'TRADE', 'limit': 100, 'sortBy': 'TIMESTAMP', 'sortDirection': 'DESC'}
-            activity_list = fetch_latest_trades(params)
-            
-            # 用 transactionHash 去重
-            seen = set()
-            for it in activity_list:
-                tx = it.get('transactionHash')
-                if tx:
-                    seen.add(tx)
-                else:
-                    seen.add((it.get('timestamp'), it.get('asset'), it.get('side'), it.get('size'), it.get('price')))
-            
-            logger.info(f"Initialized. Loaded {len(activity_list)} latest trades. Start monitoring...")
-            
-            # 持续轮询
-            while monitoring_tasks.get(task_id, {}).get('status') == 'running':
-                try:
-                    # 获取最新交易数据
-                    params = {'user': target_user, 'type': 'TRADE', 'limit': 100, 'sortBy': 'TIMESTAMP', 'sortDirection': 'DESC'}
-                    new_list = fetch_latest_trades(params)
-                    
-                    # 找出新记录
-                    new_items = []
-                    for it in new_list:
-                        tx = it.get('transactionHash')
-                        key = tx if tx else (it.get('timestamp'), it.get('asset'), it.get('side'), it.get('size'), it.get('price'))
-                        if key not in seen:
-                            new_items.append(it)
-                    
-                    # 有新记录就保存到数据库
-                    if new_items:
-                        new_items.sort(key=lambda x: x.get('timestamp', 0))
-                        saved_count = 0
-                        
-                        for it in new_items:
-                            # 生成唯一标识
-                            unique_key = get_unique_key(it)
-                            
-                            # 检查记录是否已存在
-                            existing_record = ActivityRecord.query.filter_by(unique_key=unique_key).first()
-                            if existing_record:
-                                continue
-                            
-                            # 创建新记录
-                            record = ActivityRecord(
-                                task_id=task_id,
-                                target_user=target_user,
-                                transaction_hash=it.get('transactionHash'),
-                                timestamp=it.get('timestamp'),
-                                asset=it.get('asset'),
-                                side=it.get('side'),
-                                size=it.get('size'),
-                                price=it.get('price'),
-                                unique_key=unique_key
-                            )
-                            
-                            # 添加到数据库
-                            db.session.add(record)
-                            saved_count += 1
-                            
-                            # 更新 seen
-                            tx = it.get('transactionHash')
-                            if tx:
-                                seen.add(tx)
-                            else:
-                                seen.add((it.get('timestamp'), it.get('asset'), it.get('side'), it.get('size'), it.get('price')))
-                        
-                        if saved_count > 0:
-                            db.session.commit()
-                            logger.info(f"Saved {saved_count} new activity records for task {task_id}")
-                    
-                    time.sleep(poll_seconds)
-                
-                except Exception as e:
-                    logger.error(f"Error in monitor_worker for task {task_id}: {str(e)}")
-                    time.sleep(poll_seconds * 2)
-            
-            logger.info(f"Monitoring task {task_id} stopped")
-        
-        except Exception as e:
-            logger.error(f"Monitoring task {task_id} failed: {str(e)}")
-            # 更新任务状态为失败
-            try:
-                task = MonitorTask.query.filter_by(task_id=task_id).first()
-                if task:
-                    task.status = 'failed'
-                    db.session.commit()
-            except:
-                pass
+# 监控日志的列投影（展示用的message、level等字段由前端拼接，钱包地址和代币ID从维度表取）
+LOG_PROJECTION = Projection(
+    [
+        ActivityRecord.id,
+        ActivityRecord.task_id,
+        Wallet.address.label('target_user'),
+        ActivityRecord.transaction_hash,
+        ActivityRecord.timestamp,
+        Asset.token_id.label('asset'),
+        ActivityRecord.side,
+        ActivityRecord.size,
+        ActivityRecord.price,
+        ActivityRecord.unique_key,
+        ActivityRecord.created_at
+    ],
+    {'unique_key': bytes.hex, 'created_at': epoch},
+    joins=[
+        (Wallet, Wallet.id == ActivityRecord.wallet_id),
+        (Asset, Asset.id == ActivityRecord.asset_id)
+    ]
+)
 
 @monitor_bp.route('/start', methods=['POST'])
 @require_login
@@ -138,7 +45,9 @@ def start_monitor():
     
     参数：
         user: 目标用户钱包地址
-        poll_seconds: 轮询间隔（秒）
+        poll_seconds: 轮询间隔（秒）。钱包连续无新交易时轮询会逐步放慢，最长为该值的
+            POLL_BACKOFF_MAX_MULTIPLE倍且不超过POLL_MAX_SECONDS；发现新交易后恢复
+        task_id: 可选，重新启动已有的任务，从该任务已持久化的高水位继续采集
     
     返回：
         任务ID和监控状态
@@ -166,33 +75,36 @@ def start_monitor():
                 'msg': 'poll_seconds参数必须在1-300之间'
             }), 400
         
-        # 生成任务ID
-        task_id = str(uuid.uuid4())
-        
-        # 保存任务信息到数据库
-        monitor_task = MonitorTask(
-            task_id=task_id,
-            target_user=target_user,
-            poll_seconds=poll_seconds,
-            status='running'
-        )
-        db.session.add(monitor_task)
+        task_id = data.get('task_id')
+        monitor_task = MonitorTask.query.filter_by(task_id=task_id).first() if task_id else None
+        if task_id and (not monitor_task or monitor_task.target_user != target_user):
+            return jsonify({
+                'code': 404,
+                'msg': '监控任务不存在'
+            }), 404
+        if monitor_task:
+            if ingest_engine.has_task(task_id):
+                return jsonify({
+                    'code': 400,
+                    'msg': '监控任务已在运行'
+                }), 400
+            monitor_task.poll_seconds = poll_seconds
+            monitor_task.status = 'running'
+        else:
+            # 生成任务ID，保存任务信息到数据库
+            task_id = str(uuid.uuid4())
+            monitor_task = MonitorTask(
+                task_id=task_id,
+                target_user=target_user,
+                poll_seconds=poll_seconds,
+                status='running'
+            )
+            db.session.add(monitor_task)
+        cursor = HighWaterMark.from_columns(monitor_task.hwm_timestamp, monitor_task.hwm_tx_hashes)
         db.session.commit()
         
-        # 保存任务到内存
-        monitoring_tasks[task_id] = {
-            'target_user': target_user,
-            'poll_seconds': poll_seconds,
-            'status': 'running',
-            'created_at': time.time()
-        }
-        
-        # 启动监控线程
-        thread = threading.Thread(target=monitor_worker, args=(task_id, target_user, poll_seconds), daemon=True)
-        thread.start()
-        monitoring_threads[task_id] = thread
-        
-        logger.info(f"Started monitoring task {task_id} for user {target_user}, poll every {poll_seconds} seconds")
+        # 交给采集引擎：共享钱包轮询，新交易由写入线程持久化（从已持久化的高水位继续）
+        ingest_engine.start_task(current_app._get_current_object(), task_id, target_user, poll_seconds, cursor=cursor)
         
         return jsonify({
             'code': 200,
@@ -245,9 +157,8 @@ def stop_monitor():
                 'msg': '监控任务不存在'
             }), 404
         
-        # 更新内存中的任务状态
-        if task_id in monitoring_tasks:
-            monitoring_tasks[task_id]['status'] = 'stopped'
+        # 从采集引擎中移除任务
+        ingest_engine.stop_task(task_id)
         
         # 更新数据库中的任务状态
         task.status = 'stopped'
@@ -276,18 +187,31 @@ def stop_monitor():
 @monitor_bp.route('/logs', methods=['GET'])
 @require_login
 @require_module_permission('activity_monitor')
+@use_replica
 def get_monitor_logs():
     """获取监控日志
     
+    按(created_at, id)倒序分页返回，翻页和增量查询的代价与任务历史长度无关。
+    
     参数：
         task_id: 任务ID
+        limit: 可选，每页条数（默认100，最大1000）
+        cursor: 可选，上一页返回的next_cursor，获取更早的日志
+        since_id: 可选，只返回id大于该值的新日志（增量刷新）
+        start: 可选，交易时间戳下限（秒）
+        end: 可选，交易时间戳上限（秒）
     
     返回：
-        监控日志列表
+        监控日志列表（created_at为秒级时间戳，target_user为小写的钱包地址）、下一页游标next_cursor和最新日志id latest_id
     """
     try:
         # 获取请求参数
         task_id = request.args.get('task_id')
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        cursor = request.args.get('cursor')
+        since_id = request.args.get('since_id', type=int)
+        start = request.args.get('start', type=int)
+        end = request.args.get('end', type=int)
         
         # 参数验证
         if not task_id:
@@ -295,6 +219,13 @@ def get_monitor_logs():
                 'code': 400,
                 'msg': 'task_id参数不能为空'
             }), 400
+        try:
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({
+                'code': 400,
+                'msg': str(e)
+            }), 400
         
         # 查找监控任务
         task = MonitorTask.query.filter_by(task_id=task_id).first()
@@ -304,18 +235,41 @@ def get_monitor_logs():
                 'msg': '监控任务不存在'
             }), 404
         
-        # 获取监控日志（activity_record表数据）
-        logs = ActivityRecord.query.filter_by(task_id=task_id).order_by(ActivityRecord.created_at.desc()).all()
+        # 获取监控日志（activity_record表数据，只查询投影列）
+        query = LOG_PROJECTION.select().where(ActivityRecord.task_id == task_id)
+        # 按交易时间范围过滤，activity_record分区后只扫描相关分区
+        if start is not None:
+            query = query.where(ActivityRecord.timestamp >= start)
+        if end is not None:
+            query = query.where(ActivityRecord.timestamp <= end)
+        
+        next_cursor = None
+        has_more = False
+        if since_id is not None:
+            # 增量模式：从since_id之后按id正序取一页，客户端在has_more时继续拉取
+            logs = LOG_PROJECTION.fetch(
+                query.where(ActivityRecord.id > since_id)
+                .order_by(ActivityRecord.id.asc())
+                .limit(limit + 1)
+            )
+            has_more = len(logs) > limit
+            logs = list(reversed(logs[:limit]))
+        else:
+            if before is not None:
+                query = query.where(keyset_before(ActivityRecord, before))
+            logs = LOG_PROJECTION.fetch(
+                query.order_by(ActivityRecord.created_at.desc(), ActivityRecord.id.desc())
+                .limit(limit + 1)
+            )
+            # 时间范围早于归档水位时合并冷数据归档中的记录
+            logs = with_archived('activity_record', logs, start, end, {'task_id': task_id}, before=before, limit=limit + 1)
+            has_more = len(logs) > limit
+            logs = logs[:limit]
+            if has_more:
+                next_cursor = encode_cursor(*record_key(logs[-1]))
         
-        # 转换为字典列表
-        log_list = []
-        for log in logs:
-            log_dict = log.to_dict()
-            # 添加前端需要的字段
-            log_dict['level'] = 'info'
-            log_dict['message'] = f"{log.side} {log.size} {log.asset} @ {log.price}"
-            log_dict['user_address'] = log.target_user
-            log_list.append(log_dict)
+        # 转换为字典列表（created_at为秒级时间戳）
+        log_list = LOG_PROJECTION.to_dicts(logs)
         
         logger.info(f"Retrieved {len(log_list)} logs for task {task_id}")
         
@@ -326,7 +280,10 @@ def get_monitor_logs():
                 'task_id': task_id,
                 'target_user': task.target_user,
                 'logs': log_list,
-                'total': len(log_list)
+                'total': len(log_list),
+                'next_cursor': next_cursor,
+                'has_more': has_more,
+                'latest_id': max([log.id for log in logs] + [since_id or 0]) or None
             }
         })
         
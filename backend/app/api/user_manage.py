@@ -2,53 +2,73 @@ from flask import request, jsonify
 from . import user_manage_bp
 from app.models import User
 from app.utils.auth_util import require_super_admin
+from app.utils.db_router import use_replica
+from app.utils.projection_util import Projection, epoch
 from app.utils.encrypt_util import encrypt_pwd
 from app.extensions import db
+from sqlalchemy import func, select
 import logging
 
 # 设置日志记录器
 logger = logging.getLogger(__name__)
 
+# 用户列表的列投影（created_at、updated_at为秒级时间戳）
+USER_PROJECTION = Projection(
+    [
+        User.id,
+        User.username,
+        User.status,
+        User.is_super_admin,
+        User.activity_query,
+        User.activity_monitor,
+        User.copy_trade,
+        User.created_at,
+        User.updated_at
+    ],
+    {'created_at': epoch, 'updated_at': epoch}
+)
+
 
 @user_manage_bp.route('/list', methods=['GET'])
 @require_super_admin
+@use_replica
 def get_user_list():
     """获取用户列表接口"""
     try:
         # 获取请求参数
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = max(int(request.args.get('per_page', 10)), 1)
         username = request.args.get('username', '')
         
-        # 构建查询
-        query = User.query.filter_by(is_super_admin=False)
+        # 构建查询条件
+        conditions = [User.is_super_admin.is_(False)]
         
         # 模糊查询用户名
         if username:
-            query = query.filter(User.username.like(f'%{username}%'))
+            conditions.append(User.username.like(f'%{username}%'))
         
-        # 分页查询
-        pagination = query.order_by(User.id.desc()).paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
+        # 分页查询（只查询投影列）
+        total = db.session.execute(select(func.count()).select_from(User).where(*conditions)).scalar()
+        rows = USER_PROJECTION.fetch(
+            USER_PROJECTION.select()
+            .where(*conditions)
+            .order_by(User.id.desc())
+            .limit(per_page)
+            .offset((page - 1) * per_page)
         )
         
         # 构建响应数据
-        user_list = []
-        for user in pagination.items:
-            user_dict = user.to_dict()
-            user_list.append(user_dict)
+        user_list = USER_PROJECTION.to_dicts(rows)
         
         return jsonify({
             'code': 200,
             'msg': '获取用户列表成功',
             'data': {
                 'users': user_list,
-                'total': pagination.total,
+                'total': total,
                 'page': page,
                 'per_page': per_page,
-                'pages': pagination.pages
+                'pages': (total + per_page - 1) // per_page
             }
         }), 200
     
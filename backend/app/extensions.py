@@ -2,9 +2,12 @@ from flask_sqlalchemy import SQLAlchemy
 from celery import Celery
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
+from app.utils.db_router import RoutingSession
+# 注册SQLite连接参数（WAL等），对其他数据库无影响
+from app.utils import sqlite_util  # noqa: F401
 
-# 实例化SQLAlchemy
-db = SQLAlchemy()
+# 实例化SQLAlchemy（只读接口的查询可路由到只读副本）
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # 实例化Celery
 celery = Celery(__name__)
@@ -0,0 +1,74 @@
+import importlib
+import logging
+import pkgutil
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, insert, select
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 已执行迁移的版本记录表
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+def discover_migrations():
+    """按版本号返回全部迁移模块
+
+    迁移位于app/migrations/versions，文件名形如m0001_xxx.py，
+    模块需提供upgrade(conn)函数，docstring作为迁移说明。
+
+    Returns:
+        [(version, name, module)]列表
+    """
+    from . import versions
+    migrations = []
+    for info in pkgutil.iter_modules(versions.__path__):
+        if not info.name.startswith('m'):
+            continue
+        module = importlib.import_module(f"{versions.__name__}.{info.name}")
+        migrations.append((int(info.name[1:5]), info.name, module))
+    return sorted(migrations, key=lambda m: m[0])
+
+def applied_versions(conn):
+    """返回已执行的迁移版本集合"""
+    schema_version.create(conn, checkfirst=True)
+    conn.commit()
+    return {row.version for row in conn.execute(select(schema_version.c.version))}
+
+def migration_status(engine):
+    """返回每个迁移的执行状态"""
+    with engine.connect() as conn:
+        done = applied_versions(conn)
+    return [
+        {'version': version, 'name': name, 'description': (module.__doc__ or '').strip(), 'applied': version in done}
+        for version, name, module in discover_migrations()
+    ]
+
+def run_migrations(engine, target=None):
+    """执行尚未执行的迁移
+
+    每个迁移都先检查字段/索引是否已存在，db.create_all()新建的库上执行也是安全的。
+
+    Args:
+        engine: 数据库引擎
+        target: 只执行到该版本（含），默认执行全部
+
+    Returns:
+        本次执行的迁移名称列表
+    """
+    applied = []
+    with engine.connect() as conn:
+        done = applied_versions(conn)
+        for version, name, module in discover_migrations():
+            if version in done or (target is not None and version > target):
+                continue
+            logger.info(f"Applying migration {name}")
+            module.upgrade(conn)
+            conn.execute(insert(schema_version).values(version=version, name=name, applied_at=datetime.utcnow()))
+            conn.commit()
+            applied.append(name)
+    return applied
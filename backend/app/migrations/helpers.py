@@ -0,0 +1,52 @@
+import logging
+from sqlalchemy import inspect, text
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+def column_exists(conn, table, column):
+    """表中是否存在指定字段"""
+    return any(col['name'] == column for col in inspect(conn).get_columns(table))
+
+def column_type(conn, table, column):
+    """返回字段类型（小写字符串），字段不存在时返回None"""
+    for col in inspect(conn).get_columns(table):
+        if col['name'] == column:
+            return str(col['type']).lower()
+    return None
+
+def index_exists(conn, table, columns):
+    """表中是否已有以columns为前缀的索引（含唯一约束）"""
+    columns = list(columns)
+    insp = inspect(conn)
+    indexes = insp.get_indexes(table) + insp.get_unique_constraints(table)
+    return any(list(ix['column_names'][:len(columns)]) == columns for ix in indexes)
+
+def add_column(conn, table, column, ddl):
+    """字段不存在时添加
+
+    Args:
+        ddl: 字段定义，如'VARCHAR(255) NULL'
+    """
+    if column_exists(conn, table, column):
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    logger.info(f"Added column {table}.{column}")
+    return True
+
+def add_index(conn, table, name, columns, unique=False):
+    """索引不存在时在线添加（MySQL使用ALGORITHM=INPLACE, LOCK=NONE，不阻塞读写）
+
+    Args:
+        unique: 是否为唯一索引
+    """
+    if index_exists(conn, table, columns):
+        return False
+    column_list = ', '.join(columns)
+    kind = 'UNIQUE INDEX' if unique else 'INDEX'
+    if conn.dialect.name == 'mysql':
+        conn.execute(text(f"ALTER TABLE {table} ADD {kind} {name} ({column_list}), ALGORITHM=INPLACE, LOCK=NONE"))
+    else:
+        conn.execute(text(f"CREATE {kind} {name} ON {table} ({column_list})"))
+    logger.info(f"Added index {name} on {table}({column_list})")
+    return True
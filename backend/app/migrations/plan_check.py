@@ -0,0 +1,58 @@
+import logging
+from sqlalchemy import select, text
+from app.models import ActivityRecord, Asset, BackfillJob, CopyTradeConfig, CopyTradeRecord, CopyTradeStat, Wallet
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+def hot_queries():
+    """高频查询（与接口中的查询形状一致，参数为示例值）"""
+    return {
+        'monitor_logs': select(ActivityRecord, Wallet.address, Asset.token_id)
+            .outerjoin(Wallet, Wallet.id == ActivityRecord.wallet_id)
+            .outerjoin(Asset, Asset.id == ActivityRecord.asset_id)
+            .where(ActivityRecord.task_id == 'task')
+            .order_by(ActivityRecord.created_at.desc(), ActivityRecord.id.desc()).limit(101),
+        'monitor_logs_since': select(ActivityRecord)
+            .where(ActivityRecord.task_id == 'task', ActivityRecord.id > 0)
+            .order_by(ActivityRecord.id.asc()).limit(101),
+        'copy_trade_stat': select(CopyTradeStat).where(CopyTradeStat.task_id == 'task'),
+        'copy_trade_records': select(CopyTradeRecord, Wallet.address, Asset.token_id)
+            .outerjoin(Wallet, Wallet.id == CopyTradeRecord.wallet_id)
+            .outerjoin(Asset, Asset.id == CopyTradeRecord.asset_id)
+            .where(CopyTradeRecord.task_id == 'task')
+            .order_by(CopyTradeRecord.created_at.desc()).limit(50),
+        'copy_trade_config_by_user': select(CopyTradeConfig).where(CopyTradeConfig.user_id == 1),
+        'copy_trade_config_by_task': select(CopyTradeConfig).where(CopyTradeConfig.task_id == 'task'),
+        'backfill_job_by_user': select(BackfillJob)
+            .where(BackfillJob.target_user == '0x0', BackfillJob.status == 'running')
+    }
+
+def _full_scans(conn, sql):
+    """返回查询计划中全表扫描的表，不支持的数据库返回None"""
+    dialect = conn.dialect.name
+    if dialect == 'mysql':
+        # 没有任何可用索引的全表扫描（小表上优化器可能主动选择ALL，因此同时要求possible_keys为空）
+        rows = conn.execute(text(f"EXPLAIN {sql}")).mappings().all()
+        return [row['table'] for row in rows if row['type'] == 'ALL' and not row['possible_keys']]
+    if dialect == 'sqlite':
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        return [row[-1] for row in rows if row[-1].startswith('SCAN') and 'INDEX' not in row[-1]]
+    return None
+
+def check_query_plans(conn):
+    """检查高频查询是否会全表扫描
+
+    Returns:
+        {查询名称: 全表扫描的表列表}，只包含有问题的查询
+    """
+    failures = {}
+    for name, stmt in hot_queries().items():
+        sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+        scans = _full_scans(conn, sql)
+        if scans is None:
+            logger.warning(f"Query plan check is not supported on {conn.dialect.name}")
+            return {}
+        if scans:
+            failures[name] = scans
+    return failures
@@ -0,0 +1,6 @@
+"""copy_trade_record添加事件标题与标识字段"""
+from app.migrations.helpers import add_column
+
+def upgrade(conn):
+    add_column(conn, 'copy_trade_record', 'event_title', 'VARCHAR(255) NULL')
+    add_column(conn, 'copy_trade_record', 'event_slug', 'VARCHAR(255) NULL')
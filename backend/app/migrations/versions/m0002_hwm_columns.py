@@ -0,0 +1,7 @@
+"""监控任务与跟单配置添加高水位字段"""
+from app.migrations.helpers import add_column
+
+def upgrade(conn):
+    for table in ('monitor_task', 'copy_trade_config'):
+        add_column(conn, table, 'hwm_timestamp', 'INT NULL')
+        add_column(conn, table, 'hwm_tx_hashes', 'TEXT NULL')
@@ -0,0 +1,32 @@
+"""activity_record.unique_key从VARCHAR(100)转换为BINARY(16)"""
+from sqlalchemy import text
+from app.migrations.helpers import add_column, add_index, column_exists, column_type
+
+# 每批转换的主键范围
+BATCH_SIZE = 50000
+
+def upgrade(conn):
+    if conn.dialect.name != 'mysql':
+        # 旧的VARCHAR字段只存在于MySQL库；SQLite库由db.create_all()建表（反射出的BINARY类型为NUMERIC）
+        return
+    # 每一步都先检查当前状态，中途失败（如转换到一半时断开连接）后可以重新执行
+    current = column_type(conn, 'activity_record', 'unique_key')
+    if current is not None and 'binary' not in current:
+        add_column(conn, 'activity_record', 'unique_key_bin', 'BINARY(16) NULL')
+        # 交易哈希和旧版SHA-256十六进制标识都取前16字节，按主键分批转换避免长事务
+        max_id = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM activity_record")).scalar()
+        for lo in range(0, max_id + 1, BATCH_SIZE):
+            conn.execute(text(
+                "UPDATE activity_record SET unique_key_bin = "
+                "UNHEX(LEFT(IF(unique_key LIKE '0x%', SUBSTRING(unique_key, 3), unique_key), 32)) "
+                "WHERE id >= :lo AND id < :hi"
+            ), {'lo': lo, 'hi': lo + BATCH_SIZE})
+            conn.commit()
+        conn.execute(text("ALTER TABLE activity_record DROP COLUMN unique_key"))
+        current = None
+    if current is None:
+        if not column_exists(conn, 'activity_record', 'unique_key_bin'):
+            return
+        # 上次在删除旧字段之后中断
+        conn.execute(text("ALTER TABLE activity_record CHANGE COLUMN unique_key_bin unique_key BINARY(16) NULL"))
+    add_index(conn, 'activity_record', 'unique_key', ['unique_key'], unique=True)
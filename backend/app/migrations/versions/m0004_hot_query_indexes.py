@@ -0,0 +1,15 @@
+"""为高频查询添加组合索引"""
+from app.migrations.helpers import add_index
+
+def upgrade(conn):
+    # /monitor/logs：按任务查询并按创建时间倒序
+    add_index(conn, 'activity_record', 'ix_activity_record_task_created', ['task_id', 'created_at'])
+    # /copy-trade/stat：按任务和状态计数
+    add_index(conn, 'copy_trade_record', 'ix_copy_trade_record_task_status_created', ['task_id', 'status', 'created_at'])
+    # /copy-trade/records：按任务查询并按创建时间倒序
+    add_index(conn, 'copy_trade_record', 'ix_copy_trade_record_task_created', ['task_id', 'created_at'])
+    # 跟单配置按用户和任务查询
+    add_index(conn, 'copy_trade_config', 'ix_copy_trade_config_user', ['user_id'])
+    add_index(conn, 'copy_trade_config', 'ix_copy_trade_config_task', ['task_id'])
+    # 回填任务按钱包和状态查询
+    add_index(conn, 'backfill_job', 'ix_backfill_job_user_status', ['target_user', 'status'])
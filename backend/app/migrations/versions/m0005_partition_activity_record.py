@@ -0,0 +1,6 @@
+"""activity_record按交易时间戳按月分区（仅MySQL）"""
+from app.config import Config
+from app.services.partition_maintenance import partition_activity_record
+
+def upgrade(conn):
+    partition_activity_record(conn, Config.ACTIVITY_PARTITION_MONTHS_AHEAD)
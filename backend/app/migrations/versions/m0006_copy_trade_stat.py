@@ -0,0 +1,69 @@
+"""新建跟单任务统计表并从现有跟单记录初始化"""
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, case, delete, func, select
+from app.services.cold_archive import read_archive
+from app.services.copy_trade_stats import stat_deltas
+
+# 迁移使用本版本时的表结构，不依赖之后可能变化的模型定义
+metadata = MetaData()
+
+copy_trade_stat = Table(
+    'copy_trade_stat', metadata,
+    Column('task_id', String(100), primary_key=True),
+    Column('total_trades', Integer, nullable=False, default=0),
+    Column('success_trades', Integer, nullable=False, default=0),
+    Column('failed_trades', Integer, nullable=False, default=0),
+    Column('volume', Float, nullable=False, default=0),
+    Column('last_trade_at', DateTime),
+    Column('updated_at', DateTime)
+)
+
+# 只声明统计用到的字段
+copy_trade_record = Table(
+    'copy_trade_record', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('task_id', String(100)),
+    Column('status', String(20)),
+    Column('amount', Float),
+    Column('created_at', DateTime)
+)
+
+def _compute_stats(conn):
+    table = copy_trade_record
+    is_success = table.c.status == 'success'
+    query = select(
+        table.c.task_id,
+        func.count(),
+        func.sum(case((is_success, 1), else_=0)),
+        func.sum(case((table.c.status == 'failed', 1), else_=0)),
+        func.sum(case((is_success, table.c.amount), else_=0)),
+        func.max(table.c.created_at)
+    ).group_by(table.c.task_id)
+    stats = {}
+    for task_id, total, success, failed, volume, last_trade_at in conn.execute(query):
+        stats[task_id] = {
+            'task_id': task_id,
+            'total_trades': int(total or 0),
+            'success_trades': int(success or 0),
+            'failed_trades': int(failed or 0),
+            'volume': float(volume or 0),
+            'last_trade_at': last_trade_at
+        }
+    # 已归档到Parquet的记录也计入统计
+    archived = read_archive('copy_trade_record', columns=['task_id', 'status', 'amount', 'created_at'])
+    for delta in stat_deltas(archived):
+        stat = stats.setdefault(delta['task_id'], dict(delta, total_trades=0, success_trades=0, failed_trades=0, volume=0.0))
+        for column in ('total_trades', 'success_trades', 'failed_trades', 'volume'):
+            stat[column] += delta[column]
+        if delta['last_trade_at'] and (stat['last_trade_at'] is None or delta['last_trade_at'] > stat['last_trade_at']):
+            stat['last_trade_at'] = delta['last_trade_at']
+    return stats
+
+def upgrade(conn):
+    copy_trade_stat.create(conn, checkfirst=True)
+    stats = _compute_stats(conn)
+    conn.execute(delete(copy_trade_stat))
+    if stats:
+        now = datetime.utcnow()
+        conn.execute(copy_trade_stat.insert(), [dict(stat, updated_at=now) for stat in stats.values()])
+    conn.commit()
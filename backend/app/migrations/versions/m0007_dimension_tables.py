@@ -0,0 +1,93 @@
+"""钱包和资产维度表：activity_record、copy_trade_record中的地址、代币ID和事件信息改为整数id引用"""
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, text
+from app.migrations.helpers import add_column, column_exists
+
+# 迁移使用本版本时的表结构，不依赖之后可能变化的模型定义
+metadata = MetaData()
+
+wallet = Table(
+    'wallet', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('address', String(100), nullable=False, unique=True),
+    Column('created_at', DateTime)
+)
+
+asset = Table(
+    'asset', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('token_id', String(100), nullable=False, unique=True),
+    Column('event_title', String(255), nullable=True),
+    Column('event_slug', String(255), nullable=True),
+    Column('created_at', DateTime)
+)
+
+# 每批转换的主键范围
+BATCH_SIZE = 50000
+
+# 事实表 -> (维度id列的来源列, 转换后删除的列, 非空的维度id列)
+FACT_TABLES = {
+    'activity_record': ({'wallet_id': 'target_user', 'asset_id': 'asset'}, ['target_user', 'asset'], ['wallet_id']),
+    'copy_trade_record': (
+        {'wallet_id': 'target_user', 'asset_id': 'token_id'},
+        ['target_user', 'token_id', 'event_title', 'event_slug'],
+        ['wallet_id', 'asset_id']
+    )
+}
+
+def _insert_ignore(conn):
+    return 'INSERT IGNORE' if conn.dialect.name == 'mysql' else 'INSERT OR IGNORE'
+
+def _fill_dimensions(conn):
+    """由事实表中现有的值初始化维度表（钱包地址统一为小写）"""
+    insert = _insert_ignore(conn)
+    now = {'now': datetime.utcnow()}
+    # 先写跟单记录中的代币（带事件信息），活动记录中的代币只补充缺少的
+    if column_exists(conn, 'copy_trade_record', 'token_id'):
+        conn.execute(text(
+            f"{insert} INTO asset (token_id, event_title, event_slug, created_at) "
+            "SELECT token_id, MAX(event_title), MAX(event_slug), :now FROM copy_trade_record GROUP BY token_id"
+        ), now)
+        conn.execute(text(
+            f"{insert} INTO wallet (address, created_at) SELECT DISTINCT LOWER(target_user), :now FROM copy_trade_record"
+        ), now)
+    if column_exists(conn, 'activity_record', 'asset'):
+        conn.execute(text(
+            f"{insert} INTO asset (token_id, created_at) "
+            "SELECT DISTINCT asset, :now FROM activity_record WHERE asset IS NOT NULL"
+        ), now)
+        conn.execute(text(
+            f"{insert} INTO wallet (address, created_at) SELECT DISTINCT LOWER(target_user), :now FROM activity_record"
+        ), now)
+    conn.commit()
+
+def _convert(conn, table, sources, dropped, not_null):
+    if not column_exists(conn, table, sources['wallet_id']):
+        return
+    add_column(conn, table, 'wallet_id', 'INT NULL')
+    add_column(conn, table, 'asset_id', 'INT NULL')
+    # 按主键分批回填，避免长事务
+    max_id = conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {table}")).scalar()
+    for lo in range(0, max_id + 1, BATCH_SIZE):
+        conn.execute(text(
+            f"UPDATE {table} SET "
+            f"wallet_id = (SELECT wallet.id FROM wallet WHERE wallet.address = LOWER({table}.{sources['wallet_id']})), "
+            f"asset_id = (SELECT asset.id FROM asset WHERE asset.token_id = {table}.{sources['asset_id']}) "
+            "WHERE id >= :lo AND id < :hi"
+        ), {'lo': lo, 'hi': lo + BATCH_SIZE})
+        conn.commit()
+    if conn.dialect.name == 'mysql':
+        changes = [f"DROP COLUMN {column}" for column in dropped] + [f"MODIFY {column} INT NOT NULL" for column in not_null]
+        conn.execute(text(f"ALTER TABLE {table} {', '.join(changes)}"))
+    else:
+        # SQLite 3.35+支持DROP COLUMN，但不能给已有字段加NOT NULL
+        for column in dropped:
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+
+def upgrade(conn):
+    wallet.create(conn, checkfirst=True)
+    asset.create(conn, checkfirst=True)
+    conn.commit()
+    _fill_dimensions(conn)
+    for table, (sources, dropped, not_null) in FACT_TABLES.items():
+        _convert(conn, table, sources, dropped, not_null)
@@ -0,0 +1,42 @@
+"""copy_trade_record按(task_id, target_tx_hash)唯一，删除交易日志重放写入的重复记录并扣减任务统计
+
+没有交易哈希的记录改为NULL（多个NULL不违反唯一约束），这些记录互不相同，不参与去重。
+"""
+from sqlalchemy import inspect, text
+from app.migrations.helpers import add_index
+
+# 每个(task_id, target_tx_hash)保留最早写入的一行，没有交易哈希的记录全部保留
+HAS_HASH = "target_tx_hash IS NOT NULL AND target_tx_hash <> ''"
+DUPLICATES = (
+    f"FROM copy_trade_record WHERE {HAS_HASH} AND id NOT IN ("
+    f"SELECT id FROM (SELECT MIN(id) AS id FROM copy_trade_record WHERE {HAS_HASH} GROUP BY task_id, target_tx_hash) AS keep)"
+)
+
+def _hash_nullable(conn):
+    return any(
+        col['name'] == 'target_tx_hash' and col['nullable']
+        for col in inspect(conn).get_columns('copy_trade_record')
+    )
+
+def upgrade(conn):
+    if conn.dialect.name == 'mysql':
+        conn.execute(text("ALTER TABLE copy_trade_record MODIFY target_tx_hash VARCHAR(100) NULL"))
+    if _hash_nullable(conn):
+        conn.execute(text("UPDATE copy_trade_record SET target_tx_hash = NULL WHERE target_tx_hash = ''"))
+        conn.commit()
+    deltas = conn.execute(text(
+        "SELECT task_id, COUNT(*), "
+        "SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN status = 'success' THEN amount ELSE 0 END) "
+        f"{DUPLICATES} GROUP BY task_id"
+    )).all()
+    for task_id, total, success, failed, volume in deltas:
+        conn.execute(text(
+            "UPDATE copy_trade_stat SET total_trades = total_trades - :total, "
+            "success_trades = success_trades - :success, failed_trades = failed_trades - :failed, "
+            "volume = volume - :volume WHERE task_id = :task_id"
+        ), {'task_id': task_id, 'total': total, 'success': success or 0, 'failed': failed or 0, 'volume': volume or 0})
+    conn.execute(text(f"DELETE {DUPLICATES}"))
+    conn.commit()
+    add_index(conn, 'copy_trade_record', 'uq_copy_trade_record_task_target_tx', ['task_id', 'target_tx_hash'], unique=True)
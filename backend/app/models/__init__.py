@@ -1,5 +1,9 @@
 from .user import User
+from .wallet import Wallet
+from .asset import Asset
 from .activity_record import ActivityRecord
 from .monitor_task import MonitorTask
 from .copy_trade_config import CopyTradeConfig
 from .copy_trade_record import CopyTradeRecord
+from .copy_trade_stat import CopyTradeStat
+from .backfill_job import BackfillJob
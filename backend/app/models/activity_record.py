@@ -1,32 +1,40 @@
-from app.extensions import db
-from datetime import datetime
-
-class ActivityRecord(db.Model):
-    __tablename__ = 'activity_record'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    task_id = db.Column(db.String(100))
-    target_user = db.Column(db.String(100), nullable=False)
-    transaction_hash = db.Column(db.String(100))
-    timestamp = db.Column(db.Integer, nullable=False)
-    asset = db.Column(db.String(200))
-    side = db.Column(db.String(10))
-    size = db.Column(db.Float)
-    price = db.Column(db.Float)
-    unique_key = db.Column(db.String(100), unique=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'task_id': self.task_id,
-            'target_user': self.target_user,
-            'transaction_hash': self.transaction_hash,
-            'timestamp': self.timestamp,
-            'asset': self.asset,
-            'side': self.side,
-            'size': self.size,
-            'price': self.price,
-            'unique_key': self.unique_key,
-            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
+from app.extensions import db
+from datetime import datetime
+
+class ActivityRecord(db.Model):
+    __tablename__ = 'activity_record'
+    __table_args__ = (
+        # 与按timestamp分区后的表结构一致（m0005）：分区表的主键和唯一索引都必须包含分区字段
+        db.PrimaryKeyConstraint('id', 'timestamp'),
+        db.Index('unique_key', 'unique_key', 'timestamp', unique=True),
+        db.Index('ix_activity_record_task_created', 'task_id', 'created_at'),
+        # SQLite不支持复合主键自增，只以id为主键建表（见sqlite_util）
+        {'info': {'sqlite_primary_key': 'id'}}
+    )
+    
+    id = db.Column(db.Integer, autoincrement=True)
+    task_id = db.Column(db.String(100))
+    wallet_id = db.Column(db.Integer, nullable=False)  # wallet.id
+    transaction_hash = db.Column(db.String(100))
+    timestamp = db.Column(db.Integer, nullable=False)
+    asset_id = db.Column(db.Integer)  # asset.id
+    side = db.Column(db.String(10))
+    size = db.Column(db.Float)
+    price = db.Column(db.Float)
+    unique_key = db.Column(db.BINARY(16))  # 16字节二进制唯一标识
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'task_id': self.task_id,
+            'wallet_id': self.wallet_id,
+            'transaction_hash': self.transaction_hash,
+            'timestamp': self.timestamp,
+            'asset_id': self.asset_id,
+            'side': self.side,
+            'size': self.size,
+            'price': self.price,
+            'unique_key': self.unique_key.hex() if self.unique_key else None,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
         }
\ No newline at end of file
@@ -0,0 +1,20 @@
+from app.extensions import db
+from datetime import datetime
+
+class Asset(db.Model):
+    """资产（市场结果代币）维度表，事实表中以asset_id引用"""
+    __tablename__ = 'asset'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    token_id = db.Column(db.String(100), nullable=False, unique=True)  # 约78位十进制的代币ID
+    event_title = db.Column(db.String(255), nullable=True)  # 事件标题
+    event_slug = db.Column(db.String(255), nullable=True)    # 事件标识
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'token_id': self.token_id,
+            'event_title': self.event_title,
+            'event_slug': self.event_slug
+        }
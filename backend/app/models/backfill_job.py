@@ -0,0 +1,42 @@
+from app.extensions import db
+from datetime import datetime
+
+class BackfillJob(db.Model):
+    __tablename__ = 'backfill_job'
+    __table_args__ = (
+        db.Index('ix_backfill_job_user_status', 'target_user', 'status'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(100), unique=True, nullable=False)
+    target_user = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), default='running')  # running, completed, failed, cancelled
+    start_ts = db.Column(db.Integer, nullable=False)  # 回填的最早时间戳
+    end_ts = db.Column(db.Integer, nullable=False)  # 回填的最晚时间戳（任务创建时确定）
+    cursor_ts = db.Column(db.Integer, nullable=False)  # 检查点：[cursor_ts, end_ts]区间已完成
+    window_seconds = db.Column(db.Integer, nullable=False)
+    pages_fetched = db.Column(db.Integer, default=0)
+    rows_fetched = db.Column(db.Integer, default=0)
+    rows_inserted = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        span = max(self.end_ts - self.start_ts, 1)
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'target_user': self.target_user,
+            'status': self.status,
+            'start_ts': self.start_ts,
+            'end_ts': self.end_ts,
+            'cursor_ts': self.cursor_ts,
+            'progress': round(min(1.0, (self.end_ts - self.cursor_ts) / span) * 100, 2),
+            'pages_fetched': self.pages_fetched,
+            'rows_fetched': self.rows_fetched,
+            'rows_inserted': self.rows_inserted,
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
@@ -3,6 +3,10 @@ from datetime import datetime
 
 class CopyTradeConfig(db.Model):
     __tablename__ = 'copy_trade_config'
+    __table_args__ = (
+        db.Index('ix_copy_trade_config_user', 'user_id'),
+        db.Index('ix_copy_trade_config_task', 'task_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -11,6 +15,8 @@ class CopyTradeConfig(db.Model):
     pk_encrypted = db.Column(db.Text, nullable=False)
     task_id = db.Column(db.String(100))
     status = db.Column(db.String(20), default='stopped')  # stopped, running, failed
+    hwm_timestamp = db.Column(db.Integer)  # 已处理的最新交易时间戳
+    hwm_tx_hashes = db.Column(db.Text)  # 去重窗口内已处理交易的唯一标识（JSON对象：十六进制标识 -> 交易时间戳，另有'evicted'记录被淘汰标识的最新时间戳）
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -24,6 +30,7 @@ class CopyTradeConfig(db.Model):
             'my_proxy_wallet': self.my_proxy_wallet,
             'task_id': self.task_id,
             'status': self.status,
+            'hwm_timestamp': self.hwm_timestamp,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
             'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S')
         }
\ No newline at end of file
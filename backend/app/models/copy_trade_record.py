@@ -1,38 +1,40 @@
-from app.extensions import db
-from datetime import datetime
-
-class CopyTradeRecord(db.Model):
-    __tablename__ = 'copy_trade_record'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    task_id = db.Column(db.String(100), nullable=False)
-    target_user = db.Column(db.String(100), nullable=False)
-    target_tx_hash = db.Column(db.String(100), nullable=False)
-    tx_hash = db.Column(db.String(100), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    price = db.Column(db.Float, nullable=False)
-    size = db.Column(db.Float, nullable=False)
-    side = db.Column(db.String(10), nullable=False)
-    token_id = db.Column(db.String(100), nullable=False)
-    event_title = db.Column(db.String(255), nullable=True)  # 事件标题
-    event_slug = db.Column(db.String(255), nullable=True)    # 事件标识
-    status = db.Column(db.String(20), nullable=False)  # success, failed, pending, live
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'task_id': self.task_id,
-            'target_user': self.target_user,
-            'target_tx_hash': self.target_tx_hash,
-            'tx_hash': self.tx_hash,
-            'amount': self.amount,
-            'price': self.price,
-            'size': self.size,
-            'side': self.side,
-            'token_id': self.token_id,
-            'event_title': self.event_title,
-            'event_slug': self.event_slug,
-            'status': self.status,
-            'timestamp': int(self.created_at.timestamp())
+from app.extensions import db
+from datetime import datetime
+
+class CopyTradeRecord(db.Model):
+    __tablename__ = 'copy_trade_record'
+    __table_args__ = (
+        db.Index('ix_copy_trade_record_task_status_created', 'task_id', 'status', 'created_at'),
+        db.Index('ix_copy_trade_record_task_created', 'task_id', 'created_at'),
+        # 同一任务对同一笔目标交易只记录一次，重放交易日志时重复的记录被忽略（没有交易哈希的记录为NULL，不参与唯一约束）
+        db.Index('uq_copy_trade_record_task_target_tx', 'task_id', 'target_tx_hash', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.String(100), nullable=False)
+    wallet_id = db.Column(db.Integer, nullable=False)  # wallet.id
+    target_tx_hash = db.Column(db.String(100), nullable=True)  # 目标交易哈希，上游未返回时为NULL
+    tx_hash = db.Column(db.String(100), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    size = db.Column(db.Float, nullable=False)
+    side = db.Column(db.String(10), nullable=False)
+    asset_id = db.Column(db.Integer, nullable=False)  # asset.id（代币ID和事件信息在维度表中）
+    status = db.Column(db.String(20), nullable=False)  # success, failed, pending, live
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'task_id': self.task_id,
+            'wallet_id': self.wallet_id,
+            'target_tx_hash': self.target_tx_hash,
+            'tx_hash': self.tx_hash,
+            'amount': self.amount,
+            'price': self.price,
+            'size': self.size,
+            'side': self.side,
+            'asset_id': self.asset_id,
+            'status': self.status,
+            'timestamp': int(self.created_at.timestamp())
         }
\ No newline at end of file
@@ -0,0 +1,25 @@
+from app.extensions import db
+from datetime import datetime
+from app.utils.projection_util import epoch
+
+class CopyTradeStat(db.Model):
+    """跟单任务统计（与copy_trade_record在同一事务中增量更新）"""
+    __tablename__ = 'copy_trade_stat'
+    
+    task_id = db.Column(db.String(100), primary_key=True)
+    total_trades = db.Column(db.Integer, nullable=False, default=0)
+    success_trades = db.Column(db.Integer, nullable=False, default=0)
+    failed_trades = db.Column(db.Integer, nullable=False, default=0)
+    volume = db.Column(db.Float, nullable=False, default=0)  # 成功跟单的名义金额合计
+    last_trade_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'task_id': self.task_id,
+            'total_trades': self.total_trades,
+            'success_trades': self.success_trades,
+            'failed_trades': self.failed_trades,
+            'volume': self.volume,
+            'last_trade_at': epoch(self.last_trade_at) if self.last_trade_at else None
+        }
@@ -9,6 +9,8 @@ class MonitorTask(db.Model):
     target_user = db.Column(db.String(100), nullable=False)
     poll_seconds = db.Column(db.Integer, default=5)
     status = db.Column(db.String(20), default='running')  # running, stopped, finished, failed
+    hwm_timestamp = db.Column(db.Integer)  # 已处理的最新交易时间戳
+    hwm_tx_hashes = db.Column(db.Text)  # 去重窗口内已处理交易的唯一标识（JSON对象：十六进制标识 -> 交易时间戳，另有'evicted'记录被淘汰标识的最新时间戳）
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -19,6 +21,7 @@ class MonitorTask(db.Model):
             'target_user': self.target_user,
             'poll_seconds': self.poll_seconds,
             'status': self.status,
+            'hwm_timestamp': self.hwm_timestamp,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
             'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S')
         }
\ No newline at end of file
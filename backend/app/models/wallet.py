@@ -0,0 +1,19 @@
+from app.extensions import db
+from datetime import datetime
+
+class Wallet(db.Model):
+    """钱包维度表（事实表中以wallet_id引用，地址只存一份）
+    
+    地址统一存为小写，校验和格式与小写的同一地址对应同一行，从事实表读出的地址也是小写。
+    """
+    __tablename__ = 'wallet'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    address = db.Column(db.String(100), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'address': self.address
+        }
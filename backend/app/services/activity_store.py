@@ -0,0 +1,71 @@
+import logging
+from app.extensions import db
+from app.models import ActivityRecord
+from app.services.dimensions import intern_activity_rows
+from app.utils.db_util import bulk_insert_ignore
+from app.utils.dedup_util import get_unique_keys, activity_index
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+def activity_row(trade, unique_key, target_user, task_id=None):
+    """由上游交易数据构造activity_record行
+
+    钱包地址和代币ID保留原值（写入交易日志的也是这种形式），入库前由
+    insert_activity_rows()替换为维度表id。
+    """
+    return {
+        'task_id': task_id,
+        'target_user': target_user,
+        'transaction_hash': trade.get('transactionHash'),
+        'timestamp': trade.get('timestamp'),
+        'asset': trade.get('tokenId') or trade.get('asset'),
+        'side': trade.get('side'),
+        'size': trade.get('size') or trade.get('usdcSize'),
+        'price': trade.get('price'),
+        'unique_key': unique_key
+    }
+
+def activity_rows(trades, target_user, task_id=None):
+    """将一批交易转换为去重后的activity_record行"""
+    keyed = {}
+    for key, it in zip(get_unique_keys(trades), trades):
+        keyed.setdefault(key, it)
+    return [activity_row(it, key, target_user, task_id) for key, it in keyed.items()]
+
+def insert_activity_rows(rows):
+    """写入activity_record行（不提交事务）
+
+    先用共享去重索引一次性过滤已入库的行，其余把钱包地址和代币ID换成维度表id后
+    用一条"唯一键冲突时忽略"的多行INSERT写入，索引未覆盖的重复记录由数据库唯一约束忽略。
+
+    Returns:
+        (实际新增的行数, 提交后应加入去重索引的唯一标识列表)
+    """
+    if not rows:
+        return 0, []
+    known = activity_index.contains_many([row['unique_key'] for row in rows])
+    rows = [row for row in rows if row['unique_key'] not in known]
+    inserted = bulk_insert_ignore(ActivityRecord, intern_activity_rows(rows))
+    if len(rows) > inserted:
+        logger.debug(f"Dedup index missed {len(rows) - inserted} stored records")
+    # 提交后所有候选标识都已在库中（本次插入或此前已存在）
+    return inserted, [row['unique_key'] for row in rows]
+
+def save_activity_records(trades, target_user, task_id=None):
+    """批量持久化交易并提交当前事务
+
+    调用方在当前会话中的其他修改（如任务高水位）会在同一事务中提交。
+
+    Args:
+        trades: 上游交易数据列表
+        target_user: 目标用户钱包地址
+        task_id: 监控任务ID，可为空
+
+    Returns:
+        实际新增的记录数
+    """
+    inserted, keys = insert_activity_rows(activity_rows(trades, target_user, task_id))
+    db.session.commit()
+    activity_index.add_many(keys)
+    return inserted
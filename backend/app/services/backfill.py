@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from app.extensions import db
+from app.models import BackfillJob
+from app.services.activity_store import save_activity_records
+from app.services.cold_archive import archived_before
+from app.utils.rate_limit import PRIORITY_QUERY
+from app.utils.request_util import fetch_latest_trades
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 运行中的回填任务（job_id -> BackfillRunner）
+_runners = {}
+_runners_lock = threading.Lock()
+
+class BackfillCancelled(Exception):
+    """回填任务被取消"""
+    pass
+
+class BackfillRunner(threading.Thread):
+    """钱包历史活动回填线程
+
+    将[start_ts, cursor_ts]按时间窗口从新到旧切分，每批并发拉取concurrency个窗口，
+    窗口内按时间游标翻页；一批完成后批量写入activity_record并推进检查点cursor_ts，
+    进程崩溃后可从检查点继续。回填请求使用最低限流优先级，不挤占实时轮询。
+    已归档时间段（早于归档水位）的记录只在归档文件中，数据库唯一约束无法去重，不再回填。
+    """
+
+    def __init__(self, app, job_id, target_user):
+        super().__init__(name=f"backfill-{job_id}", daemon=True)
+        self.app = app
+        self.job_id = job_id
+        self.target_user = target_user
+        self.cancelled = threading.Event()
+        self.page_size = app.config.get('BACKFILL_PAGE_SIZE', 500)
+        self.concurrency = app.config.get('BACKFILL_CONCURRENCY', 4)
+
+    def run(self):
+        with self.app.app_context():
+            try:
+                self._run()
+            except BackfillCancelled:
+                self._finish('cancelled')
+            except Exception as e:
+                logger.error(f"Backfill job {self.job_id} failed: {str(e)}")
+                db.session.rollback()
+                self._finish('failed', str(e))
+            finally:
+                with _runners_lock:
+                    _runners.pop(self.job_id, None)
+                db.session.remove()
+
+    def _finish(self, status, error=None):
+        job = BackfillJob.query.filter_by(job_id=self.job_id).first()
+        if job:
+            job.status = status
+            job.error = error
+            db.session.commit()
+        logger.info(f"Backfill job {self.job_id} {status}")
+
+    def _run(self):
+        job = BackfillJob.query.filter_by(job_id=self.job_id).first()
+        target_user = self.target_user
+        logger.info(f"Backfill job {self.job_id} for {target_user} running from checkpoint {job.cursor_ts}")
+
+        # 首次运行时查询钱包最早的交易，跳过之前的空窗口
+        if not job.pages_fetched:
+            earliest = self._fetch({'user': target_user, 'limit': 1, 'sortDirection': 'ASC'})
+            job.pages_fetched = 1
+            if earliest:
+                job.start_ts = max(job.start_ts, int(earliest[0].get('timestamp') or 0))
+            else:
+                job.start_ts = job.cursor_ts
+            db.session.commit()
+
+        # 不回填已归档的时间段（每次运行都检查，归档可能在任务暂停期间推进）
+        archived = archived_before('activity_record')
+        if archived > job.start_ts:
+            logger.info(f"Backfill job {self.job_id} skips archived range before {archived}")
+            job.start_ts = min(archived, job.cursor_ts)
+            db.session.commit()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while job.cursor_ts > job.start_ts:
+                if self.cancelled.is_set():
+                    raise BackfillCancelled()
+
+                # 切分本批时间窗口（从新到旧）
+                windows = []
+                hi = job.cursor_ts
+                while len(windows) < self.concurrency and hi > job.start_ts:
+                    lo = max(job.start_ts, hi - job.window_seconds)
+                    windows.append((lo, hi))
+                    hi = lo
+
+                results = list(pool.map(lambda w: self._fetch_window(target_user, *w), windows))
+                trades = [it for window_trades, _ in results for it in window_trades]
+                job.pages_fetched += sum(pages for _, pages in results)
+                job.rows_fetched += len(trades)
+                job.rows_inserted += self._save(target_user, trades)
+
+                # 被取消的批次可能不完整，不推进检查点
+                if self.cancelled.is_set():
+                    db.session.commit()
+                    raise BackfillCancelled()
+                job.cursor_ts = windows[-1][0]
+                db.session.commit()
+
+        job.status = 'completed'
+        db.session.commit()
+        logger.info(f"Backfill job {self.job_id} completed: {job.rows_fetched} fetched, {job.rows_inserted} inserted")
+
+    def _fetch(self, params):
+        params = dict(params, type='TRADE')
+        return fetch_latest_trades(params, priority=PRIORITY_QUERY)
+
+    def _fetch_window(self, target_user, lo, hi):
+        """按时间游标拉取[lo, hi]窗口内的全部交易
+
+        下一页的end取本页最早的时间戳（该秒的交易可能跨页，重复的由唯一约束忽略）；
+        整页都在同一秒时保持end不变，用offset在这一秒内继续翻页，不跳过该秒剩余的交易。
+        """
+        trades = []
+        pages = 0
+        end, offset = hi, 0
+        while not self.cancelled.is_set():
+            page = self._fetch({
+                'user': target_user, 'limit': self.page_size, 'offset': offset, 'start': lo, 'end': end,
+                'sortBy': 'TIMESTAMP', 'sortDirection': 'DESC'
+            })
+            pages += 1
+            trades.extend(page)
+            if len(page) < self.page_size:
+                break
+            oldest = min(int(it.get('timestamp') or 0) for it in page)
+            if oldest < end:
+                end, offset = oldest, 0
+            else:
+                offset += len(page)
+        return trades, pages
+
+    def _save(self, target_user, trades):
+        """批量写入交易，返回实际新增条数"""
+        # 回填期间归档水位可能推进
+        archived = archived_before('activity_record')
+        trades = [it for it in trades if int(it.get('timestamp') or 0) >= archived]
+        if not trades:
+            return 0
+        return save_activity_records(trades, target_user)
+
+def start_backfill(app, target_user, start_ts=None):
+    """启动或恢复钱包的历史回填任务
+
+    同一钱包已有运行中的任务时直接返回；存在未完成（失败、取消或进程崩溃中断）
+    的任务时从其检查点恢复；否则创建新任务，起点接在上一次完成任务之后。
+
+    Returns:
+        BackfillJob实例
+    """
+    wallet = target_user.lower()
+    with _runners_lock:
+        for runner in _runners.values():
+            if runner.target_user == wallet:
+                return BackfillJob.query.filter_by(job_id=runner.job_id).first()
+
+        job = BackfillJob.query.filter(
+            BackfillJob.target_user == wallet,
+            BackfillJob.status.in_(['running', 'failed', 'cancelled'])
+        ).order_by(BackfillJob.id.desc()).first()
+
+        if job:
+            job.status = 'running'
+            job.error = None
+        else:
+            now = int(time.time())
+            lower = start_ts or app.config.get('BACKFILL_EARLIEST_TS', 0)
+            last_completed = BackfillJob.query.filter_by(target_user=wallet, status='completed')\
+                .order_by(BackfillJob.id.desc()).first()
+            if last_completed and not start_ts:
+                lower = max(lower, last_completed.end_ts)
+            job = BackfillJob(
+                job_id=str(uuid.uuid4()),
+                target_user=wallet,
+                status='running',
+                start_ts=lower,
+                end_ts=now,
+                cursor_ts=now,
+                window_seconds=app.config.get('BACKFILL_WINDOW_SECONDS', 7 * 86400)
+            )
+            db.session.add(job)
+        db.session.commit()
+
+        runner = BackfillRunner(app, job.job_id, wallet)
+        _runners[job.job_id] = runner
+        runner.start()
+    logger.info(f"Backfill job {job.job_id} started for {wallet}")
+    return job
+
+def cancel_backfill(job_id):
+    """取消回填任务，返回BackfillJob实例（不存在时返回None）"""
+    job = BackfillJob.query.filter_by(job_id=job_id).first()
+    if not job:
+        return None
+    with _runners_lock:
+        runner = _runners.get(job_id)
+    if runner:
+        # 运行中的任务在当前批次结束后退出
+        runner.cancelled.set()
+    elif job.status == 'running':
+        # 进程崩溃遗留的任务直接标记为已取消
+        job.status = 'cancelled'
+        db.session.commit()
+    return job
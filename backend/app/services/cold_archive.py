@@ -0,0 +1,284 @@
+import logging
+import os
+import uuid
+from types import SimpleNamespace
+from datetime import datetime, timezone
+from sqlalchemy import select, delete
+from app.extensions import db
+from app.models import ActivityRecord, Asset, CopyTradeRecord, Wallet
+from app.utils.request_util import get_config
+from app.utils.pagination_util import record_key
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# Parquet读写为可选依赖，未安装时不归档，查询只读数据库
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    logger.warning("pyarrow未安装，冷数据归档不可用")
+    pa = pc = ds = pq = None
+
+# 可归档的表：表名 -> (模型, 时间列, 钱包列, 维度列)
+# 归档文件中维度id替换为维度值（列名与维度表拆分前一致），不依赖数据库中的维度表
+ARCHIVE_TABLES = {
+    'activity_record': (
+        ActivityRecord, 'timestamp', 'target_user',
+        [Wallet.address.label('target_user'), Asset.token_id.label('asset')]
+    ),
+    'copy_trade_record': (
+        CopyTradeRecord, 'created_at', 'target_user',
+        [Wallet.address.label('target_user'), Asset.token_id, Asset.event_title, Asset.event_slug]
+    )
+}
+
+# 事实表中引用维度表的列
+DIMENSION_ID_COLUMNS = ('wallet_id', 'asset_id')
+
+# 归档水位文件名（以_开头，读取数据集时被忽略）
+WATERMARK_FILE = '_watermark'
+
+def to_epoch(value):
+    """时间列的值转为秒级时间戳（DateTime列存的是UTC时间）"""
+    if isinstance(value, datetime):
+        return int(value.replace(tzinfo=timezone.utc).timestamp())
+    return int(value)
+
+def column_bound(time_col, ts):
+    """秒级时间戳转为时间列可比较的值"""
+    if time_col == 'timestamp':
+        return int(ts)
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+def day_of(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d')
+
+def export_select(name):
+    """导出归档的查询：事实表列（维度id除外）加上对应的维度值"""
+    model, _, _, dimensions = ARCHIVE_TABLES[name]
+    table = model.__table__
+    columns = [column for column in table.columns if column.name not in DIMENSION_ID_COLUMNS]
+    return (
+        select(*columns, *dimensions)
+        .select_from(table)
+        .outerjoin(Wallet.__table__, Wallet.__table__.c.id == table.c.wallet_id)
+        .outerjoin(Asset.__table__, Asset.__table__.c.id == table.c.asset_id)
+    )
+
+def arrow_schema(stmt):
+    """由查询的结果列生成Parquet文件的列定义"""
+    types = {
+        int: pa.int64(),
+        float: pa.float64(),
+        str: pa.string(),
+        bytes: pa.binary(),
+        datetime: pa.timestamp('us')
+    }
+    return pa.schema([(column.name, types[column.type.python_type]) for column in stmt.selected_columns])
+
+def partitioning():
+    """目录分区：table/day=YYYY-MM-DD/wallet=地址/"""
+    return ds.partitioning(pa.schema([('day', pa.string()), ('wallet', pa.string())]), flavor='hive')
+
+def archive_dir():
+    return get_config('ARCHIVE_DIR', 'data/archive')
+
+# ---------- 归档水位 ----------
+
+def archived_before(name):
+    """返回该表已归档的截止时间戳（早于该时间的记录只在归档文件中），未归档返回0"""
+    path = os.path.join(archive_dir(), name, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return int(f.read().strip() or 0)
+
+def _write_watermark(name, cutoff):
+    path = os.path.join(archive_dir(), name, WATERMARK_FILE)
+    if cutoff <= archived_before(name):
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(str(int(cutoff)))
+    os.replace(tmp, path)
+
+# ---------- 导出 ----------
+
+def _write_file(name, day, wallet, rows, schema):
+    directory = os.path.join(archive_dir(), name, f"day={day}", f"wallet={wallet}")
+    os.makedirs(directory, exist_ok=True)
+    filename = f"part-{uuid.uuid4().hex}.parquet"
+    # 先写隐藏的临时文件再改名，读取方不会看到写了一半的文件
+    tmp = os.path.join(directory, f".{filename}")
+    table = pa.Table.from_pylist(rows, schema=schema)
+    pq.write_table(table, tmp, compression=get_config('ARCHIVE_COMPRESSION', 'zstd'))
+    os.replace(tmp, os.path.join(directory, filename))
+
+def archive_table(name, cutoff, batch_size=5000):
+    """把早于cutoff的记录导出为Parquet文件并从数据库删除
+
+    每批按(交易日, 钱包)分组写文件，文件落盘后再删除并提交。在两步之间中断时
+    下次会重复导出同一批记录，读取时按id去重。
+
+    Args:
+        name: 表名（ARCHIVE_TABLES的键）
+        cutoff: 截止时间戳（秒）
+        batch_size: 每批导出的行数
+
+    Returns:
+        归档的行数
+    """
+    if pa is None:
+        raise ImportError("pyarrow未安装，无法归档")
+    model, time_col, wallet_col, _ = ARCHIVE_TABLES[name]
+    table = model.__table__
+    query = export_select(name)
+    schema = arrow_schema(query)
+    bound = column_bound(time_col, cutoff)
+    archived = 0
+    while True:
+        rows = db.session.execute(
+            query.where(table.c[time_col] < bound).order_by(table.c.id).limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            break
+        groups = {}
+        for row in rows:
+            key = (day_of(to_epoch(row[time_col])), row[wallet_col] or '_')
+            groups.setdefault(key, []).append(dict(row))
+        for (day, wallet), group in groups.items():
+            _write_file(name, day, wallet, group, schema)
+        db.session.execute(delete(table).where(table.c.id.in_([row['id'] for row in rows])))
+        db.session.commit()
+        archived += len(rows)
+        logger.info(f"Archived {archived} rows of {name} older than {day_of(cutoff)}")
+    _write_watermark(name, cutoff)
+    return archived
+
+def archive_cold_records(after_days, batch_size=5000):
+    """归档所有表中早于after_days天的记录
+
+    Returns:
+        {表名: 归档行数}
+    """
+    cutoff = int(datetime.now(timezone.utc).timestamp()) - after_days * 86400
+    return {name: archive_table(name, cutoff, batch_size) for name in ARCHIVE_TABLES}
+
+# ---------- 读取 ----------
+
+def combine(conditions):
+    """用AND合并过滤条件，没有条件时返回None"""
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def read_archive(name, start=None, end=None, filters=None, columns=None, before=None, limit=None):
+    """读取归档记录
+
+    按交易日目录裁剪后只读取需要的列，钱包过滤同时用于裁剪wallet目录。
+    指定limit时先只读取排序键(created_at, id)选出最新的limit条，再读取这些记录的其他列。
+
+    Args:
+        name: 表名
+        start: 可选，时间下限（秒，含）
+        end: 可选，时间上限（秒，含）
+        filters: 可选，{列名: 值}等值过滤
+        columns: 可选，要读取的列，默认全部
+        before: 可选，分页游标位置(created_at, id)，只读取排在其后的记录
+        limit: 可选，按(created_at, id)倒序最多返回的条数
+
+    Returns:
+        列名到值的字典列表（已按id去重）；指定limit时按(created_at, id)倒序
+    """
+    path = os.path.join(archive_dir(), name)
+    if pa is None or not os.path.isdir(path):
+        return []
+    _, time_col, wallet_col, _ = ARCHIVE_TABLES[name]
+    schema = arrow_schema(export_select(name))
+    dataset = ds.dataset(
+        path,
+        format='parquet',
+        partitioning=partitioning(),
+        schema=pa.schema(list(schema) + [pa.field('day', pa.string()), pa.field('wallet', pa.string())])
+    )
+
+    # 目录裁剪条件（交易日、钱包）单独保存，第二次按id读取时仍然使用
+    partitions = []
+    conditions = []
+    if start is not None:
+        partitions.append(ds.field('day') >= day_of(start))
+        conditions.append(ds.field(time_col) >= column_bound(time_col, start))
+    if end is not None:
+        partitions.append(ds.field('day') <= day_of(end))
+        conditions.append(ds.field(time_col) <= column_bound(time_col, end))
+    for column, value in (filters or {}).items():
+        if column == wallet_col:
+            partitions.append(ds.field('wallet') == value)
+        conditions.append(ds.field(column) == value)
+    if before is not None:
+        created_at, record_id = before
+        conditions.append(
+            (ds.field('created_at') < created_at)
+            | ((ds.field('created_at') == created_at) & (ds.field('id') < record_id))
+        )
+    expression = combine(partitions + conditions)
+
+    if limit is not None:
+        # 同一记录可能被重复导出，按id去重后再取前limit条
+        keys = dataset.to_table(columns=['created_at', 'id'], filter=expression)
+        keys = keys.group_by('id').aggregate([('created_at', 'max')]).rename_columns(['id', 'created_at'])
+        if keys.num_rows == 0:
+            return []
+        if keys.num_rows > limit:
+            keys = keys.take(pc.select_k_unstable(
+                keys, k=limit, sort_keys=[('created_at', 'descending'), ('id', 'descending')]
+            ))
+        expression = combine(partitions + [ds.field('id').isin(keys['id'])])
+
+    columns = list(columns or schema.names)
+    if 'id' not in columns:
+        columns.append('id')
+    rows = dataset.to_table(columns=columns, filter=expression).to_pylist()
+
+    seen = set()
+    unique = []
+    for row in rows:
+        if row['id'] not in seen:
+            seen.add(row['id'])
+            unique.append(row)
+    if limit is not None:
+        unique.sort(key=lambda row: (row['created_at'] or datetime.min, row['id']), reverse=True)
+    return unique
+
+def with_archived(name, records, start=None, end=None, filters=None, before=None, limit=None):
+    """查询的时间范围早于归档水位时，把归档记录合并到数据库查询结果中
+
+    未指定start的查询只返回数据库中的热数据，避免常规刷新扫描归档文件。
+
+    Args:
+        name: 表名
+        records: 数据库查询结果（投影的Row或模型实例）
+        start, end, filters: 同read_archive
+        before: 可选，分页游标位置(created_at, id)，只合并排在其后的归档记录
+        limit: 可选，调用方最多需要的条数，只读取最新的limit条归档记录
+
+    Returns:
+        合并后的列表（归档记录为以列名为属性的SimpleNamespace），按(created_at, id)倒序
+    """
+    if start is None or start >= archived_before(name):
+        return records
+    ids = {record.id for record in records}
+    archived = [
+        SimpleNamespace(**row)
+        for row in read_archive(name, start, end, filters, before=before, limit=limit)
+        if row['id'] not in ids
+    ]
+    if not archived:
+        return records
+    merged = list(records) + archived
+    merged.sort(key=record_key, reverse=True)
+    return merged
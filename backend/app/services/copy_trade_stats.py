@@ -0,0 +1,211 @@
+import logging
+from datetime import datetime
+from sqlalchemy import select, delete, func, case
+from app.extensions import db
+from app.models import CopyTradeRecord, CopyTradeStat
+from app.services.cold_archive import read_archive
+from app.utils.db_util import insert_ignore, upsert
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 统计计数字段（冲突时累加）
+COUNTER_COLUMNS = ('total_trades', 'success_trades', 'failed_trades', 'volume')
+
+def stat_deltas(records):
+    """将一批跟单记录汇总为每个任务的统计增量
+
+    Args:
+        records: copy_trade_record列名到值的字典列表（需包含created_at）
+
+    Returns:
+        copy_trade_stat行的列表
+    """
+    deltas = {}
+    for record in records:
+        delta = deltas.setdefault(record['task_id'], {
+            'task_id': record['task_id'],
+            'total_trades': 0,
+            'success_trades': 0,
+            'failed_trades': 0,
+            'volume': 0.0,
+            'last_trade_at': None
+        })
+        delta['total_trades'] += 1
+        if record['status'] == 'success':
+            delta['success_trades'] += 1
+            delta['volume'] += record.get('amount') or 0
+        elif record['status'] == 'failed':
+            delta['failed_trades'] += 1
+        created_at = record.get('created_at')
+        if created_at and (delta['last_trade_at'] is None or created_at > delta['last_trade_at']):
+            delta['last_trade_at'] = created_at
+    return list(deltas.values())
+
+def apply_stat_deltas(records, session=None):
+    """按新写入的跟单记录累加任务统计（不提交事务，应与记录的INSERT在同一事务中）
+
+    Returns:
+        更新的任务数
+    """
+    rows = stat_deltas(records)
+    if not rows:
+        return 0
+    session = session or db.session
+    dialect_name = session.get_bind(mapper=CopyTradeStat).dialect.name
+    now = datetime.utcnow()
+    for row in rows:
+        row['updated_at'] = now
+    greatest = func.max if dialect_name == 'sqlite' else func.greatest
+
+    def update(table, inserted):
+        values = {column: table.c[column] + inserted[column] for column in COUNTER_COLUMNS}
+        values['last_trade_at'] = greatest(
+            func.coalesce(table.c.last_trade_at, inserted.last_trade_at),
+            func.coalesce(inserted.last_trade_at, table.c.last_trade_at)
+        )
+        values['updated_at'] = inserted.updated_at
+        return values
+
+    session.execute(upsert(CopyTradeStat, dialect_name, rows, update))
+    return len(rows)
+
+def insert_copy_trade_records(rows, session=None):
+    """写入跟单记录并累加任务统计（不提交事务）
+
+    (task_id, target_tx_hash)已存在的记录被忽略，只有实际写入的记录计入统计：
+    交易日志在写库成功、检查点推进之前崩溃时会重放整批操作，重放不会重复记账。
+    跟单记录量很小（每笔下单一行），逐行写入以得到每一行是否写入。
+
+    Args:
+        rows: copy_trade_record列名到值的字典列表（需包含created_at）
+        session: 数据库会话，默认db.session
+
+    Returns:
+        实际写入的行数
+    """
+    if not rows:
+        return 0
+    session = session or db.session
+    dialect_name = session.get_bind(mapper=CopyTradeRecord).dialect.name
+    inserted = [
+        row for row in rows
+        if session.execute(insert_ignore(CopyTradeRecord, dialect_name).values(row)).rowcount
+    ]
+    if len(inserted) < len(rows):
+        logger.info(f"Ignored {len(rows) - len(inserted)} copy trade records already written")
+    apply_stat_deltas(inserted, session)
+    return len(inserted)
+
+def copied_target_tx_hashes(task_id, target_tx_hashes):
+    """返回target_tx_hashes中该任务已有跟单记录的目标交易哈希集合
+
+    去重窗口的标识超出上限被淘汰后，内存中无法判断被淘汰时间范围内的交易是否已跟单，
+    下单前按已写入的跟单记录再确认。
+    """
+    hashes = [it for it in set(target_tx_hashes) if it]
+    if not hashes:
+        return set()
+    return set(db.session.execute(
+        select(CopyTradeRecord.target_tx_hash).where(
+            CopyTradeRecord.task_id == task_id,
+            CopyTradeRecord.target_tx_hash.in_(hashes)
+        )
+    ).scalars())
+
+def get_copy_trade_stat(task_id):
+    """读取任务统计，没有记录时返回全0"""
+    stat = db.session.get(CopyTradeStat, task_id)
+    if stat is None:
+        stat = CopyTradeStat(task_id=task_id, total_trades=0, success_trades=0, failed_trades=0, volume=0)
+    return stat.to_dict()
+
+def compute_copy_trade_stats(conn, task_id=None):
+    """从copy_trade_record（及冷数据归档）重新计算统计
+
+    Args:
+        conn: 数据库连接或会话
+        task_id: 可选，只计算该任务
+
+    Returns:
+        {task_id: copy_trade_stat行}
+    """
+    table = CopyTradeRecord.__table__
+    is_success = table.c.status == 'success'
+    query = select(
+        table.c.task_id,
+        func.count(),
+        func.sum(case((is_success, 1), else_=0)),
+        func.sum(case((table.c.status == 'failed', 1), else_=0)),
+        func.sum(case((is_success, table.c.amount), else_=0)),
+        func.max(table.c.created_at)
+    ).group_by(table.c.task_id)
+    if task_id is not None:
+        query = query.where(table.c.task_id == task_id)
+
+    stats = {}
+    for row_task_id, total, success, failed, volume, last_trade_at in conn.execute(query):
+        stats[row_task_id] = {
+            'task_id': row_task_id,
+            'total_trades': int(total or 0),
+            'success_trades': int(success or 0),
+            'failed_trades': int(failed or 0),
+            'volume': float(volume or 0),
+            'last_trade_at': last_trade_at
+        }
+
+    # 已归档到Parquet的记录也计入统计
+    archived = read_archive(
+        'copy_trade_record',
+        filters={'task_id': task_id} if task_id is not None else None,
+        columns=['task_id', 'status', 'amount', 'created_at']
+    )
+    for delta in stat_deltas(archived):
+        stat = stats.setdefault(delta['task_id'], dict(delta, total_trades=0, success_trades=0, failed_trades=0, volume=0.0))
+        for column in COUNTER_COLUMNS:
+            stat[column] += delta[column]
+        if delta['last_trade_at'] and (stat['last_trade_at'] is None or delta['last_trade_at'] > stat['last_trade_at']):
+            stat['last_trade_at'] = delta['last_trade_at']
+    return stats
+
+def rebuild_copy_trade_stats(conn, task_id=None):
+    """从头重建统计表（不提交事务）
+
+    Returns:
+        重建的任务数
+    """
+    stats = compute_copy_trade_stats(conn, task_id)
+    table = CopyTradeStat.__table__
+    query = delete(table)
+    if task_id is not None:
+        query = query.where(table.c.task_id == task_id)
+    conn.execute(query)
+    if stats:
+        now = datetime.utcnow()
+        conn.execute(table.insert(), [dict(stat, updated_at=now) for stat in stats.values()])
+    logger.info(f"Rebuilt copy trade stats for {len(stats)} tasks")
+    return len(stats)
+
+def check_copy_trade_stats(conn, task_id=None):
+    """比较统计表与重新计算的结果
+
+    Returns:
+        不一致的任务列表[(task_id, 统计表中的值, 重新计算的值)]
+    """
+    expected = compute_copy_trade_stats(conn, task_id)
+    table = CopyTradeStat.__table__
+    query = select(table)
+    if task_id is not None:
+        query = query.where(table.c.task_id == task_id)
+    actual = {row['task_id']: dict(row) for row in conn.execute(query).mappings()}
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        want = expected.get(key)
+        have = actual.get(key)
+        if want is None or have is None:
+            mismatches.append((key, have, want))
+            continue
+        if any(have[column] != want[column] for column in COUNTER_COLUMNS[:3]) or abs(have['volume'] - want['volume']) > 1e-6:
+            mismatches.append((key, have, want))
+    return mismatches
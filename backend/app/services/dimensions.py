@@ -0,0 +1,201 @@
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.models import Asset, Wallet
+from app.utils.db_util import BULK_CHUNK_SIZE, insert_ignore
+from app.utils.metrics_util import register_metrics
+from app.utils.request_util import get_config
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# session.info中记录本事务新插入、提交后才能缓存的维度id：[(DimensionCache, {自然键: id})]
+PENDING_INFO_KEY = 'dimension_ids'
+
+class DimensionCache:
+    """维度表自然键到代理键（id）的进程内缓存
+
+    维度表只追加不修改，映射确定后不会变化，缓存不设过期时间，只按容量淘汰最久未用的项。
+    未命中的值先批量查询，仍不存在的用"唯一键冲突时忽略"插入后再查一次，多个进程
+    同时写入同一个值时拿到的是同一个id。查询和插入都在调用方的会话中执行，与事实表
+    在同一事务中提交；本事务新插入的id在提交后才加入缓存，回滚时丢弃。
+    """
+
+    def __init__(self, model, key, attrs=(), maxsize=100000, normalize=None):
+        """
+        Args:
+            model: 维度表模型
+            key: 自然键列名
+            attrs: 首次插入时一并写入的其他列
+            maxsize: 缓存的最大条目数
+            normalize: 可选，查询和写入前对自然键的规范化（如钱包地址转小写）
+        """
+        self.model = model
+        self.key = key
+        self.attrs = tuple(attrs)
+        self.normalize = normalize
+        self.maxsize = maxsize
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'inserted': 0}
+
+    def _cached(self, values):
+        found = {}
+        with self._lock:
+            for value in values:
+                id_ = self._ids.get(value)
+                if id_ is not None:
+                    self._ids.move_to_end(value)
+                    found[value] = id_
+            self._counters['hits'] += len(found)
+            self._counters['misses'] += len(values) - len(found)
+        return found
+
+    def _remember(self, ids):
+        with self._lock:
+            for value, id_ in ids.items():
+                self._ids[value] = id_
+                self._ids.move_to_end(value)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+
+    def _select(self, session, values, locking=False):
+        table = self.model.__table__
+        column = table.c[self.key]
+        values = list(values)
+        ids = {}
+        for i in range(0, len(values), BULK_CHUNK_SIZE):
+            stmt = select(column, table.c.id).where(column.in_(values[i:i + BULK_CHUNK_SIZE]))
+            if locking:
+                # 共享锁读取最新提交的行：MySQL可重复读下，被忽略的插入对应的行可能在本事务快照之后才提交
+                stmt = stmt.with_for_update(read=True)
+            ids.update({value: id_ for value, id_ in session.execute(stmt)})
+        return ids
+
+    def _pending(self, session):
+        """本会话当前事务中新插入、尚未提交的id"""
+        pending = {}
+        for cache, ids in session.info.get(PENDING_INFO_KEY, ()):
+            if cache is self:
+                pending.update(ids)
+        return pending
+
+    def ids_for(self, values, attrs=None, session=None):
+        """返回自然键对应的id，不存在的在调用方的会话中插入（不提交）
+
+        Args:
+            values: 自然键的可迭代对象（None被忽略）
+            attrs: 可选，{自然键: {列名: 值}}，只在首次插入时写入
+            session: 数据库会话，默认db.session
+
+        Returns:
+            {自然键: id}，键为传入的原值（规范化前）
+        """
+        session = session or db.session
+        values = {value for value in values if value is not None}
+        if self.normalize is not None:
+            originals = values
+            attrs = {self.normalize(value): attr for value, attr in (attrs or {}).items()}
+            ids = self._ids_for({self.normalize(value) for value in values}, attrs, session)
+            return {value: ids[self.normalize(value)] for value in originals}
+        return self._ids_for(values, attrs, session)
+
+    def _ids_for(self, values, attrs, session):
+        ids = self._cached(values)
+        missing = values - ids.keys()
+        if not missing:
+            return ids
+        attrs = attrs or {}
+        found = self._select(session, missing)
+        # 本事务之前插入的行也能查到，同样等提交后再缓存
+        pending = self._pending(session)
+        self._remember({value: id_ for value, id_ in found.items() if value not in pending})
+        new = sorted(missing - found.keys())
+        if new:
+            now = datetime.utcnow()
+            rows = [
+                dict({attr: attrs.get(value, {}).get(attr) for attr in self.attrs}, **{self.key: value, 'created_at': now})
+                for value in new
+            ]
+            dialect_name = session.get_bind(mapper=self.model).dialect.name
+            for i in range(0, len(rows), BULK_CHUNK_SIZE):
+                session.execute(insert_ignore(self.model, dialect_name).values(rows[i:i + BULK_CHUNK_SIZE]))
+            inserted = self._select(session, new, locking=True)
+            session.info.setdefault(PENDING_INFO_KEY, []).append((self, inserted))
+            found.update(inserted)
+            with self._lock:
+                self._counters['inserted'] += len(new)
+        ids.update(found)
+        return ids
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, size=len(self._ids))
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    for cache, ids in session.info.pop(PENDING_INFO_KEY, ()):
+        cache._remember(ids)
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(PENDING_INFO_KEY, None)
+
+# 全局实例
+wallet_ids = DimensionCache(Wallet, 'address', maxsize=get_config('DIMENSION_CACHE_SIZE', 100000), normalize=str.lower)
+asset_ids = DimensionCache(Asset, 'token_id', ('event_title', 'event_slug'), maxsize=get_config('DIMENSION_CACHE_SIZE', 100000))
+register_metrics('dimensions', lambda: {'wallet': wallet_ids.stats(), 'asset': asset_ids.stats()})
+
+def intern_activity_rows(rows, session=None):
+    """把activity_record行中的钱包地址和代币ID替换为维度表id
+
+    Args:
+        rows: activity_row()构造的行（含target_user、asset）
+        session: 数据库会话，新的维度行随该会话的事务提交，默认db.session
+
+    Returns:
+        新的行列表（含wallet_id、asset_id），原行不修改，写库失败重试时可再次转换
+    """
+    if not rows:
+        return []
+    wallets = wallet_ids.ids_for((row['target_user'] for row in rows), session=session)
+    assets = asset_ids.ids_for((row['asset'] for row in rows), session=session)
+    result = []
+    for row in rows:
+        row = dict(row)
+        row['wallet_id'] = wallets[row.pop('target_user')]
+        row['asset_id'] = assets.get(row.pop('asset'))
+        result.append(row)
+    return result
+
+def intern_copy_trade_rows(rows, session=None):
+    """把copy_trade_record行中的钱包地址、代币ID和事件信息替换为维度表id
+
+    Args:
+        rows: 跟单记录行（含target_user、token_id、event_title、event_slug）
+        session: 数据库会话，新的维度行随该会话的事务提交，默认db.session
+
+    Returns:
+        新的行列表（含wallet_id、asset_id），原行不修改
+    """
+    if not rows:
+        return []
+    wallets = wallet_ids.ids_for((row['target_user'] for row in rows), session=session)
+    assets = asset_ids.ids_for(
+        (row['token_id'] for row in rows),
+        {row['token_id']: {'event_title': row.get('event_title'), 'event_slug': row.get('event_slug')} for row in rows},
+        session=session
+    )
+    result = []
+    for row in rows:
+        row = dict(row)
+        row['wallet_id'] = wallets[row.pop('target_user')]
+        row['asset_id'] = assets[row.pop('token_id')]
+        row.pop('event_title', None)
+        row.pop('event_slug', None)
+        result.append(row)
+    return result
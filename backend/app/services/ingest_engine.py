@@ -0,0 +1,443 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.models import MonitorTask
+from app.utils.dedup_util import HighWaterMark
+from app.services.write_behind import write_behind, activity_op, cursor_op
+from app.utils.request_util import AsyncRequestUtil, CircuitOpenError, get_config
+from app.utils.rate_limit import PRIORITY_MONITOR
+from app.utils.metrics_util import register_metrics
+from app.services.poll_scheduler import PollScheduler
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """钱包订阅
+
+    每个监控任务或跟单配置持有一个订阅。默认将新交易投递到线程安全队列，
+    由订阅者线程通过get()消费；指定sink时直接回调sink(subscription, trades)。
+    订阅者自己的高水位标记用于过滤已处理过的交易，并由订阅者负责持久化。
+    priority为该订阅的限流优先级，跟单订阅优先于监控订阅。
+    加入已有轮询器时先暂存投递（hold），补拉订阅者自己高水位之后的交易后再按顺序放行（release）。
+    """
+
+    def __init__(self, subscriber_id, target_user, poll_seconds, sink=None, cursor=None, priority=PRIORITY_MONITOR):
+        self.subscriber_id = subscriber_id
+        self.target_user = target_user
+        self.poll_seconds = poll_seconds
+        self.priority = priority
+        self.sink = sink
+        self.cursor = cursor
+        self._queue = queue.Queue()
+        self._held = None
+
+    def hold(self):
+        """暂存之后的投递，直到release()"""
+        self._held = []
+
+    def release(self, trades=None):
+        """先投递补拉到的交易，再投递暂存期间轮询器分发的交易（在事件循环线程中调用）"""
+        held, self._held = self._held or [], None
+        for batch in [trades] + held:
+            if batch:
+                self.deliver(batch)
+
+    def deliver(self, trades):
+        """投递新交易（在事件循环线程中调用，不能阻塞）"""
+        if self._held is not None:
+            self._held.append(trades)
+            return
+        if self.cursor is not None:
+            trades = [it for it in trades if self.cursor.is_new(it)]
+            if not trades:
+                return
+            self.cursor.advance(trades)
+        else:
+            self.cursor = HighWaterMark.from_trades(trades)
+        if self.sink is not None:
+            self.sink(self, trades)
+        else:
+            self._queue.put(trades)
+
+    def get(self, timeout=None):
+        """获取下一批新交易
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            按时间升序排列的新交易列表，超时返回空列表
+        """
+        try:
+            trades = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        # 合并已积压的批次，避免消费者落后时逐批处理
+        while True:
+            try:
+                trades.extend(self._queue.get_nowait())
+            except queue.Empty:
+                return trades
+
+class WalletPoller:
+    """单个钱包的轮询状态
+
+    每个钱包对应事件循环中的一个协程，每个tick只请求一次/activity，
+    将新交易分发给该钱包的所有订阅者。订阅者poll_seconds的最小值作为基准间隔，
+    实际间隔由PollScheduler根据钱包活跃度调整。
+    """
+
+    def __init__(self, target_user, cursor=None):
+        self.target_user = target_user
+        self.subscriptions = {}
+        self.cursor = cursor
+        self.polls = 0
+        self.last_poll_at = None
+        self.current_interval = None
+
+    @property
+    def interval(self):
+        """订阅者要求的基准轮询间隔"""
+        return min((sub.poll_seconds for sub in list(self.subscriptions.values())), default=5)
+
+    @property
+    def priority(self):
+        """订阅者中最高的限流优先级"""
+        return min((sub.priority for sub in list(self.subscriptions.values())), default=PRIORITY_MONITOR)
+
+    async def poll_once(self, client):
+        """请求去重窗口起点之后的交易，返回新交易列表（按时间升序）
+
+        先用较小的limit试探；结果按时间倒序返回，已处理的交易按唯一标识跳过。
+        高水位之前窗口内的交易只在已拉取的页中检查（补上游延迟索引的交易），
+        只有整页都不早于高水位时才翻页并扩大limit，保证突发交易不会遗漏。
+        """
+        page_min = get_config('POLL_PAGE_MIN', 8)
+        page_max = get_config('POLL_PAGE_MAX', 500)
+        max_rows = get_config('POLL_PAGE_MAX_ROWS', 3000)
+        priority = self.priority
+
+        # 首次轮询只建立高水位标记，不分发历史交易
+        if self.cursor is None:
+            params = {'user': self.target_user, 'type': 'TRADE', 'limit': page_min, 'sortBy': 'TIMESTAMP', 'sortDirection': 'DESC'}
+            activity_list = await client.fetch_latest_trades(params, priority=priority)
+            self.polls += 1
+            self.last_poll_at = time.time()
+            self.cursor = HighWaterMark.from_trades(activity_list)
+            logger.info(f"Poller for {self.target_user} initialized at timestamp {self.cursor.timestamp}")
+            return []
+
+        new_items = []
+        limit, offset = page_min, 0
+        while True:
+            params = {
+                'user': self.target_user, 'type': 'TRADE', 'limit': limit, 'offset': offset,
+                'start': self.cursor.floor, 'sortBy': 'TIMESTAMP', 'sortDirection': 'DESC'
+            }
+            page = await client.fetch_latest_trades(params, priority=priority)
+            self.polls += 1
+            self.last_poll_at = time.time()
+
+            reached_seen = False
+            for it in page:
+                ts = int(it.get('timestamp') or 0)
+                if ts < self.cursor.floor:
+                    reached_seen = True
+                    break
+                if ts < self.cursor.timestamp:
+                    reached_seen = True
+                if self.cursor.is_new(it):
+                    new_items.append(it)
+                # 同一秒内的交易顺序不确定，已处理交易只跳过不终止
+
+            if reached_seen or len(page) < limit:
+                break
+            offset += limit
+            if offset >= max_rows:
+                logger.warning(f"Poller for {self.target_user} found more than {max_rows} new trades in one poll, older ones may be skipped")
+                break
+            limit = min(limit * 2, page_max)
+
+        new_items.sort(key=lambda x: x.get('timestamp', 0))
+        self.cursor.advance(new_items)
+        return new_items
+
+    async def fetch_since(self, client, cursor):
+        """一次性拉取cursor之后的所有交易（订阅者加入已有轮询器时补拉），不影响轮询器的高水位
+
+        Returns:
+            cursor未处理过的交易列表（按时间升序）
+        """
+        limit = get_config('POLL_PAGE_MAX', 500)
+        max_rows = get_config('POLL_PAGE_MAX_ROWS', 3000)
+        new_items = []
+        offset = 0
+        while offset < max_rows:
+            params = {
+                'user': self.target_user, 'type': 'TRADE', 'limit': limit, 'offset': offset,
+                'start': cursor.floor, 'sortBy': 'TIMESTAMP', 'sortDirection': 'DESC'
+            }
+            page = await client.fetch_latest_trades(params, priority=self.priority)
+            new_items.extend(it for it in page if cursor.is_new(it))
+            if len(page) < limit:
+                break
+            offset += limit
+        else:
+            logger.warning(f"Catch-up for {self.target_user} found more than {max_rows} trades, older ones may be skipped")
+        new_items.sort(key=lambda x: x.get('timestamp', 0))
+        return new_items
+
+class IngestEngine:
+    """基于asyncio的采集引擎
+
+    在一个后台线程中运行事件循环，每个被订阅的钱包对应一个轮询协程，
+    数千个钱包共享同一个事件循环和异步连接池。监控任务的新交易交给
+    后写式写入器批量持久化，不再为每个任务创建线程和Flask应用。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._scheduler = None
+        self._pollers = {}
+        self._subscriber_wallets = {}
+        self._tasks = {}
+        # 写入队列满时由单个溢出线程按顺序阻塞提交，事件循环不等待
+        self._overflow = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-overflow')
+        self._overflow_lock = threading.Lock()
+        self._overflow_pending = 0
+        self._overflow_total = 0
+
+    # ---------- 生命周期 ----------
+
+    def start(self, app=None):
+        """启动事件循环线程；传入app时同时启动后写式写入器"""
+        with self._lock:
+            if self._loop is None:
+                ready = threading.Event()
+                thread = threading.Thread(target=self._run_loop, args=(ready,), name='ingest-engine', daemon=True)
+                thread.start()
+                ready.wait()
+        if app is not None:
+            write_behind.start(app)
+
+    def _run_loop(self, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._client = AsyncRequestUtil()
+        self._scheduler = PollScheduler.from_config()
+        loop.run_until_complete(self._client.open())
+        self._loop = loop
+        ready.set()
+        logger.info("Ingest engine event loop started")
+        loop.run_forever()
+
+    # ---------- 订阅 ----------
+
+    def subscribe(self, target_user, subscriber_id, poll_seconds=5, sink=None, cursor=None, priority=PRIORITY_MONITOR):
+        """订阅钱包的新交易
+
+        Args:
+            target_user: 目标用户钱包地址
+            subscriber_id: 订阅者ID（监控任务ID或跟单任务ID）
+            poll_seconds: 订阅者期望的轮询间隔（秒）
+            sink: 可选回调，在事件循环线程中以(subscription, trades)调用
+            cursor: 订阅者已持久化的HighWaterMark；钱包尚无轮询器时从该位置开始拉取，
+                已有轮询器时补拉一次该位置之后的交易，再接收轮询器分发的新交易
+            priority: 限流优先级，钱包按订阅者中最高的优先级请求
+
+        Returns:
+            Subscription实例
+        """
+        self.start()
+        wallet = target_user.lower()
+        subscription = Subscription(subscriber_id, target_user, poll_seconds, sink, cursor.copy() if cursor else None, priority)
+        with self._lock:
+            poller = self._pollers.get(wallet)
+            new_poller = poller is None
+            if new_poller:
+                poller = WalletPoller(wallet, cursor.copy() if cursor else None)
+                self._pollers[wallet] = poller
+            elif cursor is not None:
+                # 轮询器的高水位与订阅者的无关，补拉完成前暂存分发给该订阅者的交易
+                subscription.hold()
+            poller.subscriptions[subscriber_id] = subscription
+            self._subscriber_wallets[subscriber_id] = wallet
+        if new_poller:
+            asyncio.run_coroutine_threadsafe(self._run_poller(poller), self._loop)
+        elif cursor is not None:
+            asyncio.run_coroutine_threadsafe(self._catch_up(poller, subscription), self._loop)
+        logger.info(f"Subscriber {subscriber_id} subscribed to {wallet}")
+        return subscription
+
+    async def _catch_up(self, poller, subscription):
+        trades = []
+        try:
+            trades = await poller.fetch_since(self._client, subscription.cursor)
+            if trades:
+                logger.info(f"Caught up {len(trades)} trades of {poller.target_user} for subscriber {subscription.subscriber_id}")
+        except Exception as e:
+            logger.error(f"Catch-up of {poller.target_user} for subscriber {subscription.subscriber_id} failed: {str(e)}")
+        finally:
+            subscription.release(trades)
+
+    def unsubscribe(self, subscriber_id):
+        """取消订阅，最后一个订阅者离开时轮询协程自动退出"""
+        with self._lock:
+            wallet = self._subscriber_wallets.pop(subscriber_id, None)
+            poller = self._pollers.get(wallet)
+            if poller:
+                poller.subscriptions.pop(subscriber_id, None)
+        if wallet:
+            logger.info(f"Subscriber {subscriber_id} unsubscribed from {wallet}")
+
+    def _keep_running(self, poller):
+        """轮询器是否继续运行；没有订阅者时从注册表移除"""
+        with self._lock:
+            if poller.subscriptions:
+                return True
+            if self._pollers.get(poller.target_user) is poller:
+                del self._pollers[poller.target_user]
+            return False
+
+    async def _run_poller(self, poller):
+        scheduler = self._scheduler
+        logger.info(f"Started wallet poller for {poller.target_user}")
+        # 随机错开首次轮询，避免大量任务同时启动时集中请求
+        await asyncio.sleep(scheduler.initial_delay(poller.interval))
+        while self._keep_running(poller):
+            new_count = 0
+            try:
+                new_items = await poller.poll_once(self._client)
+                new_count = len(new_items)
+                if new_items:
+                    subscriptions = list(poller.subscriptions.values())
+                    for sub in subscriptions:
+                        sub.deliver(list(new_items))
+                    logger.info(f"Fan out {new_count} new trades of {poller.target_user} to {len(subscriptions)} subscribers")
+            except CircuitOpenError as e:
+                # 熔断期间所有钱包都会失败，不逐个记录错误
+                logger.debug(f"Wallet poller for {poller.target_user} skipped: {str(e)}")
+            except Exception as e:
+                logger.error(f"Error in wallet poller for {poller.target_user}: {str(e)}")
+            poller.current_interval = scheduler.next_interval(poller.current_interval, poller.interval, new_count, poller.priority)
+            await asyncio.sleep(scheduler.with_jitter(poller.current_interval))
+        logger.info(f"Stopped wallet poller for {poller.target_user}")
+
+    # ---------- 监控任务 ----------
+
+    def start_task(self, app, task_id, target_user, poll_seconds, cursor=None):
+        """启动监控任务：订阅钱包，新交易交给后写式写入器持久化
+
+        未传入cursor时读取任务已持久化的高水位，重新启动的任务从上次处理到的位置继续
+        """
+        self.start(app)
+        if cursor is None:
+            with app.app_context():
+                task = MonitorTask.query.filter_by(task_id=task_id).first()
+                cursor = HighWaterMark.from_columns(task.hwm_timestamp, task.hwm_tx_hashes) if task else None
+        self._tasks[task_id] = {
+            'target_user': target_user,
+            'poll_seconds': poll_seconds,
+            'status': 'running',
+            'created_at': time.time()
+        }
+        self.subscribe(target_user, task_id, poll_seconds, sink=self._enqueue_write, cursor=cursor)
+        logger.info(f"Started monitoring task {task_id} for user {target_user}, poll every {poll_seconds} seconds")
+
+    def has_task(self, task_id):
+        """监控任务是否在本进程中运行"""
+        return task_id in self._tasks
+
+    def stop_task(self, task_id):
+        """停止监控任务"""
+        task = self._tasks.pop(task_id, None)
+        self.unsubscribe(task_id)
+        if task:
+            logger.info(f"Monitoring task {task_id} stopped")
+
+    def _enqueue_write(self, subscription, trades):
+        # 在事件循环线程中调用；交易记录与高水位按顺序进入写入队列
+        ops = [
+            activity_op(trades, subscription.target_user, subscription.subscriber_id),
+            cursor_op(MonitorTask, subscription.subscriber_id, subscription.cursor.to_columns())
+        ]
+        self._submit_nowait([op for op in ops if op])
+
+    def _submit_nowait(self, ops):
+        """不阻塞地提交写操作
+
+        写入队列满时（未开启交易日志或日志追加失败）剩余的操作交给溢出线程阻塞提交；
+        溢出线程还有未提交的操作时后续操作也交给它，保证提交顺序不变。
+        """
+        with self._overflow_lock:
+            for i, op in enumerate(ops):
+                if not self._overflow_pending and write_behind.submit(op, block=False):
+                    continue
+                overflow = ops[i:]
+                self._overflow_pending += len(overflow)
+                self._overflow_total += len(overflow)
+                if self._overflow_pending == len(overflow):
+                    logger.warning("Write queue full, handing writes to the overflow thread")
+                self._overflow.submit(self._submit_blocking, overflow)
+                return
+
+    def _submit_blocking(self, ops):
+        for op in ops:
+            write_behind.submit(op)
+        with self._overflow_lock:
+            self._overflow_pending -= len(ops)
+
+    # ---------- 状态 ----------
+
+    def stats(self):
+        """返回引擎运行状态"""
+        with self._lock:
+            pollers = {
+                wallet: {
+                    'subscribers': len(poller.subscriptions),
+                    'priority': poller.priority,
+                    'base_interval': poller.interval,
+                    'current_interval': poller.current_interval,
+                    'hwm_timestamp': poller.cursor.timestamp if poller.cursor else None,
+                    'seen_keys': len(poller.cursor.keys) if poller.cursor else 0,
+                    'seen_bytes': poller.cursor.memory_bytes() if poller.cursor else 0,
+                    'subscriptions': {
+                        sub.subscriber_id: {
+                            'seen_keys': len(sub.cursor.keys) if sub.cursor else 0,
+                            'seen_bytes': sub.cursor.memory_bytes() if sub.cursor else 0
+                        }
+                        for sub in list(poller.subscriptions.values())
+                    },
+                    'polls': poller.polls,
+                    'last_poll_at': poller.last_poll_at
+                }
+                for wallet, poller in self._pollers.items()
+            }
+        return {
+            'wallets': len(pollers),
+            'tasks': len(self._tasks),
+            'write_queue_depth': write_behind.depth,
+            'write_overflow_pending': self._overflow_pending,
+            'write_overflow_total': self._overflow_total,
+            'scheduler': self._scheduler.stats() if self._scheduler else None,
+            'pollers': pollers
+        }
+
+# 全局实例
+ingest_engine = IngestEngine()
+register_metrics('ingest_engine', ingest_engine.stats)
+
+# 导出便捷函数
+def subscribe(target_user, subscriber_id, poll_seconds=5, cursor=None, priority=PRIORITY_MONITOR):
+    """订阅钱包新交易的便捷函数"""
+    return ingest_engine.subscribe(target_user, subscriber_id, poll_seconds, cursor=cursor, priority=priority)
+
+def unsubscribe(subscriber_id):
+    """取消订阅的便捷函数"""
+    ingest_engine.unsubscribe(subscriber_id)
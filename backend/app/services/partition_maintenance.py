@@ -0,0 +1,129 @@
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import inspect, text
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 分区表（按交易时间戳timestamp做RANGE分区，每月一个分区）
+PARTITIONED_TABLE = 'activity_record'
+# 兜底分区，接收超出最后一个月分区的数据
+FUTURE_PARTITION = 'p_future'
+
+def month_start(ts):
+    """时间戳所在月份的第一天（UTC）"""
+    dt = datetime.fromtimestamp(ts, timezone.utc)
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+def next_month(dt):
+    return datetime(dt.year + dt.month // 12, dt.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+def partition_definition(dt):
+    """dt所在月份的分区定义：pYYYYMM VALUES LESS THAN (下月第一天的时间戳)"""
+    return f"PARTITION p{dt:%Y%m} VALUES LESS THAN ({int(next_month(dt).timestamp())})"
+
+def list_partitions(conn):
+    """返回activity_record的分区列表[(名称, 上界时间戳或None)]，未分区时返回空列表"""
+    rows = conn.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {'table': PARTITIONED_TABLE}).all()
+    return [(name, None if desc == 'MAXVALUE' else int(desc)) for name, desc in rows]
+
+def partition_activity_record(conn, months_ahead=3):
+    """将activity_record改为按timestamp分区（仅MySQL）
+
+    分区表的每个唯一索引都必须包含分区字段，因此主键改为(id, timestamp)，
+    唯一标识索引改为(unique_key, timestamp)；同一笔交易的时间戳固定，去重语义不变。
+    该操作会重建整张表，应在低峰期执行。
+    """
+    if conn.dialect.name != 'mysql' or list_partitions(conn):
+        return False
+    min_ts = conn.execute(text(f"SELECT MIN(timestamp) FROM {PARTITIONED_TABLE}")).scalar()
+    now = datetime.now(timezone.utc).timestamp()
+    current = month_start(min_ts or now)
+    last = month_start(now)
+    for _ in range(months_ahead):
+        last = next_month(last)
+
+    partitions = []
+    while current <= last:
+        partitions.append(partition_definition(current))
+        current = next_month(current)
+    partitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+
+    conn.execute(text(
+        f"ALTER TABLE {PARTITIONED_TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp), "
+        "DROP INDEX unique_key, ADD UNIQUE INDEX unique_key (unique_key, timestamp)"
+    ))
+    conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} PARTITION BY RANGE (timestamp) ({', '.join(partitions)})"))
+    logger.info(f"Partitioned {PARTITIONED_TABLE} into {len(partitions)} partitions")
+    return True
+
+def ensure_future_partitions(conn, months_ahead=3):
+    """从兜底分区中拆分出未来months_ahead个月的分区（兜底分区通常为空，拆分很快）
+
+    Returns:
+        新建的分区名称列表
+    """
+    bounds = [bound for _, bound in list_partitions(conn) if bound is not None]
+    if not bounds:
+        return []
+    target = month_start(datetime.now(timezone.utc).timestamp())
+    for _ in range(months_ahead):
+        target = next_month(target)
+
+    definitions, names = [], []
+    current = month_start(max(bounds))
+    while current <= target:
+        definitions.append(partition_definition(current))
+        names.append(f"p{current:%Y%m}")
+        current = next_month(current)
+    if not definitions:
+        return []
+    definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+    conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} REORGANIZE PARTITION {FUTURE_PARTITION} INTO ({', '.join(definitions)})"))
+    logger.info(f"Created partitions {names}")
+    return names
+
+def expire_partitions(conn, retention_days, archive=False):
+    """删除全部数据都早于保留期的分区
+
+    Args:
+        retention_days: 保留天数，<=0表示永久保留
+        archive: 为True时先把分区交换到独立的归档表activity_record_archive_pYYYYMM再删除
+
+    Returns:
+        已删除的分区名称列表
+    """
+    if retention_days <= 0:
+        return []
+    cutoff = datetime.now(timezone.utc).timestamp() - retention_days * 86400
+    expired = [name for name, bound in list_partitions(conn) if bound is not None and bound <= cutoff]
+    for name in expired:
+        if archive:
+            archive_table = f"{PARTITIONED_TABLE}_archive_{name}"
+            if not inspect(conn).has_table(archive_table):
+                # 新建的归档表复制了分区定义，交换分区前需要去掉；已存在的归档表（上次中断时创建）已去掉分区
+                conn.execute(text(f"CREATE TABLE {archive_table} LIKE {PARTITIONED_TABLE}"))
+                conn.execute(text(f"ALTER TABLE {archive_table} REMOVE PARTITIONING"))
+            conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} EXCHANGE PARTITION {name} WITH TABLE {archive_table}"))
+            logger.info(f"Archived partition {name} to {archive_table}")
+        conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} DROP PARTITION {name}"))
+        logger.info(f"Dropped partition {name}")
+    return expired
+
+def run_partition_maintenance(engine, months_ahead=3, retention_days=0, archive=False):
+    """分区维护：预建未来分区，按保留策略删除或归档过期分区
+
+    Returns:
+        {'created': [...], 'expired': [...]}，数据库不是MySQL或表未分区时返回None
+    """
+    with engine.connect() as conn:
+        if conn.dialect.name != 'mysql' or not list_partitions(conn):
+            return None
+        return {
+            'created': ensure_future_partitions(conn, months_ahead),
+            'expired': expire_partitions(conn, retention_days, archive)
+        }
@@ -0,0 +1,73 @@
+import logging
+import random
+from app.utils.rate_limit import PRIORITY_COPY_TRADE, PRIORITY_MONITOR, get_rate_limiter
+from app.utils.request_util import get_config
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+class PollScheduler:
+    """自适应轮询调度器
+
+    - 钱包刚有新交易时立即降到最小间隔，提高活跃钱包的发现速度；
+    - 跟单订阅不退避，始终按订阅者要求的间隔轮询，保证跟单延迟；
+    - 只有监控订阅的钱包连续空轮询时按退避系数逐步放慢，上限为订阅间隔的max_multiple倍
+      且不超过max_seconds（订阅间隔本身超过max_seconds时不放慢），即空闲钱包出现
+      新交易时最多晚max(订阅间隔, min(max_seconds, 订阅间隔 × max_multiple))秒发现；
+    - 首次轮询随机错开、每次间隔加入抖动，避免所有钱包同时发请求；
+    - 请求速率由所有进程共享的全局限流器控制（在发送请求时获取令牌）。
+    """
+
+    def __init__(self, min_seconds=1.0, max_seconds=30.0, backoff=1.5, jitter=0.1, max_multiple=4.0):
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.backoff = backoff
+        self.max_multiple = max_multiple
+        self.jitter = jitter
+
+    @classmethod
+    def from_config(cls):
+        """根据应用配置创建调度器"""
+        return cls(
+            min_seconds=get_config('POLL_MIN_SECONDS', 1.0),
+            max_seconds=get_config('POLL_MAX_SECONDS', 30.0),
+            backoff=get_config('POLL_BACKOFF_FACTOR', 1.5),
+            jitter=get_config('POLL_JITTER', 0.1),
+            max_multiple=get_config('POLL_BACKOFF_MAX_MULTIPLE', 4.0)
+        )
+
+    def initial_delay(self, base_seconds):
+        """首次轮询前的随机错峰延迟"""
+        return random.uniform(0, base_seconds)
+
+    def next_interval(self, current, base_seconds, new_count, priority=PRIORITY_MONITOR):
+        """计算下一次轮询间隔
+
+        Args:
+            current: 当前间隔（秒），首次为None
+            base_seconds: 订阅者要求的轮询间隔（秒）
+            new_count: 本次轮询发现的新交易数
+            priority: 钱包订阅者中最高的限流优先级，跟单钱包不退避
+
+        Returns:
+            下一次轮询间隔（秒，未加抖动）
+        """
+        if new_count:
+            return min(self.min_seconds, base_seconds)
+        if current is None or priority <= PRIORITY_COPY_TRADE:
+            return base_seconds
+        ceiling = max(base_seconds, min(self.max_seconds, base_seconds * self.max_multiple))
+        return min(ceiling, max(current, self.min_seconds) * self.backoff)
+
+    def with_jitter(self, interval):
+        """为间隔加入随机抖动"""
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def stats(self):
+        """返回调度器状态"""
+        return {
+            'min_seconds': self.min_seconds,
+            'max_seconds': self.max_seconds,
+            'max_multiple': self.max_multiple,
+            'rate_limiter': get_rate_limiter().stats()
+        }
@@ -0,0 +1,320 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 文件锁为可选依赖（仅Unix），不可用时多进程不能共享同一个日志目录
+try:
+    import fcntl
+except ImportError:
+    logger.warning("fcntl不可用，交易日志目录不做进程间互斥")
+    fcntl = None
+
+# 记录头：载荷长度、载荷CRC32
+HEADER = struct.Struct('<II')
+# 每个进程最多尝试认领的日志槽位数
+MAX_SLOTS = 64
+
+def encode_op(op):
+    """将写操作编码为JSON字节（二进制唯一标识转为十六进制，模型类转为类名）"""
+    kind = op[0]
+    if kind == 'activity':
+        payload = {'t': kind, 'rows': [dict(row, unique_key=row['unique_key'].hex()) for row in op[1]]}
+    elif kind == 'copy_trade':
+        payload = {'t': kind, 'row': op[1]}
+    else:
+        _, model, task_id, hwm = op
+        payload = {'t': kind, 'model': model.__name__, 'task_id': task_id, 'hwm': list(hwm)}
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+def iter_records(view, offset, size):
+    """从offset开始依次返回完整且CRC正确的记录：(记录结束位置, 载荷)，遇到残缺或损坏的记录停止"""
+    while offset + HEADER.size <= size:
+        length, crc = HEADER.unpack_from(view, offset)
+        end = offset + HEADER.size + length
+        if end > size:
+            return
+        payload = view[offset + HEADER.size:end]
+        if zlib.crc32(payload) != crc:
+            return
+        yield end, payload
+        offset = end
+
+def decode_op(data):
+    """encode_op的逆操作"""
+    # 延迟导入避免循环依赖
+    from app import models
+    payload = json.loads(data)
+    kind = payload['t']
+    if kind == 'activity':
+        return kind, [dict(row, unique_key=bytes.fromhex(row['unique_key'])) for row in payload['rows']]
+    if kind == 'copy_trade':
+        return kind, payload['row']
+    return kind, getattr(models, payload['model']), payload['task_id'], tuple(payload['hwm'])
+
+class TradeJournal:
+    """进程本地的只追加交易日志
+
+    写操作先追加到磁盘上的分段文件（记录=长度+CRC32+JSON），后台线程按fsync_interval
+    批量fsync；写入线程通过mmap顺序读取日志并批量写库，提交成功后记录检查点并删除
+    已写完的分段。数据库故障期间采集照常追加日志，恢复后从检查点追上；
+    进程重启时认领同一个槽位目录，自动重放上次未写完的分段；启动时还会接管
+    其他未被占用的槽位（进程数减少后无人认领）中未写完的记录，复制到本槽位后删除。
+    """
+
+    def __init__(self, base_dir, segment_bytes=64 * 1024 * 1024, fsync_interval=0.05):
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.directory = self._claim_slot(base_dir)
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._dirty = False
+        self._counters = {'appended': 0, 'appended_bytes': 0, 'read': 0, 'fsyncs': 0, 'corrupt_tails': 0, 'adopted': 0}
+
+        segments = self._segments()
+        self._read_segment, self._read_offset = self._load_checkpoint(self.directory, segments)
+        # 总是写入新的分段，不在可能有残缺尾部的旧分段后追加
+        self._write_segment = (segments[-1] + 1) if segments else 0
+        self._write_offset = 0
+        self._fd = self._open_segment(self._write_segment)
+        if segments:
+            logger.info(f"Journal {self.directory} has {len(segments)} unflushed segments, replaying from segment {self._read_segment} offset {self._read_offset}")
+        self._adopt_orphans(base_dir)
+
+        self._fsync_thread = threading.Thread(target=self._run_fsync, name='journal-fsync', daemon=True)
+        self._fsync_thread.start()
+
+    # ---------- 目录与分段 ----------
+
+    def _claim_slot(self, base_dir):
+        """认领一个未被其他进程占用的槽位目录"""
+        for slot in range(MAX_SLOTS if fcntl else 1):
+            directory = os.path.join(base_dir, f"slot-{slot}")
+            os.makedirs(directory, exist_ok=True)
+            lock_file = open(os.path.join(directory, 'lock'), 'w')
+            if fcntl is None:
+                self._lock_file = lock_file
+                return directory
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            # 持有文件句柄直到进程退出
+            self._lock_file = lock_file
+            return directory
+        raise RuntimeError(f"No free journal slot in {base_dir}")
+
+    def _adopt_orphans(self, base_dir):
+        """把其他空闲槽位中检查点之后的记录复制到本槽位的写入分段，然后删除这些槽位的分段
+
+        持有槽位的进程存活时文件锁获取失败，不会被接管。复制后、删除前崩溃时这些记录
+        会被重放两次，写库操作按唯一键幂等，不会重复写入。
+        """
+        if fcntl is None:
+            return
+        for name in sorted(os.listdir(base_dir)):
+            directory = os.path.join(base_dir, name)
+            if not name.startswith('slot-') or directory == self.directory or not os.path.isdir(directory):
+                continue
+            segments = self._segments(directory)
+            if not segments:
+                continue
+            with open(os.path.join(directory, 'lock'), 'w') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue
+                segments = self._segments(directory)
+                segment, offset = self._load_checkpoint(directory, segments)
+                adopted = 0
+                for old in segments:
+                    if old < segment:
+                        continue
+                    path = self._segment_path(old, directory)
+                    size = os.path.getsize(path)
+                    if size > (offset if old == segment else 0):
+                        with open(path, 'rb') as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as view:
+                            for _, payload in iter_records(view, offset if old == segment else 0, size):
+                                os.write(self._fd, HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+                                self._write_offset += HEADER.size + len(payload)
+                                adopted += 1
+                os.fsync(self._fd)
+                for old in segments:
+                    os.remove(self._segment_path(old, directory))
+                checkpoint = os.path.join(directory, 'checkpoint')
+                if os.path.exists(checkpoint):
+                    os.remove(checkpoint)
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self._counters['adopted'] += adopted
+            if adopted:
+                logger.info(f"Journal {self.directory} adopted {adopted} unflushed records from orphaned {directory}")
+
+    def _segment_path(self, segment, directory=None):
+        return os.path.join(directory or self.directory, f"{segment:010d}.seg")
+
+    def _segments(self, directory=None):
+        return sorted(int(name[:-4]) for name in os.listdir(directory or self.directory) if name.endswith('.seg'))
+
+    def _open_segment(self, segment):
+        return os.open(self._segment_path(segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def _load_checkpoint(self, directory, segments):
+        path = os.path.join(directory, 'checkpoint')
+        if os.path.exists(path):
+            with open(path) as f:
+                segment, offset = (int(x) for x in f.read().split())
+            return segment, offset
+        return (segments[0] if segments else 0), 0
+
+    # ---------- 追加 ----------
+
+    def append(self, op):
+        """追加一条写操作（写入页缓存，由后台线程批量fsync）"""
+        payload = encode_op(op)
+        record = HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._write_offset >= self.segment_bytes:
+                self._rotate()
+            os.write(self._fd, record)
+            self._write_offset += len(record)
+            self._dirty = True
+            self._counters['appended'] += 1
+            self._counters['appended_bytes'] += len(record)
+            self._available.notify()
+
+    def _rotate(self):
+        os.fsync(self._fd)
+        os.close(self._fd)
+        self._write_segment += 1
+        self._write_offset = 0
+        self._fd = self._open_segment(self._write_segment)
+
+    def _run_fsync(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            self.sync()
+
+    def sync(self):
+        """将已追加的记录fsync到磁盘"""
+        with self._lock:
+            if not self._dirty:
+                return
+            # 复制文件描述符后在锁外fsync：轮转关闭原描述符后编号可能被复用，复制的描述符仍指向该分段
+            fd = os.dup(self._fd)
+            self._dirty = False
+            self._counters['fsyncs'] += 1
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # ---------- 读取 ----------
+
+    def read_batch(self, max_rows, timeout, weight=lambda op: 1):
+        """从检查点之后读取一批写操作
+
+        Args:
+            max_rows: 本批最多读取的行数（按weight计算）
+            timeout: 没有新记录时最长等待时间（秒）
+            weight: 计算一条写操作行数的函数
+
+        Returns:
+            (写操作列表, 读取结束位置)，位置在写库成功后传给commit()
+        """
+        ops = self._read(max_rows, weight)
+        if not ops and timeout > 0:
+            with self._lock:
+                if not self._has_unread():
+                    self._available.wait(timeout)
+            ops = self._read(max_rows, weight)
+        return ops, (self._read_segment, self._read_offset)
+
+    def has_unread(self):
+        """检查点之后是否还有未读出的记录（包括重启后待重放的记录）"""
+        with self._lock:
+            return self._has_unread()
+
+    def _has_unread(self):
+        return (self._read_segment, self._read_offset) < (self._write_segment, self._write_offset)
+
+    def _read(self, max_rows, weight):
+        ops = []
+        rows = 0
+        while rows < max_rows:
+            with self._lock:
+                write_segment = self._write_segment
+            path = self._segment_path(self._read_segment)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            sealed = self._read_segment < write_segment
+
+            if self._read_offset < size:
+                read_before = len(ops)
+                with open(path, 'rb') as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as view:
+                    for end, payload in iter_records(view, self._read_offset, size):
+                        op = decode_op(payload)
+                        ops.append(op)
+                        rows += weight(op)
+                        self._read_offset = end
+                        if rows >= max_rows:
+                            break
+                with self._lock:
+                    self._counters['read'] += len(ops) - read_before
+                if self._read_offset < size and not sealed:
+                    # 活动分段中的记录可能还在写入，下次再读
+                    break
+
+            if not sealed:
+                break
+            if self._read_offset < size:
+                # 已封闭分段的残缺尾部（进程在写入时崩溃），跳过
+                if rows < max_rows:
+                    logger.warning(f"Skipping corrupt tail of journal segment {path} at offset {self._read_offset}")
+                    with self._lock:
+                        self._counters['corrupt_tails'] += 1
+                else:
+                    break
+            self._read_segment += 1
+            self._read_offset = 0
+        return ops
+
+    # ---------- 检查点 ----------
+
+    def commit(self, position):
+        """记录已写库的位置，并删除之前的分段"""
+        segment, offset = position
+        path = os.path.join(self.directory, 'checkpoint')
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(f"{segment} {offset}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        for old in self._segments():
+            if old < segment:
+                os.remove(self._segment_path(old))
+
+    @property
+    def pending(self):
+        """本进程追加后尚未读出的记录数（不含重启后重放的记录）"""
+        with self._lock:
+            return max(0, self._counters['appended'] - self._counters['read'])
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'directory': self.directory,
+                'pending': max(0, stats['appended'] - stats['read']),
+                'segments': self._write_segment - self._read_segment + 1,
+                'write_position': [self._write_segment, self._write_offset],
+                'read_position': [self._read_segment, self._read_offset]
+            })
+        return stats
@@ -0,0 +1,387 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from app.extensions import db
+from app.services.activity_store import activity_rows, insert_activity_rows
+from app.services.copy_trade_stats import insert_copy_trade_records
+from app.services.dimensions import intern_copy_trade_rows
+from app.services.trade_journal import TradeJournal, encode_op
+from app.utils.dedup_util import activity_index
+from app.utils.metrics_util import register_metrics
+from app.utils.request_util import get_config
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+def activity_op(trades, target_user, task_id=None):
+    """交易记录的写操作，没有需要写入的行时返回None"""
+    rows = activity_rows(trades, target_user, task_id)
+    return ('activity', rows) if rows else None
+
+def cursor_op(model, task_id, hwm):
+    """任务高水位更新的写操作"""
+    return ('cursor', model, task_id, hwm)
+
+def is_transient(error):
+    """是否为连接、锁等待等暂时性错误（重试可能成功）；约束冲突、数据错误等重试不会成功"""
+    if isinstance(error, (OperationalError, InterfaceError, PoolTimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+def op_rows(op):
+    """写操作包含的行数"""
+    return len(op[1]) if op[0] == 'activity' else 1
+
+class WriteBehindWriter:
+    """后写式批量写入器
+
+    轮询和跟单线程只提交写操作，由后台线程每flush_interval秒或攒够batch_size行
+    在一个事务中批量写入，数据库延迟不再阻塞检测和下单。
+    操作按提交顺序写入，高水位更新总是与之前提交的交易记录同批或更晚提交。
+
+    配置了journal_dir时写操作先追加到本地交易日志（TradeJournal），后台线程从日志读取，
+    提交成功后推进日志检查点：数据库不可用期间采集不受影响，恢复后按顺序追上，
+    进程退出或崩溃时未写库的操作在下次启动时重放。
+    未配置日志时使用有界内存队列，队列满时提交方阻塞等待（背压；不能阻塞的调用方用block=False），
+    写入失败时整批退避重试，进程退出时写完队列中剩余的操作。
+    数据错误（非连接类错误）重试max_attempts次后二分整批，只把单独写入仍失败的操作
+    记录到死信文件并跳过，不会因为一条坏数据阻塞后面所有的写入。
+    """
+
+    def __init__(self, max_queue=50000, batch_size=500, flush_interval=0.2,
+                 journal_dir=None, journal_segment_bytes=64 * 1024 * 1024, journal_fsync_interval=0.05,
+                 max_attempts=5, dead_letter_path=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+        self.journal_dir = journal_dir
+        self.journal_segment_bytes = journal_segment_bytes
+        self.journal_fsync_interval = journal_fsync_interval
+        self._journal = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._app = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._counters = {
+            'submitted': 0,
+            'blocked_submits': 0,
+            'journal_errors': 0,
+            'flushes': 0,
+            'activity_inserted': 0,
+            'copy_trades_inserted': 0,
+            'cursor_updates': 0,
+            'errors': 0,
+            'dropped': 0,
+            'dead_letters': 0
+        }
+        self._latency = {'last_ms': 0, 'max_ms': 0, 'total_ms': 0}
+
+    @classmethod
+    def from_config(cls):
+        """根据应用配置创建写入器"""
+        return cls(
+            max_queue=get_config('WRITE_BEHIND_MAX_QUEUE', 50000),
+            batch_size=get_config('WRITE_BEHIND_BATCH_SIZE', 500),
+            flush_interval=get_config('WRITE_BEHIND_FLUSH_MS', 200) / 1000,
+            journal_dir=get_config('JOURNAL_DIR', 'data/journal') if get_config('JOURNAL_ENABLED', True) else None,
+            journal_segment_bytes=get_config('JOURNAL_SEGMENT_MB', 64) * 1024 * 1024,
+            journal_fsync_interval=get_config('JOURNAL_FSYNC_MS', 50) / 1000,
+            max_attempts=get_config('WRITE_BEHIND_MAX_ATTEMPTS', 5),
+            dead_letter_path=get_config('WRITE_BEHIND_DEAD_LETTER', 'data/write_behind_dead_letter.jsonl')
+        )
+
+    def _incr(self, counter, n=1):
+        with self._lock:
+            self._counters[counter] += n
+
+    # ---------- 生命周期 ----------
+
+    def start(self, app):
+        """启动后台写入线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._app = app
+            if self.journal_dir:
+                try:
+                    self._journal = TradeJournal(self.journal_dir, self.journal_segment_bytes, self.journal_fsync_interval)
+                except Exception as e:
+                    logger.error(f"Open trade journal in {self.journal_dir} failed, using in-memory queue: {str(e)}")
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+        logger.info(f"Write-behind writer started (journal: {self._journal.directory if self._journal else 'disabled'})")
+
+    def stop(self, timeout=10):
+        """停止写入线程，等待队列中剩余的操作写完"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(f"Write-behind writer did not finish in {timeout} seconds, {self.depth} operations pending")
+
+    # ---------- 提交 ----------
+
+    def submit(self, op, block=True):
+        """提交写操作：追加到交易日志；未开启日志或追加失败时放入内存队列
+
+        Args:
+            op: 写操作
+            block: 内存队列满时是否阻塞等待；为False时不阻塞，直接返回False
+
+        Returns:
+            是否已提交
+        """
+        if self._journal is not None:
+            try:
+                self._journal.append(op)
+                self._incr('submitted')
+                return True
+            except OSError as e:
+                self._incr('journal_errors')
+                logger.error(f"Append to trade journal failed, queueing in memory: {str(e)}")
+        try:
+            self._queue.put_nowait(op)
+        except queue.Full:
+            self._incr('blocked_submits')
+            if not block:
+                return False
+            self._queue.put(op)
+        self._incr('submitted')
+        return True
+
+    def submit_activity(self, trades, target_user, task_id=None):
+        """提交交易记录（activity_record）"""
+        op = activity_op(trades, target_user, task_id)
+        if op:
+            self.submit(op)
+
+    def submit_copy_trade(self, row):
+        """提交跟单记录（copy_trade_record的列名到值的字典）"""
+        self.submit(('copy_trade', row))
+
+    def submit_cursor(self, model, task_id, hwm):
+        """提交任务高水位更新
+
+        Args:
+            model: MonitorTask或CopyTradeConfig
+            task_id: 任务ID
+            hwm: HighWaterMark.to_columns()的返回值
+        """
+        self.submit(cursor_op(model, task_id, hwm))
+
+    # ---------- 写入 ----------
+
+    def _run(self):
+        with self._app.app_context():
+            while True:
+                batch, position = self._collect()
+                if batch:
+                    if not self._flush_with_retry(batch, position):
+                        break
+                elif self._stopping.is_set():
+                    break
+        logger.info("Write-behind writer stopped")
+
+    def _collect(self):
+        """收集一批操作：攒够batch_size行或等待超过flush_interval
+
+        一批操作只来自交易日志或只来自内存队列（日志追加失败时的退路），两种来源不混在同一批中，
+        批内保持各自的提交顺序；日志中有待写入的操作时先写日志（更早提交）。
+
+        Returns:
+            (操作列表, 交易日志读取位置)，未从日志读取时位置为None
+        """
+        batch = []
+        rows = 0
+        position = None
+        deadline = time.monotonic() + self.flush_interval
+        from_journal = self._journal is not None and (self._journal.has_unread() or self._queue.empty())
+        while rows < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if from_journal:
+                ops, position = self._journal.read_batch(self.batch_size - rows, max(timeout, 0), weight=op_rows)
+                if not ops:
+                    break
+                batch.extend(ops)
+                rows += sum(op_rows(op) for op in ops)
+                continue
+            try:
+                # 开启日志时内存队列只取已有的操作，不等待，避免推迟日志中的操作
+                if timeout > 0 and self._journal is None:
+                    op = self._queue.get(timeout=timeout)
+                else:
+                    op = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(op)
+            rows += op_rows(op)
+        return batch, position
+
+    def _flush_with_retry(self, batch, position=None):
+        """写入一批操作，失败时退避重试
+
+        Returns:
+            False表示退出时放弃写入（剩余操作留在交易日志中），写入线程应停止
+        """
+        attempt = 0
+        while True:
+            try:
+                self._flush(batch)
+                if position is not None:
+                    self._commit_journal(position)
+                return True
+            except Exception as e:
+                db.session.rollback()
+                self._incr('errors')
+                attempt += 1
+                logger.error(f"Write-behind flush of {len(batch)} operations failed (attempt {attempt}): {str(e)}")
+                if not is_transient(e) and attempt >= self.max_attempts:
+                    # 数据错误：逐步二分，跳过无法写入的操作后推进检查点
+                    try:
+                        self._flush_isolating(batch)
+                    except Exception as error:
+                        logger.error(f"Write-behind isolation of {len(batch)} operations interrupted: {str(error)}")
+                    else:
+                        if position is not None:
+                            self._commit_journal(position)
+                        return True
+                if self._stopping.is_set() and attempt >= 3:
+                    if self._journal is not None:
+                        logger.error(f"Database unavailable on shutdown, {self.depth + len(batch)} operations left in journal for replay")
+                        return False
+                    self._incr('dropped', len(batch))
+                    logger.error(f"Dropped {len(batch)} operations on shutdown")
+                    return True
+                time.sleep(min(2 ** attempt * 0.1, 10))
+            finally:
+                db.session.remove()
+
+    def _flush_isolating(self, batch):
+        """二分写入一批操作，单独写入仍失败的操作记录到死信文件
+
+        已写入的部分在重试整批时会被重放（交易记录、跟单记录按唯一键忽略，高水位更新幂等）。
+        遇到暂时性错误时抛出，由调用方整批退避重试。
+        """
+        try:
+            self._flush(batch)
+            return
+        except Exception as e:
+            db.session.rollback()
+            if is_transient(e):
+                raise
+            if len(batch) == 1:
+                self._dead_letter(batch[0], e)
+                return
+        finally:
+            db.session.remove()
+        middle = len(batch) // 2
+        self._flush_isolating(batch[:middle])
+        self._flush_isolating(batch[middle:])
+
+    def _dead_letter(self, op, error):
+        """把无法写入的操作追加到死信文件（JSON Lines），便于排查后手动补写"""
+        self._incr('dead_letters')
+        logger.error(f"Write-behind dropped {op[0]} operation ({op_rows(op)} rows) after repeated failures: {str(error)}")
+        if not self.dead_letter_path:
+            return
+        record = {
+            'time': datetime.utcnow().isoformat(),
+            'error': str(error),
+            'op': json.loads(encode_op(op))
+        }
+        try:
+            directory = os.path.dirname(self.dead_letter_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        except OSError as e:
+            logger.error(f"Write dead letter to {self.dead_letter_path} failed: {str(e)}")
+
+    def _commit_journal(self, position):
+        try:
+            self._journal.commit(position)
+        except OSError as e:
+            # 检查点未推进时重启会重放已写入的操作：交易记录和跟单记录由唯一约束忽略，
+            # 高水位更新本身是幂等的
+            self._incr('journal_errors')
+            logger.error(f"Trade journal checkpoint failed: {str(e)}")
+
+    def _flush(self, batch):
+        started = time.monotonic()
+        rows, copy_trades, cursors = [], [], {}
+        for op in batch:
+            if op[0] == 'activity':
+                rows.extend(op[1])
+            elif op[0] == 'copy_trade':
+                copy_trades.append(op[1])
+            elif op[0] == 'cursor':
+                # 同一任务只保留最新的高水位
+                _, model, task_id, hwm = op
+                cursors[(model, task_id)] = hwm
+
+        # 维度id在写入事实表之前解析，新的维度行与事实表在同一事务中提交
+        copy_trade_rows = intern_copy_trade_rows(copy_trades)
+        inserted, keys = insert_activity_rows(rows)
+        copy_trades_inserted = 0
+        if copy_trades:
+            # 显式设置创建时间，记录与任务统计的最后交易时间一致
+            now = datetime.utcnow()
+            for row in copy_trade_rows:
+                row.setdefault('created_at', now)
+            copy_trades_inserted = insert_copy_trade_records(copy_trade_rows)
+        for (model, task_id), (hwm_timestamp, hwm_tx_hashes) in cursors.items():
+            model.query.filter_by(task_id=task_id).update({
+                'hwm_timestamp': hwm_timestamp,
+                'hwm_tx_hashes': hwm_tx_hashes
+            })
+        db.session.commit()
+        activity_index.add_many(keys)
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._counters['flushes'] += 1
+            self._counters['activity_inserted'] += inserted
+            self._counters['copy_trades_inserted'] += copy_trades_inserted
+            self._counters['cursor_updates'] += len(cursors)
+            self._latency['last_ms'] = round(elapsed_ms, 2)
+            self._latency['max_ms'] = max(self._latency['max_ms'], round(elapsed_ms, 2))
+            self._latency['total_ms'] += elapsed_ms
+        if inserted or copy_trades_inserted:
+            logger.info(f"Write-behind flushed {inserted} activity records, {copy_trades_inserted} copy trades")
+
+    # ---------- 状态 ----------
+
+    @property
+    def depth(self):
+        return self._queue.qsize() + (self._journal.pending if self._journal is not None else 0)
+
+    def stats(self):
+        """返回队列深度、写入延迟等指标"""
+        with self._lock:
+            stats = dict(self._counters)
+            flushes = stats['flushes']
+            stats.update({
+                'queue_depth': self.depth,
+                'max_queue': self._queue.maxsize,
+                'running': self._thread is not None and self._thread.is_alive(),
+                'flush_last_ms': self._latency['last_ms'],
+                'flush_max_ms': self._latency['max_ms'],
+                'flush_avg_ms': round(self._latency['total_ms'] / flushes, 2) if flushes else None,
+                'journal': self._journal.stats() if self._journal is not None else None
+            })
+        return stats
+
+# 全局实例
+write_behind = WriteBehindWriter.from_config()
+register_metrics('write_behind', write_behind.stats)
@@ -0,0 +1,195 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from app.utils.redis_util import get_redis
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 释放锁的Lua脚本：只删除自己持有的锁
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class LRUCache:
+    """线程安全的带TTL的LRU缓存"""
+
+    def __init__(self, maxsize=1024, ttl=2):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """返回缓存值，不存在或已过期返回None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+class TwoTierCache:
+    """两级缓存：进程内LRU + Redis共享缓存
+
+    get_or_load在两级都未命中时才调用loader，并做请求合并：
+    - 进程内：同一个key只有一个线程执行loader，其他线程等待结果；
+    - 跨进程：通过Redis SET NX锁保证只有一个进程请求上游，其他进程轮询共享缓存。
+    Redis不可用时退化为仅使用进程内缓存。
+    """
+
+    def __init__(self, name, local_ttl=2, shared_ttl=5, local_maxsize=1024, lock_timeout=10):
+        self.name = name
+        self.local = LRUCache(local_maxsize, local_ttl)
+        self.shared_ttl = shared_ttl
+        self.lock_timeout = lock_timeout
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'coalesced_local': 0,
+            'coalesced_shared': 0,
+            'errors': 0
+        }
+
+    def _incr(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _redis_key(self, key):
+        return f"cache:{self.name}:{key}"
+
+    def get_or_load(self, key, loader):
+        """读取缓存，未命中时调用loader加载
+
+        Args:
+            key: 规范化后的缓存键
+            loader: 无参函数，返回可JSON序列化的值
+
+        Returns:
+            缓存值或loader的返回值
+        """
+        value = self.local.get(key)
+        if value is not None:
+            self._incr('local_hits')
+            return value
+
+        # 进程内请求合并
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = {'event': threading.Event(), 'value': None, 'error': None}
+                self._inflight[key] = flight
+        if not leader:
+            self._incr('coalesced_local')
+            flight['event'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return flight['value']
+
+        try:
+            flight['value'] = self._load_shared(key, loader)
+            self.local.set(key, flight['value'])
+            return flight['value']
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight['event'].set()
+
+    def _load_shared(self, key, loader):
+        client = get_redis()
+        if client is None:
+            self._incr('misses')
+            return loader()
+
+        redis_key = self._redis_key(key)
+        lock_key = f"{redis_key}:lock"
+        try:
+            cached = client.get(redis_key)
+            if cached is not None:
+                self._incr('shared_hits')
+                return json.loads(cached)
+
+            # 跨进程请求合并：抢到锁的进程请求上游，其他进程等待共享缓存
+            token = uuid.uuid4().hex
+            if not client.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000)):
+                deadline = time.monotonic() + self.lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    cached = client.get(redis_key)
+                    if cached is not None:
+                        self._incr('coalesced_shared')
+                        return json.loads(cached)
+                    if not client.exists(lock_key):
+                        break
+                token = None
+        except Exception as e:
+            logger.warning(f"Shared cache {self.name} unavailable: {str(e)}")
+            self._incr('errors')
+            self._incr('misses')
+            return loader()
+
+        self._incr('misses')
+        try:
+            value = loader()
+            try:
+                client.set(redis_key, json.dumps(value), ex=self.shared_ttl)
+            except Exception as e:
+                logger.warning(f"Write shared cache {self.name} failed: {str(e)}")
+                self._incr('errors')
+            return value
+        finally:
+            if token is not None:
+                try:
+                    client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except Exception:
+                    pass
+
+    def stats(self):
+        """返回命中统计"""
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters['local_hits'] + counters['shared_hits'] + counters['misses'] + \
+            counters['coalesced_local'] + counters['coalesced_shared']
+        counters['local_size'] = len(self.local)
+        counters['hit_ratio'] = round((lookups - counters['misses']) / lookups, 4) if lookups else None
+        return counters
+
+def normalize_cache_key(params):
+    """将查询参数规范化为缓存键（忽略空值、排序、地址小写）"""
+    normalized = {}
+    for k, v in params.items():
+        if v in (None, '', []):
+            continue
+        if isinstance(v, str) and v.startswith('0x'):
+            v = v.lower()
+        if isinstance(v, list):
+            v = sorted(v)
+        normalized[k] = v
+    return json.dumps(normalized, sort_keys=True, separators=(',', ':'))
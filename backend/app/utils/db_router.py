@@ -0,0 +1,218 @@
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from app.utils.metrics_util import register_metrics
+from app.utils.request_util import get_config
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 只读副本在SQLALCHEMY_BINDS中的键前缀（replica_0、replica_1...）
+REPLICA_BIND_PREFIX = 'replica_'
+
+# session.info中缓存本会话选定的副本键（None表示主库）
+REPLICA_INFO_KEY = 'replica'
+
+# 当前上下文中的查询是否允许走只读副本
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+class ReplicaRouter:
+    """只读副本选择器
+
+    在副本间轮询；复制延迟超过REPLICA_MAX_LAG_SECONDS或无法连接的副本不参与，
+    没有可用副本时回退到主库。当前用户在REPLICA_READ_YOUR_WRITES_SECONDS内写过数据时
+    也回退到主库，保证读到自己刚写入的内容。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lag = {}  # 副本键 -> (检查时间, 延迟秒数或None)
+        self._next = 0
+        self._recent_writes = {}  # Redis不可用时的进程内写入记录：用户 -> 时间
+        self._counters = {'replica_reads': 0, 'primary_reads': 0, 'read_your_writes': 0, 'lag_fallbacks': 0}
+
+    def _incr(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def replica_keys(self):
+        return sorted(key for key in (get_config('SQLALCHEMY_BINDS') or {}) if key.startswith(REPLICA_BIND_PREFIX))
+
+    # ---------- 复制延迟 ----------
+
+    def _measure_lag(self, engine):
+        """返回副本延迟秒数，复制中断返回None"""
+        with engine.connect() as conn:
+            if conn.dialect.name != 'mysql':
+                # SQLite等没有复制状态，视为无延迟（本地用两个文件测试路由）
+                return 0
+            try:
+                row = conn.execute(text('SHOW REPLICA STATUS')).mappings().first()
+            except Exception:
+                # MySQL 8.0.22之前的语法
+                row = conn.execute(text('SHOW SLAVE STATUS')).mappings().first()
+            if row is None:
+                # 不是复制从库（例如本地的第二个独立实例）
+                return 0
+            lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+            return None if lag is None else float(lag)
+
+    def lag(self, key):
+        """副本的复制延迟（按REPLICA_LAG_CHECK_SECONDS缓存），不可用时返回None"""
+        now = time.monotonic()
+        cached = self._lag.get(key)
+        if cached and now - cached[0] < get_config('REPLICA_LAG_CHECK_SECONDS', 2):
+            return cached[1]
+        # 先写入旧值，避免并发请求同时检查同一个副本
+        self._lag[key] = (now, cached[1] if cached else None)
+        # 延迟导入避免循环依赖
+        from app.extensions import db
+        try:
+            lag = self._measure_lag(db.engines[key])
+        except Exception as e:
+            logger.warning(f"Replica {key} unavailable: {str(e)}")
+            lag = None
+        self._lag[key] = (time.monotonic(), lag)
+        return lag
+
+    # ---------- 读己之写 ----------
+
+    def _current_user(self):
+        if not has_request_context():
+            return None
+        try:
+            from flask_jwt_extended import get_jwt_identity
+            return get_jwt_identity()
+        except Exception:
+            return None
+
+    def mark_write(self):
+        """记录当前用户刚写过数据（提交成功后调用）"""
+        user = self._current_user()
+        if user is None:
+            return
+        window = get_config('REPLICA_READ_YOUR_WRITES_SECONDS', 5)
+        with self._lock:
+            self._recent_writes[user] = time.monotonic() + window
+        from app.utils.redis_util import get_redis
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            client.set(f"db:recent_write:{user}", 1, px=int(window * 1000))
+        except Exception as e:
+            logger.warning(f"Record recent write failed: {str(e)}")
+
+    def wrote_recently(self):
+        user = self._current_user()
+        if user is None:
+            return False
+        with self._lock:
+            if self._recent_writes.get(user, 0) > time.monotonic():
+                return True
+        from app.utils.redis_util import get_redis
+        client = get_redis()
+        if client is None:
+            return False
+        try:
+            return bool(client.exists(f"db:recent_write:{user}"))
+        except Exception:
+            return False
+
+    # ---------- 选择 ----------
+
+    def choose(self):
+        """选择一个可用的副本，返回SQLALCHEMY_BINDS中的键，应使用主库时返回None"""
+        keys = self.replica_keys()
+        if not keys:
+            return None
+        if self.wrote_recently():
+            self._incr('read_your_writes')
+            self._incr('primary_reads')
+            return None
+        max_lag = get_config('REPLICA_MAX_LAG_SECONDS', 5)
+        with self._lock:
+            start = self._next
+            self._next += 1
+        for i in range(len(keys)):
+            key = keys[(start + i) % len(keys)]
+            lag = self.lag(key)
+            if lag is not None and lag <= max_lag:
+                self._incr('replica_reads')
+                return key
+        self._incr('lag_fallbacks')
+        self._incr('primary_reads')
+        return None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['replicas'] = {key: (self._lag[key][1] if key in self._lag else None) for key in self.replica_keys()}
+        return stats
+
+# 全局实例
+replica_router = ReplicaRouter()
+register_metrics('db_router', replica_router.stats)
+
+class RoutingSession(Session):
+    """在replica_reads()范围内把查询路由到只读副本的会话
+
+    有未刷新的修改、正在flush或本事务已flush过写入时总是使用主库（副本上读不到未提交的写入）。副本（或读己之写时的主库）在会话中
+    第一次只读查询时选定并缓存在session.info中，同一请求内的查询都走同一个库，
+    不必每次查询都检查延迟和最近写入；会话提交了写入后重新选择。
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _use_replica.get() and not self._flushing and not self._has_writes():
+            if REPLICA_INFO_KEY not in self.info:
+                self.info[REPLICA_INFO_KEY] = replica_router.choose()
+            key = self.info[REPLICA_INFO_KEY]
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _has_writes(self):
+        return bool(self.new or self.dirty or self.deleted) or self.info.get('wrote', False)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _do_orm_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('wrote', False):
+        replica_router.mark_write()
+        # 之后的读取需要读到刚提交的数据
+        session.info.pop(REPLICA_INFO_KEY, None)
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('wrote', None)
+
+@contextmanager
+def replica_reads():
+    """在该范围内的只读查询可以走只读副本"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+def use_replica(f):
+    """只读接口装饰器：接口内的查询可以走只读副本"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with replica_reads():
+            return f(*args, **kwargs)
+    return decorated_function
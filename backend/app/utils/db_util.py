@@ -0,0 +1,84 @@
+import logging
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.extensions import db
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 单条INSERT语句最多写入的行数（SQLite绑定参数数量有限）
+BULK_CHUNK_SIZE = 500
+
+def insert_ignore(model, dialect_name):
+    """构造"唯一键冲突时忽略"的INSERT语句
+
+    Args:
+        model: 模型类
+        dialect_name: 数据库方言名称
+
+    Returns:
+        INSERT语句
+
+    Raises:
+        ValueError: 不支持的数据库方言
+    """
+    table = model.__table__
+    if dialect_name == 'mysql':
+        return mysql_insert(table).prefix_with('IGNORE')
+    if dialect_name == 'sqlite':
+        return sqlite_insert(table).on_conflict_do_nothing()
+    if dialect_name == 'postgresql':
+        return postgresql_insert(table).on_conflict_do_nothing()
+    raise ValueError(f"不支持的数据库方言: {dialect_name}")
+
+def upsert(model, dialect_name, rows, update):
+    """构造"主键冲突时更新"的INSERT语句
+
+    Args:
+        model: 模型类
+        dialect_name: 数据库方言名称
+        rows: 列名到值的字典列表
+        update: 函数(table, inserted)，返回冲突时更新的{列名: 表达式}，
+            inserted引用本次待插入的值（MySQL的VALUES()，SQLite/PostgreSQL的excluded）
+
+    Returns:
+        INSERT语句
+
+    Raises:
+        ValueError: 不支持的数据库方言
+    """
+    table = model.__table__
+    if dialect_name == 'mysql':
+        stmt = mysql_insert(table).values(rows)
+        return stmt.on_duplicate_key_update(update(table, stmt.inserted))
+    if dialect_name in ('sqlite', 'postgresql'):
+        stmt = (sqlite_insert if dialect_name == 'sqlite' else postgresql_insert)(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[column.name for column in table.primary_key],
+            set_=update(table, stmt.excluded)
+        )
+    raise ValueError(f"不支持的数据库方言: {dialect_name}")
+
+def bulk_insert_ignore(model, rows, session=None):
+    """批量插入，唯一键冲突的行被忽略（不提交事务）
+
+    每BULK_CHUNK_SIZE行生成一条多行INSERT语句。
+
+    Args:
+        model: 模型类
+        rows: 列名到值的字典列表
+        session: 数据库会话，默认db.session
+
+    Returns:
+        实际插入的行数
+    """
+    if not rows:
+        return 0
+    session = session or db.session
+    dialect_name = session.get_bind(mapper=model).dialect.name
+    inserted = 0
+    for i in range(0, len(rows), BULK_CHUNK_SIZE):
+        stmt = insert_ignore(model, dialect_name).values(rows[i:i + BULK_CHUNK_SIZE])
+        inserted += session.execute(stmt).rowcount
+    return inserted
@@ -1,84 +1,295 @@
-import hashlib
-import logging
-
-# 设置日志记录器
-logger = logging.getLogger(__name__)
-
-class DedupUtil:
-    @staticmethod
-    def get_unique_key(data):
-        """生成数据的唯一标识
-        
-        优先使用transactionHash作为唯一标识，如果不存在，则基于（timestamp+asset+side+size+price）生成
-        
-        Args:
-            data: 交易数据字典，包含transactionHash或（timestamp、asset、side、size、price）字段
-        
-        Returns:
-            唯一标识字符串
-        """
-        # 检查是否包含transactionHash字段
-        if 'transactionHash' in data and data['transactionHash']:
-            logger.debug(f"Using transactionHash as unique key: {data['transactionHash']}")
-            return data['transactionHash']
-        
-        # 如果没有transactionHash，使用其他字段组合生成
-        required_fields = ['timestamp', 'asset', 'side', 'size', 'price']
-        
-        # 检查是否包含所有必要字段
-        missing_fields = [field for field in required_fields if field not in data or not data[field]]
-        if missing_fields:
-            logger.warning(f"Missing required fields for unique key generation: {missing_fields}")
-            # 如果缺少字段，生成一个基于可用字段的唯一标识
-            available_fields = {k: v for k, v in data.items() if k in required_fields and v}
-            key_data = '-'.join([f"{k}:{v}" for k, v in sorted(available_fields.items())])
-        else:
-            # 组合所有必要字段
-            key_data = f"{data['timestamp']}-{data['asset']}-{data['side']}-{data['size']}-{data['price']}"
-        
-        # 使用SHA-256生成唯一哈希
-        unique_hash = hashlib.sha256(key_data.encode('utf-8')).hexdigest()
-        logger.debug(f"Generated unique hash from fields: {unique_hash}")
-        
-        return unique_hash
-    
-    @staticmethod
-    def deduplicate_data(data_list):
-        """对交易数据列表进行去重
-        
-        Args:
-            data_list: 交易数据字典列表
-        
-        Returns:
-            去重后的交易数据列表
-        """
-        if not data_list:
-            return []
-        
-        unique_data = {}
-        duplicates_count = 0
-        
-        for data in data_list:
-            try:
-                unique_key = DedupUtil.get_unique_key(data)
-                if unique_key not in unique_data:
-                    unique_data[unique_key] = data
-                else:
-                    duplicates_count += 1
-                    logger.debug(f"Duplicate found with key: {unique_key}")
-            except Exception as e:
-                logger.error(f"Error generating unique key for data {data}: {str(e)}")
-                # 保留无法生成唯一标识的数据
-                unique_data[hashlib.sha256(str(data).encode('utf-8')).hexdigest()] = data
-        
-        logger.info(f"Deduplication completed: {len(data_list)} original, {len(unique_data)} unique, {duplicates_count} duplicates removed")
-        return list(unique_data.values())
-
-# 导出便捷函数
-def get_unique_key(data):
-    """生成数据唯一标识的便捷函数"""
-    return DedupUtil.get_unique_key(data)
-
-def deduplicate_data(data_list):
-    """数据去重的便捷函数"""
-    return DedupUtil.deduplicate_data(data_list)
+import hashlib
+import json
+import logging
+import sys
+import threading
+from app.utils.request_util import get_config
+from app.utils.redis_util import get_redis
+from app.utils.cache_util import LRUCache
+from app.utils.metrics_util import register_metrics
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 唯一标识长度（字节），数据库中以BINARY(16)存储
+KEY_BYTES = 16
+# 高水位标识JSON中记录被挤出标识最新时间戳的字段（标识为32位十六进制，不会冲突）
+EVICTED_FIELD = 'evicted'
+
+class DedupUtil:
+    @staticmethod
+    def get_unique_key(data):
+        """生成数据的唯一标识
+        
+        优先使用transactionHash的前16字节作为唯一标识，如果不存在，
+        则取（timestamp+asset+side+size+price）的SHA-256摘要前16字节
+        
+        Args:
+            data: 交易数据字典，包含transactionHash或（timestamp、asset、side、size、price）字段
+        
+        Returns:
+            16字节的二进制唯一标识
+        """
+        # 检查是否包含transactionHash字段
+        tx_hash = data.get('transactionHash')
+        if tx_hash:
+            return DedupUtil.key_from_text(tx_hash)
+        
+        # 如果没有transactionHash，使用其他字段组合生成
+        required_fields = ['timestamp', 'asset', 'side', 'size', 'price']
+        
+        # 检查是否包含所有必要字段
+        missing_fields = [field for field in required_fields if field not in data or not data[field]]
+        if missing_fields:
+            logger.warning(f"Missing required fields for unique key generation: {missing_fields}")
+            # 如果缺少字段，生成一个基于可用字段的唯一标识
+            available_fields = {k: v for k, v in data.items() if k in required_fields and v}
+            key_data = '-'.join([f"{k}:{v}" for k, v in sorted(available_fields.items())])
+        else:
+            # 组合所有必要字段
+            key_data = f"{data['timestamp']}-{data['asset']}-{data['side']}-{data['size']}-{data['price']}"
+        
+        # 使用SHA-256摘要的前16字节
+        return hashlib.sha256(key_data.encode('utf-8')).digest()[:KEY_BYTES]
+    
+    @staticmethod
+    def get_unique_keys(data_list):
+        """批量生成唯一标识，顺序与data_list一致
+        
+        无法生成唯一标识的数据使用其内容的摘要，保证不会被误判为重复
+        """
+        keys = []
+        for data in data_list:
+            try:
+                keys.append(DedupUtil.get_unique_key(data))
+            except Exception as e:
+                logger.error(f"Error generating unique key for data {data}: {str(e)}")
+                keys.append(hashlib.sha256(str(data).encode('utf-8')).digest()[:KEY_BYTES])
+        return keys
+    
+    @staticmethod
+    def key_from_text(text):
+        """将文本形式的标识转换为二进制唯一标识
+        
+        交易哈希和十六进制标识（包括旧版SHA-256十六进制标识）取前16字节，
+        与数据库迁移中UNHEX(LEFT(...,32))的转换规则一致
+        """
+        hex_part = text[2:] if text[:2].lower() == '0x' else text
+        if len(hex_part) >= KEY_BYTES * 2:
+            try:
+                return bytes.fromhex(hex_part[:KEY_BYTES * 2])
+            except ValueError:
+                pass
+        return hashlib.sha256(text.encode('utf-8')).digest()[:KEY_BYTES]
+    
+    @staticmethod
+    def deduplicate_data(data_list):
+        """对交易数据列表进行去重
+        
+        Args:
+            data_list: 交易数据字典列表
+        
+        Returns:
+            去重后的交易数据列表
+        """
+        if not data_list:
+            return []
+        
+        unique_data = {}
+        for unique_key, data in zip(DedupUtil.get_unique_keys(data_list), data_list):
+            unique_data.setdefault(unique_key, data)
+        
+        duplicates_count = len(data_list) - len(unique_data)
+        logger.info(f"Deduplication completed: {len(data_list)} original, {len(unique_data)} unique, {duplicates_count} duplicates removed")
+        return list(unique_data.values())
+
+class HighWaterMark:
+    """钱包交易的高水位标记（带时间窗口的已处理集合）
+
+    记录已处理的最新交易时间戳，以及最近lookback秒内已处理交易的唯一标识（按交易时间戳索引）。
+    轮询时请求start=floor之后的数据：上游延迟索引、时间戳略早于高水位的交易仍能被补到，
+    窗口内已处理的交易用唯一标识去重。早于floor的标识上游不会再返回，推进时直接淘汰。
+    最多保留max_keys个标识：超出时淘汰最早的标识，floor不变（窗口内延迟索引的交易不会丢失），
+    被淘汰标识的最新时间戳记为evicted_through。不晚于它且不在集合中的交易is_new返回True，
+    但无法确定是否处理过，调用方需要按持久化的记录再确认（见unverified），
+    交易记录由唯一约束忽略重复，跟单按已有跟单记录过滤，避免重复下单。
+    """
+
+    def __init__(self, timestamp=0, keys=None, lookback=None, max_keys=None, evicted_through=0):
+        self.timestamp = timestamp or 0
+        # 超出上限被淘汰的标识中最新的交易时间戳（持久化在hwm_tx_hashes中）
+        self.evicted_through = evicted_through or 0
+        self.lookback = get_config('DEDUP_WINDOW_SECONDS', 30) if lookback is None else lookback
+        self.max_keys = max_keys or get_config('DEDUP_WINDOW_MAX_KEYS', 500)
+        # 二进制唯一标识 -> 交易时间戳；兼容旧格式（只有高水位时间戳上的标识列表）
+        if not isinstance(keys, dict):
+            keys = {key: self.timestamp for key in (keys or ())}
+        self.keys = {
+            key if isinstance(key, bytes) else DedupUtil.key_from_text(key): ts
+            for key, ts in keys.items()
+        }
+        self._evict()
+
+    @classmethod
+    def from_columns(cls, timestamp, keys_json):
+        """从数据库字段恢复，未设置时返回None"""
+        if not timestamp:
+            return None
+        keys = json.loads(keys_json) if keys_json else None
+        evicted_through = keys.pop(EVICTED_FIELD, 0) if isinstance(keys, dict) else 0
+        return cls(timestamp, keys, evicted_through=evicted_through)
+
+    @classmethod
+    def from_trades(cls, trades):
+        """以一批交易中最新的交易建立标记"""
+        mark = cls()
+        mark.advance(trades)
+        return mark
+
+    def to_columns(self):
+        """转换为数据库字段（hwm_timestamp, hwm_tx_hashes）"""
+        keys = {key.hex(): ts for key, ts in self.keys.items()}
+        if self.evicted_through >= self.floor:
+            keys[EVICTED_FIELD] = self.evicted_through
+        return self.timestamp, json.dumps(keys, sort_keys=True)
+
+    def copy(self):
+        return HighWaterMark(self.timestamp, self.keys, self.lookback, self.max_keys, self.evicted_through)
+
+    @property
+    def floor(self):
+        """上游仍会返回、需要去重的最早时间戳"""
+        return max(0, self.timestamp - self.lookback)
+
+    def is_new(self, trade):
+        """交易是否未处理过"""
+        ts = int(trade.get('timestamp') or 0)
+        if ts < self.floor:
+            return False
+        if ts > self.timestamp:
+            return True
+        return DedupUtil.get_unique_key(trade) not in self.keys
+
+    def unverified(self, trades):
+        """返回trades中落在被淘汰标识时间范围内的交易（is_new为True但可能已处理过）"""
+        if self.evicted_through < self.floor:
+            return []
+        return [it for it in trades if int(it.get('timestamp') or 0) <= self.evicted_through]
+
+    def advance(self, trades):
+        """用已处理的交易推进标记"""
+        floor = self.floor
+        for trade in trades:
+            ts = int(trade.get('timestamp') or 0)
+            if ts < floor:
+                continue
+            self.keys[DedupUtil.get_unique_key(trade)] = ts
+            self.timestamp = max(self.timestamp, ts)
+        self._evict()
+
+    def _evict(self):
+        floor = self.floor
+        if any(ts < floor for ts in self.keys.values()):
+            self.keys = {key: ts for key, ts in self.keys.items() if ts >= floor}
+        if len(self.keys) > self.max_keys:
+            # 超出上限时淘汰最早的标识，floor不变，窗口内延迟索引的交易仍按新交易返回
+            ordered = sorted(self.keys.items(), key=lambda item: item[1], reverse=True)
+            self.keys = dict(ordered[:self.max_keys])
+            self.evicted_through = max(self.evicted_through, ordered[self.max_keys][1])
+            logger.warning(f"Dedup window exceeded {self.max_keys} keys, evicted keys through timestamp {self.evicted_through}")
+
+    def memory_bytes(self):
+        """估算已处理集合占用的内存（字节）"""
+        return sys.getsizeof(self.keys) + sum(sys.getsizeof(key) + sys.getsizeof(ts) for key, ts in list(self.keys.items()))
+
+class DedupIndex:
+    """跨进程共享的"已入库"唯一标识索引
+
+    Redis中每个已入库的唯一标识对应一个带TTL的键，一批标识通过pipeline一次往返查询；
+    进程内用有界LRU缓存最近确认过的标识。索引只是加速：未命中不代表记录不存在
+    （可能已过期或Redis丢失），最终仍由数据库唯一约束保证不重复。
+    进程内缓存使用精确集合而不是布隆过滤器，因为误判"已存在"会直接丢掉交易。
+    """
+
+    def __init__(self, name, ttl=3 * 86400, local_maxsize=100000, local_ttl=3600):
+        self.name = name
+        self.ttl = ttl
+        self._prefix = f"dedup:{name}:".encode()
+        self.local = LRUCache(local_maxsize, local_ttl)
+        self._lock = threading.Lock()
+        self._counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'errors': 0}
+
+    def _redis_key(self, key):
+        return self._prefix + key
+
+    def _incr(self, counter, n=1):
+        if n:
+            with self._lock:
+                self._counters[counter] += n
+
+    def contains_many(self, keys):
+        """返回keys中已确认入库的唯一标识集合"""
+        known = {key for key in keys if self.local.get(key)}
+        self._incr('local_hits', len(known))
+        rest = [key for key in keys if key not in known]
+        client = get_redis() if rest else None
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for key in rest:
+                    pipe.exists(self._redis_key(key))
+                for key, hit in zip(rest, pipe.execute()):
+                    if hit:
+                        known.add(key)
+                        self.local.set(key, True)
+                        self._incr('shared_hits')
+            except Exception as e:
+                logger.warning(f"Dedup index {self.name} unavailable: {str(e)}")
+                self._incr('errors')
+        self._incr('misses', len(keys) - len(known))
+        return known
+
+    def add_many(self, keys):
+        """记录已入库的唯一标识（必须在数据库事务提交之后调用）"""
+        if not keys:
+            return
+        for key in keys:
+            self.local.set(key, True)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key in keys:
+                pipe.set(self._redis_key(key), 1, ex=self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Update dedup index {self.name} failed: {str(e)}")
+            self._incr('errors')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['local_size'] = len(self.local)
+        return stats
+
+# 活动记录唯一标识索引（全局实例）
+activity_index = DedupIndex(
+    'activity',
+    ttl=get_config('DEDUP_INDEX_TTL', 3 * 86400),
+    local_maxsize=get_config('DEDUP_INDEX_LOCAL_MAXSIZE', 100000)
+)
+register_metrics('dedup_index', activity_index.stats)
+
+# 导出便捷函数
+def get_unique_key(data):
+    """生成数据唯一标识的便捷函数"""
+    return DedupUtil.get_unique_key(data)
+
+def get_unique_keys(data_list):
+    """批量生成唯一标识的便捷函数"""
+    return DedupUtil.get_unique_keys(data_list)
+
+def deduplicate_data(data_list):
+    """数据去重的便捷函数"""
+    return DedupUtil.deduplicate_data(data_list)
@@ -0,0 +1,32 @@
+import logging
+import threading
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 指标来源注册表（名称 -> 返回字典的函数）
+_sources = {}
+_lock = threading.Lock()
+
+def register_metrics(name, collector):
+    """注册指标来源
+
+    Args:
+        name: 指标分组名称
+        collector: 无参函数，返回可JSON序列化的字典
+    """
+    with _lock:
+        _sources[name] = collector
+
+def collect_metrics():
+    """收集所有已注册来源的指标"""
+    with _lock:
+        sources = dict(_sources)
+    metrics = {}
+    for name, collector in sources.items():
+        try:
+            metrics[name] = collector()
+        except Exception as e:
+            logger.error(f"Collect metrics {name} failed: {str(e)}")
+            metrics[name] = {'error': str(e)}
+    return metrics
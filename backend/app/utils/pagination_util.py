@@ -0,0 +1,40 @@
+import base64
+import logging
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+def encode_cursor(created_at, record_id):
+    """将(创建时间, id)编码为不透明的分页游标"""
+    raw = f"{created_at.isoformat()}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """解析分页游标
+
+    Returns:
+        (创建时间, id)
+
+    Raises:
+        ValueError: 游标格式不正确
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, record_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(record_id)
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+
+def keyset_before(model, key):
+    """(created_at, id)严格早于key的过滤条件，配合按(created_at, id)倒序使用"""
+    created_at, record_id = key
+    return or_(
+        model.created_at < created_at,
+        and_(model.created_at == created_at, model.id < record_id)
+    )
+
+def record_key(record):
+    """记录的排序键(created_at, id)"""
+    return record.created_at or datetime.min, record.id
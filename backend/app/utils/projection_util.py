@@ -0,0 +1,73 @@
+import calendar
+import logging
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.sql.elements import Label
+from app.extensions import db
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+def epoch(value):
+    """UTC时间（数据库中的naive datetime）转为秒级时间戳"""
+    return calendar.timegm(value.utctimetuple())
+
+class Projection:
+    """列表接口的列投影
+
+    只查询需要的列（Core select，结果为元组），不创建ORM对象也不调用to_dict，
+    只对指定的列做转换（如时间转为秒级时间戳、二进制转为十六进制）。
+
+    用法：
+        projection = Projection([User.id, User.username, User.created_at], {'created_at': epoch})
+        rows = projection.fetch(projection.select().where(...).limit(50))
+        data = projection.to_dicts(rows)
+    """
+
+    def __init__(self, columns, converters=None, joins=None):
+        """
+        Args:
+            columns: 模型列或带别名的列（column.label('name')），别名作为输出的键
+            converters: {输出键: 转换函数}，值为None时不转换
+            joins: 可选，[(表或模型, 连接条件)]，以LEFT OUTER JOIN加入（如维度表）
+        """
+        self.columns = list(columns)
+        self.joins = list(joins or [])
+        self.names = [column.key for column in self.columns]
+        # 非Row对象（例如冷数据归档中的记录）按属性名取值
+        self.attrs = [column.element.key if isinstance(column, Label) else column.key for column in self.columns]
+        converters = converters or {}
+        self.converters = [(i, converters[name]) for i, name in enumerate(self.names) if name in converters]
+
+    def select(self):
+        """返回只包含投影列的SELECT语句"""
+        stmt = select(*self.columns)
+        for target, onclause in self.joins:
+            stmt = stmt.outerjoin(target, onclause)
+        return stmt
+
+    def fetch(self, stmt, session=None):
+        """执行查询，返回Row元组列表"""
+        return (session or db.session).execute(stmt).all()
+
+    def values(self, row):
+        if isinstance(row, Row):
+            return list(row)
+        # 归档记录按输出键取值，没有时按属性名
+        return [
+            getattr(row, name) if hasattr(row, name) else getattr(row, attr, None)
+            for name, attr in zip(self.names, self.attrs)
+        ]
+
+    def to_dicts(self, rows):
+        """将查询结果转换为可直接JSON序列化的字典列表"""
+        names = self.names
+        converters = self.converters
+        result = []
+        for row in rows:
+            values = self.values(row)
+            for i, convert in converters:
+                if values[i] is not None:
+                    values[i] = convert(values[i])
+            result.append(dict(zip(names, values)))
+        return result
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 请求优先级（数值越小优先级越高）
+PRIORITY_COPY_TRADE = 0  # 跟单轮询
+PRIORITY_MONITOR = 1  # 活动监控轮询
+PRIORITY_QUERY = 2  # 临时查询与历史回填
+
+# 令牌桶Lua脚本：原子地补充并尝试取出令牌
+# KEYS[1]=令牌桶 KEYS[2]=全局暂停标记
+# ARGV: rate, capacity, now_ms, reserve, cost
+# 返回 {是否获取成功, 需要等待的毫秒数}
+ACQUIRE_SCRIPT = """
+local pause = redis.call('PTTL', KEYS[2])
+if pause > 0 then
+    return {0, pause}
+end
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local reserve = tonumber(ARGV[4])
+local cost = tonumber(ARGV[5])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) / 1000 * rate)
+local acquired = 0
+local wait = 0
+if tokens - cost >= reserve then
+    tokens = tokens - cost
+    acquired = 1
+else
+    wait = math.ceil((reserve + cost - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {acquired, wait}
+"""
+
+class RateLimiter:
+    """数据API请求限流器
+
+    所有进程（gunicorn worker与Celery worker）通过Redis中的同一个令牌桶限流；
+    Redis不可用时退化为进程内令牌桶。低优先级请求只能使用高于保留水位的令牌，
+    令牌紧张时跟单轮询优先于监控、查询和回填。任何进程收到429时设置全局暂停，
+    所有进程在暂停期间都不再发出请求。rate<=0表示不限速。
+    """
+
+    def __init__(self, rate, capacity=None, reserves=None, key='ratelimit:data_api'):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        # 各优先级必须保留的令牌数（按容量比例）
+        self.reserves = reserves or {PRIORITY_COPY_TRADE: 0, PRIORITY_MONITOR: 0.2, PRIORITY_QUERY: 0.5}
+        self.key = key
+        self.pause_key = f"{key}:pause"
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._counters = {'acquired': 0, 'waits': 0, 'pauses': 0, 'redis_errors': 0}
+
+    def _reserve_tokens(self, priority):
+        return self.capacity * self.reserves.get(priority, 0)
+
+    def _try_acquire_local(self, priority):
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            reserve = self._reserve_tokens(priority)
+            if self._tokens - 1 >= reserve:
+                self._tokens -= 1
+                return 0
+            return (reserve + 1 - self._tokens) / self.rate
+
+    def _try_acquire(self, priority):
+        """尝试获取一个令牌，成功返回0，否则返回建议等待的秒数"""
+        if self.rate <= 0:
+            return 0
+        # 延迟导入避免循环依赖
+        from app.utils.redis_util import get_redis
+        client = get_redis()
+        if client is None:
+            return self._try_acquire_local(priority)
+        try:
+            acquired, wait_ms = client.eval(
+                ACQUIRE_SCRIPT, 2, self.key, self.pause_key,
+                self.rate, self.capacity, int(time.time() * 1000), self._reserve_tokens(priority), 1
+            )
+            return 0 if acquired else wait_ms / 1000
+        except Exception as e:
+            logger.warning(f"Redis rate limiter unavailable, falling back to local bucket: {str(e)}")
+            self._incr('redis_errors')
+            return self._try_acquire_local(priority)
+
+    def _incr(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def acquire(self, priority=PRIORITY_MONITOR):
+        """同步获取令牌，必要时阻塞等待"""
+        waited = 0
+        while True:
+            wait = self._try_acquire(priority)
+            if wait <= 0:
+                self._incr('acquired')
+                if waited:
+                    self._incr('waits')
+                return waited
+            wait = min(wait, 1)
+            waited += wait
+            time.sleep(wait)
+
+    def try_acquire(self, priority=PRIORITY_MONITOR):
+        """非阻塞获取令牌，成功返回True"""
+        if self._try_acquire(priority) <= 0:
+            self._incr('acquired')
+            return True
+        return False
+
+    async def acquire_async(self, priority=PRIORITY_MONITOR):
+        """异步获取令牌，Redis调用放到线程池中执行，不阻塞事件循环"""
+        waited = 0
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, priority)
+            if wait <= 0:
+                self._incr('acquired')
+                if waited:
+                    self._incr('waits')
+                return waited
+            wait = min(wait, 1)
+            waited += wait
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """全局暂停所有进程的请求（收到429时调用）"""
+        if seconds <= 0:
+            return
+        self._incr('pauses')
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        from app.utils.redis_util import get_redis
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            # 只延长不缩短已有的暂停
+            if client.pttl(self.pause_key) < seconds * 1000:
+                client.set(self.pause_key, 1, px=int(math.ceil(seconds * 1000)))
+        except Exception as e:
+            logger.warning(f"Set global pause failed: {str(e)}")
+            self._incr('redis_errors')
+        logger.warning(f"Data API requests paused for {seconds:.2f} seconds")
+
+    def stats(self):
+        """返回限流器状态"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'rate': self.rate,
+                'capacity': self.capacity,
+                'local_tokens': round(self._tokens, 2),
+                'local_paused_for': round(max(0, self._paused_until - time.monotonic()), 2)
+            })
+        return stats
+
+# 全局共享的数据API限流器（延迟初始化）
+_rate_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """获取所有数据API调用方共享的限流器"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        from app.utils.request_util import get_config
+        with _limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(
+                    get_config('POLL_GLOBAL_RPS', 20),
+                    get_config('POLL_GLOBAL_BURST'),
+                    reserves={
+                        PRIORITY_COPY_TRADE: 0,
+                        PRIORITY_MONITOR: get_config('RATE_LIMIT_MONITOR_RESERVE', 0.2),
+                        PRIORITY_QUERY: get_config('RATE_LIMIT_QUERY_RESERVE', 0.5)
+                    }
+                )
+    return _rate_limiter
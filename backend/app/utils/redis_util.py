@@ -0,0 +1,43 @@
+import logging
+import threading
+import time
+import redis
+from app.utils.request_util import get_config
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 连接失败后的重试间隔（秒），避免Redis不可用时每次调用都等待连接超时
+RECONNECT_INTERVAL = 30
+
+_client = None
+_failed_at = 0
+_lock = threading.Lock()
+
+def get_redis():
+    """获取共享的Redis客户端
+
+    Redis不可用时返回None，调用方应退化为进程内实现。
+
+    Returns:
+        redis.Redis实例或None
+    """
+    global _client, _failed_at
+    if _client is not None:
+        return _client
+    if time.time() - _failed_at < RECONNECT_INTERVAL:
+        return None
+    with _lock:
+        if _client is None:
+            try:
+                client = redis.Redis.from_url(
+                    get_config('REDIS_URL', 'redis://localhost:6379/0'),
+                    socket_connect_timeout=1,
+                    socket_timeout=1
+                )
+                client.ping()
+                _client = client
+            except redis.RedisError as e:
+                logger.warning(f"Redis不可用，使用进程内实现: {str(e)}")
+                _failed_at = time.time()
+    return _client
@@ -1,78 +1,313 @@
+import asyncio
+import json
 import requests
 import time
+import random
 import logging
-from flask import current_app
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+from flask import current_app, has_app_context
+from app.config import Config
+from app.utils.rate_limit import get_rate_limiter, PRIORITY_MONITOR, PRIORITY_COPY_TRADE
+from app.utils.resilience_util import LatencyTracker, CircuitBreaker
+from app.utils.metrics_util import register_metrics
 
 # 设置日志记录器
 logger = logging.getLogger(__name__)
 
+# 异步HTTP客户端为可选依赖，未安装时异步引擎退回到线程池中执行同步请求
+try:
+    import aiohttp
+except ImportError:
+    logger.warning("aiohttp未安装，异步轮询将使用同步客户端")
+    aiohttp = None
+
+# Polymarket数据API地址
+DATA_API_HOST = 'https://data-api.polymarket.com'
+
+# 需要重试的状态码（429频率限制，5xx上游故障）
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
 class PolymarketAPIError(Exception):
     """Polymarket API请求异常"""
     pass
 
+class CircuitOpenError(PolymarketAPIError):
+    """数据API熔断中，请求被快速拒绝"""
+    pass
+
+def get_config(key, default=None):
+    """读取配置项，兼容没有应用上下文的线程（如Celery轮询循环）"""
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return getattr(Config, key, default)
+
+# 全局共享的HTTP会话（连接池）
+_session = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    """获取全局共享的keep-alive HTTP会话
+
+    所有请求复用同一个连接池，避免每次轮询都重新进行TCP+TLS握手。
+
+    Returns:
+        requests.Session实例
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=get_config('DATA_API_POOL_CONNECTIONS', 10),
+                    pool_maxsize=get_config('DATA_API_POOL_MAXSIZE', 20),
+                    max_retries=0  # 重试由RequestUtil自行处理
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+# 数据API延迟统计、熔断器与对冲请求线程池（进程内共享）
+_latency = LatencyTracker()
+_breaker = None
+_hedge_pool = None
+_hedge_counters = {'hedged': 0, 'hedge_wins': 0}
+_resilience_lock = threading.Lock()
+
+def get_circuit_breaker():
+    """获取数据API熔断器"""
+    global _breaker
+    if _breaker is None:
+        with _resilience_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    'data_api',
+                    failure_threshold=get_config('DATA_API_BREAKER_THRESHOLD', 5),
+                    recovery_seconds=get_config('DATA_API_BREAKER_RECOVERY', 5),
+                    max_recovery_seconds=get_config('DATA_API_BREAKER_MAX_RECOVERY', 60),
+                    probe_timeout_seconds=get_config('DATA_API_BREAKER_PROBE_TIMEOUT', 30)
+                )
+    return _breaker
+
+def _get_hedge_pool():
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _resilience_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(
+                    max_workers=get_config('DATA_API_HEDGE_WORKERS', 8),
+                    thread_name_prefix='data-api-hedge'
+                )
+    return _hedge_pool
+
+def _incr_hedge(counter):
+    with _resilience_lock:
+        _hedge_counters[counter] += 1
+
+def hedge_delay(priority):
+    """对冲请求的触发延迟（秒）
+
+    只对不低于DATA_API_HEDGE_MAX_PRIORITY的请求对冲，触发阈值取观测到的p95延迟。
+
+    Returns:
+        延迟秒数，不需要对冲（未开启、优先级不够或样本不足）时返回None
+    """
+    if not get_config('DATA_API_HEDGE_ENABLED', False):
+        return None
+    if priority > get_config('DATA_API_HEDGE_MAX_PRIORITY', PRIORITY_COPY_TRADE):
+        return None
+    threshold = _latency.percentile(get_config('DATA_API_HEDGE_PERCENTILE', 0.95))
+    if threshold is None:
+        return None
+    return max(threshold, get_config('DATA_API_HEDGE_MIN_DELAY', 0.2))
+
+def record_upstream_status(status_code):
+    """按响应状态更新熔断器：5xx计为失败，其他响应说明上游可用"""
+    if status_code >= 500:
+        get_circuit_breaker().record_failure()
+    else:
+        get_circuit_breaker().record_success()
+
+def data_api_stats():
+    """返回数据API的延迟、熔断与对冲指标"""
+    with _resilience_lock:
+        hedges = dict(_hedge_counters)
+    return {
+        'latency': _latency.stats(),
+        'circuit_breaker': get_circuit_breaker().stats(),
+        'hedging': dict(hedges, enabled=get_config('DATA_API_HEDGE_ENABLED', False)),
+        'rate_limiter': get_rate_limiter().stats()
+    }
+
+register_metrics('data_api', data_api_stats)
+
+def parse_retry_after(value):
+    """解析Retry-After响应头
+
+    Args:
+        value: 秒数或HTTP日期格式的字符串
+
+    Returns:
+        需要等待的秒数，无法解析时返回None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None):
+    """计算带抖动的重试等待时间
+
+    优先遵循服务端返回的Retry-After，否则使用全抖动指数退避。
+
+    Args:
+        attempt: 当前重试次数（从0开始）
+        retry_after: 服务端要求的等待秒数
+
+    Returns:
+        等待秒数
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 0.5)
+    cap = get_config('DATA_API_BACKOFF_MAX', 8)
+    return random.uniform(0, min(cap, 0.5 * (2 ** attempt)))
+
 class RequestUtil:
     def __init__(self, base_url=None):
         # 使用应用配置中的API URL，如果没有则使用默认URL
-        self.base_url = base_url or current_app.config.get('DATA_API_URL', 'https://data-api.polymarket.com')
-    
-    def make_request(self, endpoint, method='GET', params=None, data=None, retries=3):
+        self.base_url = base_url or get_config('DATA_API_URL', DATA_API_HOST)
+        self.session = get_http_session()
+
+    def make_request(self, endpoint, method='GET', params=None, data=None, retries=None, timeout=None, priority=PRIORITY_MONITOR):
         """发送HTTP请求并处理异常
-        
+
+        每次尝试前都从全局限流器获取令牌；收到429时暂停所有进程的请求。
+        熔断器打开时直接失败，高优先级的GET请求超过p95延迟未返回时发送对冲请求。
+
         Args:
-            endpoint: API端点路径
+            endpoint: API端点路径（也可以是完整URL）
             method: 请求方法（GET、POST等）
             params: 查询参数
             data: 请求体数据
-            retries: 重试次数
-        
+            retries: 重试次数，默认读取DATA_API_MAX_RETRIES
+            timeout: 本次请求超时时间（秒），默认读取DATA_API_TIMEOUT
+            priority: 限流优先级（PRIORITY_COPY_TRADE/PRIORITY_MONITOR/PRIORITY_QUERY）
+
         Returns:
             API响应的JSON数据
-        
+
         Raises:
+            CircuitOpenError: 熔断器打开时抛出
             PolymarketAPIError: API请求失败时抛出
         """
-        url = f"{self.base_url}{endpoint}"
-        
+        url = endpoint if endpoint.startswith('http') else f"{self.base_url}{endpoint}"
+        if retries is None:
+            retries = get_config('DATA_API_MAX_RETRIES', 3)
+        timeout = timeout or get_config('DATA_API_TIMEOUT', 10)
+        limiter = get_rate_limiter()
+        breaker = get_circuit_breaker()
+
         for attempt in range(retries):
+            last_attempt = attempt == retries - 1
+            if not breaker.allow():
+                raise CircuitOpenError(f"数据API熔断中，{breaker.retry_in():.1f}秒后恢复")
+            recorded = False
             try:
+                limiter.acquire(priority)
                 logger.debug(f"Request: {method} {url}, params: {params}, data: {data}")
-                
-                # 完全按照示例脚本的方式发送请求，不使用会话，不设置任何请求头
-                if method.upper() == 'GET':
-                    response = requests.get(url, params=params, timeout=10)
-                else:
-                    response = requests.request(method, url, params=params, data=data, timeout=10)
-                
-                # 检查响应状态码
-                if response.status_code == 200:
-                    return response.json()
-                elif response.status_code == 429:
-                    # 处理频率限制
-                    logger.warning(f"Rate limit exceeded. Retrying in {2 ** attempt} seconds...")
-                    time.sleep(2 ** attempt)  # 指数退避
-                    continue
-                else:
-                    # 其他错误状态码
-                    logger.error(f"API request failed with status {response.status_code}: {response.text[:500]}...")  # 只记录前500个字符
-                    raise PolymarketAPIError(
-                        f"API请求失败: {response.status_code} {response.text[:200]}..."
-                    )
-            except requests.exceptions.Timeout as e:
-                logger.warning(f"Request timeout. Retrying in {2 ** attempt} seconds...")
-                time.sleep(2 ** attempt)
+                response = self._send(method, url, params, data, timeout, priority)
+                record_upstream_status(response.status_code)
+                recorded = True
             except requests.exceptions.RequestException as e:
-                logger.error(f"Network error: {str(e)}")
-                if attempt == retries - 1:
+                breaker.record_failure()
+                recorded = True
+                logger.warning(f"Network error: {str(e)}")
+                if last_attempt:
                     raise PolymarketAPIError(f"网络请求失败: {str(e)}")
-                time.sleep(2 ** attempt)
-        
+                time.sleep(backoff_delay(attempt))
+                continue
+            finally:
+                if not recorded:
+                    # 请求被中断、没有结果时归还半开探测名额
+                    breaker.release_probe()
+
+            # 检查响应状态码
+            if response.status_code == 200:
+                return response.json()
+
+            if response.status_code in RETRY_STATUS_CODES and not last_attempt:
+                # 频率限制或上游故障，按Retry-After或抖动退避后重试
+                delay = backoff_delay(attempt, parse_retry_after(response.headers.get('Retry-After')))
+                logger.warning(f"API returned {response.status_code}. Retrying in {delay:.2f} seconds...")
+                if response.status_code == 429:
+                    # 全局暂停，下一次获取令牌时等待
+                    limiter.pause(delay)
+                else:
+                    time.sleep(delay)
+                continue
+
+            # 其他错误状态码
+            logger.error(f"API request failed with status {response.status_code}: {response.text[:500]}...")  # 只记录前500个字符
+            raise PolymarketAPIError(
+                f"API请求失败: {response.status_code} {response.text[:200]}..."
+            )
+
         # 重试次数耗尽
         logger.error(f"Max retries ({retries}) exceeded for {url}")
         raise PolymarketAPIError(f"API请求重试次数耗尽")
-    
-    def fetch_latest_trades(self, params=None):
+
+    def _send_once(self, method, url, params, data, timeout):
+        started = time.monotonic()
+        response = self.session.request(method, url, params=params, data=data, timeout=timeout)
+        _latency.record(time.monotonic() - started)
+        return response
+
+    def _send(self, method, url, params, data, timeout, priority):
+        """发送一次请求，必要时发送对冲请求并返回先完成的响应"""
+        send = lambda: self._send_once(method, url, params, data, timeout)
+        delay = hedge_delay(priority) if method == 'GET' else None
+        if delay is None:
+            return send()
+
+        first = _get_hedge_pool().submit(send)
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+
+        # 对冲请求同样消耗限流令牌，令牌不足时只等待原请求
+        if not get_rate_limiter().try_acquire(priority):
+            return first.result()
+        second = _get_hedge_pool().submit(send)
+        _incr_hedge('hedged')
+
+        error = None
+        for future in as_completed([first, second]):
+            try:
+                response = future.result()
+            except requests.exceptions.RequestException as e:
+                error = e
+                continue
+            if future is second:
+                _incr_hedge('hedge_wins')
+            return response
+        raise error
+
+    def fetch_latest_trades(self, params=None, timeout=None, priority=PRIORITY_MONITOR):
         """获取Polymarket最新交易数据
-        
+
         Args:
             params: 动态传入的查询参数
                 示例: {
@@ -80,62 +315,179 @@ class RequestUtil:
                     'limit': 50,
                     'type': 'TRADE'
                 }
-        
+            timeout: 本次请求超时时间（秒）
+            priority: 限流优先级
+
         Returns:
             最新交易数据列表
         """
-        # 完全按照参考脚本的方式实现
-        url = "https://data-api.polymarket.com/activity"
-        
-        # 设置默认参数，与参考脚本保持一致
-        default_params = {
-            'limit': 50,
-            'type': 'TRADE',  # 只返回（BUY / SELL），不包括 SPLIT / MERGE / REDEEM
-            'sortBy': 'TIMESTAMP',  # 按照时间排序
-            'sortDirection': 'DESC'  # 最新的在最前
-        }
-        
-        # 合并默认参数和传入参数
-        if params:
-            default_params.update(params)
-        
-        logger.info(f"Sending request to {url} with params: {default_params}")
-        
-        # 直接使用requests.get，不使用会话，与参考脚本完全一致
-        response = requests.get(url, params=default_params, timeout=10)
-        logger.info(f"API response status: {response.status_code}")
-        logger.info(f"API response headers: {dict(response.headers)}")
-        logger.info(f"API response content: {response.text[:500]}...")
-        
+        url = f"{self.base_url}/activity"
+        default_params = build_activity_params(params)
+
+        logger.debug(f"Sending request to {url} with params: {default_params}")
+        data = self.make_request(url, params=default_params, timeout=timeout, priority=priority)
+        return parse_activity_response(data)
+
+def build_activity_params(params=None):
+    """合并/activity请求的默认参数"""
+    default_params = {
+        'limit': 50,
+        'type': 'TRADE',
+        'sortBy': 'TIMESTAMP',
+        'sortDirection': 'DESC'
+    }
+    if params:
+        default_params.update(params)
+    return default_params
+
+def parse_activity_response(data):
+    """解析/activity响应，兼容直接返回数组和带value字段的对象"""
+    if isinstance(data, list):
+        return data
+    elif isinstance(data, dict) and 'value' in data:
+        return data['value']
+    logger.warning(f"Unexpected API response format: {type(data)}")
+    return []
+
+class AsyncRequestUtil:
+    """基于aiohttp的异步请求工具
+
+    必须在事件循环线程中创建和使用，重试与退避策略与RequestUtil保持一致。
+    """
+
+    def __init__(self, base_url=None):
+        # 与RequestUtil一致，使用应用配置中的API URL
+        self.base_url = base_url or get_config('DATA_API_URL', DATA_API_HOST)
+        self.session = None
+
+    async def open(self):
+        """创建异步会话（连接池）"""
+        if aiohttp is None or self.session is not None:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=get_config('DATA_API_POOL_CONNECTIONS', 10) * get_config('DATA_API_POOL_MAXSIZE', 20),
+            limit_per_host=get_config('DATA_API_POOL_MAXSIZE', 20),
+            ttl_dns_cache=300
+        )
+        self.session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        """关闭异步会话"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def make_request(self, url, params=None, retries=None, timeout=None, priority=PRIORITY_MONITOR):
+        """发送异步GET请求，限流、熔断与对冲规则与RequestUtil.make_request一致
+
+        Raises:
+            CircuitOpenError: 熔断器打开时抛出
+            PolymarketAPIError: API请求失败时抛出
+        """
+        if retries is None:
+            retries = get_config('DATA_API_MAX_RETRIES', 3)
+        timeout = timeout or get_config('DATA_API_TIMEOUT', 10)
+        limiter = get_rate_limiter()
+        breaker = get_circuit_breaker()
+
+        for attempt in range(retries):
+            last_attempt = attempt == retries - 1
+            if not breaker.allow():
+                raise CircuitOpenError(f"数据API熔断中，{breaker.retry_in():.1f}秒后恢复")
+            recorded = False
+            try:
+                await limiter.acquire_async(priority)
+                status, headers, text = await self._get(url, params, timeout, priority)
+                record_upstream_status(status)
+                recorded = True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                breaker.record_failure()
+                recorded = True
+                logger.warning(f"Network error: {str(e)}")
+                if last_attempt:
+                    raise PolymarketAPIError(f"网络请求失败: {str(e)}")
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            finally:
+                if not recorded:
+                    # 调用方取消（如取消订阅）或意外异常时归还半开探测名额
+                    breaker.release_probe()
+            if status == 200:
+                return json.loads(text)
+
+            if status in RETRY_STATUS_CODES and not last_attempt:
+                delay = backoff_delay(attempt, parse_retry_after(headers.get('Retry-After')))
+                logger.warning(f"API returned {status}. Retrying in {delay:.2f} seconds...")
+                if status == 429:
+                    await asyncio.to_thread(limiter.pause, delay)
+                else:
+                    await asyncio.sleep(delay)
+                continue
+
+            logger.error(f"API request failed with status {status}: {text[:500]}...")
+            raise PolymarketAPIError(f"API请求失败: {status} {text[:200]}...")
+
+        raise PolymarketAPIError("API请求重试次数耗尽")
+
+    async def _get_once(self, url, params, timeout):
+        started = time.monotonic()
+        async with self.session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            text = await response.text()
+            _latency.record(time.monotonic() - started)
+            return response.status, response.headers, text
+
+    async def _get(self, url, params, timeout, priority):
+        """发送一次GET请求，必要时发送对冲请求并返回先完成的响应"""
+        delay = hedge_delay(priority)
+        tasks = [asyncio.ensure_future(self._get_once(url, params, timeout))]
         try:
-            response.raise_for_status()  # 检查响应状态
-        except Exception as e:
-            logger.error(f"API request failed: {e}")
-            raise
-        
-        # 解析API响应
-        data = response.json()
-        logger.info(f"Parsed API response: {data}")
-        
-        # 处理两种可能的响应格式：
-        # 1. 直接返回交易数组
-        # 2. 返回带有value字段的对象
-        if isinstance(data, list):
-            return data
-        elif isinstance(data, dict) and 'value' in data:
-            return data['value']
-        else:
-            logger.warning(f"Unexpected API response format: {type(data)}")
-            return []
+            if delay is None:
+                return await tasks[0]
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return tasks[0].result()
+
+            # 对冲请求同样消耗限流令牌，令牌不足时只等待原请求
+            if not await asyncio.to_thread(get_rate_limiter().try_acquire, priority):
+                return await tasks[0]
+            tasks.append(asyncio.ensure_future(self._get_once(url, params, timeout)))
+            _incr_hedge('hedged')
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            _incr_hedge('hedge_wins')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # 取消未完成的请求（对冲中较慢的一方，或调用方被取消）
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def fetch_latest_trades(self, params=None, timeout=None, priority=PRIORITY_MONITOR):
+        """异步获取Polymarket最新交易数据，参数与RequestUtil.fetch_latest_trades一致"""
+        params = build_activity_params(params)
+        if self.session is None:
+            # 未安装aiohttp时在线程池中执行同步请求
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, lambda: fetch_latest_trades(params, timeout=timeout, priority=priority))
+        data = await self.make_request(f"{self.base_url}/activity", params=params, timeout=timeout, priority=priority)
+        return parse_activity_response(data)
 
 # 全局实例（延迟初始化）
 request_util = None
 
 # 导出便捷函数
-def fetch_latest_trades(params=None):
+def fetch_latest_trades(params=None, timeout=None, priority=PRIORITY_MONITOR):
     """获取最新交易的便捷函数"""
     global request_util
     # 如果实例尚未初始化，创建新实例
     if request_util is None:
         request_util = RequestUtil()
-    return request_util.fetch_latest_trades(params)
+    return request_util.fetch_latest_trades(params, timeout=timeout, priority=priority)
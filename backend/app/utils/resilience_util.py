@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from collections import deque
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+class LatencyTracker:
+    """滑动窗口内的请求延迟统计，用于计算对冲请求的触发阈值"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        """返回窗口内的p分位延迟（秒），样本不足时返回None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < 20:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * p))
+        return samples[index]
+
+    def stats(self):
+        return {
+            'samples': len(self._samples),
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99)
+        }
+
+class CircuitBreaker:
+    """熔断器
+
+    - closed：正常放行，连续失败达到failure_threshold后打开；
+    - open：直接拒绝请求，recovery_seconds后进入半开状态；
+    - half_open：只放行一个探测请求，成功则关闭，失败则重新打开且恢复时间加倍（不超过max_recovery_seconds）；
+      探测请求被取消时调用release_probe归还名额，超过probe_timeout_seconds仍无结果的探测视为失败。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, recovery_seconds=5.0, max_recovery_seconds=60.0, probe_timeout_seconds=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.max_recovery_seconds = max_recovery_seconds
+        self.probe_timeout_seconds = probe_timeout_seconds
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._current_recovery = recovery_seconds
+        self._probing = False
+        self._probe_started = 0
+        self._lock = threading.Lock()
+        self._counters = {'opened': 0, 'rejected': 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._state == self.OPEN and now - self._opened_at >= self._current_recovery:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        elif self._state == self.HALF_OPEN and self._probing and now - self._probe_started >= self.probe_timeout_seconds:
+            # 探测请求迟迟没有结果（调用方卡住或丢失），按探测失败处理
+            logger.warning(f"Circuit {self.name} probe timed out after {self.probe_timeout_seconds:.1f} seconds")
+            self._current_recovery = min(self._current_recovery * 2, self.max_recovery_seconds)
+            self._open()
+
+    def allow(self):
+        """是否放行本次请求"""
+        with self._lock:
+            self._refresh()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                self._probe_started = time.monotonic()
+                return True
+            self._counters['rejected'] += 1
+            return False
+
+    def release_probe(self):
+        """归还半开状态的探测名额（探测请求被取消、没有成功或失败结果时调用）"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probing = False
+
+    def retry_in(self):
+        """距离下一次允许探测的秒数"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0
+            return max(0, self._current_recovery - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+            self._current_recovery = self.recovery_seconds
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                # 探测失败，退避后重新打开
+                self._current_recovery = min(self._current_recovery * 2, self.max_recovery_seconds)
+                self._open()
+                return
+            self._failures += 1
+            if self._state == self.CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        self._counters['opened'] += 1
+        logger.warning(f"Circuit {self.name} opened for {self._current_recovery:.1f} seconds after {self._failures} failures")
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            stats = dict(self._counters)
+            stats.update({
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'recovery_seconds': self._current_recovery
+            })
+        return stats
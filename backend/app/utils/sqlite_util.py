@@ -0,0 +1,57 @@
+import logging
+import sqlite3
+from sqlalchemy import MetaData, PrimaryKeyConstraint, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateTable
+from app.utils.request_util import get_config
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+def sqlite_pragmas():
+    """SQLite连接参数
+
+    WAL模式下读不阻塞写；synchronous=NORMAL在WAL下只在检查点时fsync，
+    掉电最多丢失最近提交的事务但不会损坏数据库。
+    """
+    return [
+        ('journal_mode', 'WAL'),
+        ('synchronous', get_config('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        # 负数表示以KB为单位
+        ('cache_size', -get_config('SQLITE_CACHE_SIZE_KB', 65536)),
+        ('mmap_size', get_config('SQLITE_MMAP_SIZE_MB', 256) * 1024 * 1024),
+        ('temp_store', 'MEMORY'),
+        # 写锁被占用时等待而不是立即报database is locked
+        ('busy_timeout', get_config('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    ]
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """每个新建的SQLite连接都设置WAL等参数（其他数据库不处理）"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+@compiles(CreateTable, 'sqlite')
+def _create_table(create, compiler, **kw):
+    """SQLite只支持单列INTEGER PRIMARY KEY自增
+
+    表的info中设置了sqlite_primary_key时（如按timestamp分区的activity_record，主键为(id, timestamp)），
+    在SQLite上只以该列为主键建表；SQLite不分区，唯一索引仍按模型定义创建。
+    """
+    table = create.element
+    key = table.info.get('sqlite_primary_key')
+    if key is None:
+        return compiler.visit_create_table(create, **kw)
+    copy = table.to_metadata(MetaData())
+    for column in copy.primary_key.columns:
+        column.primary_key = column.name == key
+    copy.append_constraint(PrimaryKeyConstraint(copy.c[key]))
+    return compiler.visit_create_table(CreateTable(copy), **kw)
@@ -4,10 +4,14 @@ import time
 import logging
 from celery import Celery
 from app.extensions import db
-from app.models import ActivityRecord, MonitorTask, CopyTradeConfig
-from app.utils.request_util import fetch_latest_trades
-from app.utils.dedup_util import get_unique_key, deduplicate_data
+from app.models import MonitorTask, CopyTradeConfig
+from app.services.ingest_engine import subscribe, unsubscribe
+from app.services.write_behind import write_behind
+from app.services.partition_maintenance import run_partition_maintenance
+from app.services.cold_archive import archive_cold_records
+from app.utils.dedup_util import deduplicate_data, HighWaterMark
 from app.utils.encrypt_util import decrypt_str
+from app.utils.rate_limit import PRIORITY_COPY_TRADE
 from app.utils.sign_util import init_clob_client
 
 # 设置日志
@@ -36,6 +40,18 @@ celery = Celery(
 # 更新Celery配置
 celery.conf.update(app.config)
 
+# 定时任务（需要启动celery beat）：每天维护一次activity_record分区，归档一次冷数据
+celery.conf.beat_schedule = {
+    'maintain-activity-partitions': {
+        'task': 'maintain_activity_partitions',
+        'schedule': 86400
+    },
+    'archive-cold-records': {
+        'task': 'archive_cold_records',
+        'schedule': 86400
+    }
+}
+
 # 配置任务
 @celery.task(name='monitor_user_activity')
 def monitor_user_activity(target_user, poll_seconds=5):
@@ -51,20 +67,27 @@ def monitor_user_activity(target_user, poll_seconds=5):
     logger.info(f"Starting activity monitoring for user {target_user}, task_id: {task_id}, poll interval: {poll_seconds}s")
     
     try:
-        # 更新任务状态
+        # 更新任务状态，读取已持久化的高水位
+        cursor = None
         with app.app_context():
             task = MonitorTask.query.filter_by(task_id=task_id).first()
             if task:
                 task.status = 'running'
+                cursor = HighWaterMark.from_columns(task.hwm_timestamp, task.hwm_tx_hashes)
                 db.session.commit()
         
+        # 交易记录交给后写式写入器批量持久化
+        write_behind.start(app)
+        
+        # 订阅钱包轮询器（同一进程内监控同一钱包的任务共享一次请求）
+        subscription = subscribe(target_user, task_id, poll_seconds, cursor=cursor)
+        cursor = cursor or HighWaterMark()
+        
         # 持续监控
         while True:
             try:
-                # 获取最新交易数据
-                logger.debug(f"Fetching latest trades for user {target_user}")
-                params = {'user': target_user, 'limit': 100}
-                trades_data = fetch_latest_trades(params)
+                # 等待新交易
+                trades_data = subscription.get(timeout=poll_seconds)
                 
                 # 数据去重
                 unique_trades = deduplicate_data(trades_data)
@@ -72,39 +95,10 @@ def monitor_user_activity(target_user, poll_seconds=5):
                 if unique_trades:
                     logger.info(f"Found {len(unique_trades)} unique trades for user {target_user}")
                     
-                    # 持久化数据
-                    with app.app_context():
-                        saved_count = 0
-                        for trade in unique_trades:
-                            # 生成唯一标识
-                            unique_key = get_unique_key(trade)
-                            
-                            # 检查记录是否已存在
-                            existing_record = ActivityRecord.query.filter_by(unique_key=unique_key).first()
-                            if existing_record:
-                                logger.debug(f"Record already exists: {unique_key}")
-                                continue
-                            
-                            # 创建新记录
-                            record = ActivityRecord(
-                                task_id=task_id,
-                                target_user=target_user,
-                                transaction_hash=trade.get('transactionHash'),
-                                timestamp=trade.get('timestamp'),
-                                asset=trade.get('asset'),
-                                side=trade.get('side'),
-                                size=trade.get('size'),
-                                price=trade.get('price'),
-                                unique_key=unique_key
-                            )
-                            
-                            # 添加到数据库
-                            db.session.add(record)
-                            saved_count += 1
-                        
-                        if saved_count > 0:
-                            db.session.commit()
-                            logger.info(f"Saved {saved_count} new activity records")
+                    # 持久化数据（高水位在交易记录之后写入）
+                    cursor.advance(unique_trades)
+                    write_behind.submit_activity(unique_trades, target_user, task_id)
+                    write_behind.submit_cursor(MonitorTask, task_id, cursor.to_columns())
             
             except Exception as e:
                 logger.error(f"Error in monitor_user_activity: {str(e)}")
@@ -115,9 +109,6 @@ def monitor_user_activity(target_user, poll_seconds=5):
                 if not task or task.status != 'running':
                     logger.info(f"Monitoring task {task_id} stopped by user")
                     return
-            
-            # 等待下一次轮询
-            time.sleep(poll_seconds)
     
     except Exception as e:
         logger.error(f"Monitoring task failed: {str(e)}")
@@ -128,15 +119,18 @@ def monitor_user_activity(target_user, poll_seconds=5):
                 task.status = 'failed'
                 db.session.commit()
         raise
+    finally:
+        unsubscribe(task_id)
 
 @celery.task(name='auto_copy_trade')
-def auto_copy_trade(user_id):
+def auto_copy_trade(user_id, fresh=False):
     """自动跟单
     
     监控目标用户活动，自动复制交易
     
     参数：
         user_id: 用户ID
+        fresh: 为True时清空高水位，从目标钱包的最新交易开始；默认从上次处理到的位置继续
     """
     task_id = auto_copy_trade.request.id
     logger.info(f"Starting auto copy trade for user {user_id}, task_id: {task_id}")
@@ -149,9 +143,13 @@ def auto_copy_trade(user_id):
                 logger.error(f"Copy trade config not found for user {user_id}")
                 return
             
-            # 更新配置
+            # 更新配置，读取已持久化的高水位（要求重新开始时清空）
             config.task_id = task_id
             config.status = 'running'
+            if fresh:
+                config.hwm_timestamp = None
+                config.hwm_tx_hashes = None
+            cursor = HighWaterMark.from_columns(config.hwm_timestamp, config.hwm_tx_hashes)
             db.session.commit()
             
             # 解密私钥
@@ -159,6 +157,14 @@ def auto_copy_trade(user_id):
             
             # 初始化CLOB客户端
             client = init_clob_client(pk, config.my_proxy_wallet)
+            target_user = config.target_user
+        
+        # 高水位更新交给后写式写入器
+        write_behind.start(app)
+        
+        # 订阅目标钱包轮询器（从已持久化的高水位继续）
+        subscription = subscribe(target_user, task_id, 5, cursor=cursor, priority=PRIORITY_COPY_TRADE)
+        cursor = cursor or HighWaterMark()
     
         # 持续监控和跟单
         while True:
@@ -170,10 +176,8 @@ def auto_copy_trade(user_id):
                         logger.info(f"Auto copy trade task {task_id} stopped")
                         return
                 
-                # 获取目标用户的最新交易
-                logger.debug(f"Fetching latest trades for target user {config.target_user}")
-                params = {'user': config.target_user, 'limit': 50}
-                trades_data = fetch_latest_trades(params)
+                # 等待目标用户的新交易
+                trades_data = subscription.get(timeout=5)
                 
                 # 数据去重
                 unique_trades = deduplicate_data(trades_data)
@@ -187,12 +191,14 @@ def auto_copy_trade(user_id):
                         logger.info(f"Copying trade: {trade}")
                         # 这里应该调用client.place_order()等方法
                         # 但由于没有具体API，这里只做日志记录
+                    
+                    # 推进跟单配置的高水位
+                    cursor.advance(unique_trades)
+                    write_behind.submit_cursor(CopyTradeConfig, task_id, cursor.to_columns())
             
             except Exception as e:
                 logger.error(f"Error in auto_copy_trade: {str(e)}")
-            
-            # 等待下一次轮询
-            time.sleep(5)
+                time.sleep(5)
     
     except Exception as e:
         logger.error(f"Auto copy trade failed: {str(e)}")
@@ -203,6 +209,42 @@ def auto_copy_trade(user_id):
                 config.status = 'failed'
                 db.session.commit()
         raise
+    finally:
+        unsubscribe(task_id)
+
+@celery.task(name='maintain_activity_partitions')
+def maintain_activity_partitions():
+    """维护activity_record分区
+    
+    预建未来的月分区，并按保留策略删除（或归档后删除）过期分区
+    """
+    with app.app_context():
+        result = run_partition_maintenance(
+            db.engine,
+            months_ahead=app.config['ACTIVITY_PARTITION_MONTHS_AHEAD'],
+            retention_days=app.config['ACTIVITY_RETENTION_DAYS'],
+            archive=app.config['ACTIVITY_RETENTION_ARCHIVE']
+        )
+    if result is None:
+        logger.info("activity_record is not partitioned, skip maintenance")
+    else:
+        logger.info(f"Partition maintenance finished: created {result['created']}, expired {result['expired']}")
+    return result
+
+@celery.task(name='archive_cold_records')
+def archive_cold_records_task():
+    """归档冷数据
+    
+    将早于ARCHIVE_AFTER_DAYS天的交易记录和跟单记录导出为Parquet文件并从数据库删除
+    """
+    after_days = app.config['ARCHIVE_AFTER_DAYS']
+    if after_days <= 0:
+        logger.info("Cold archive disabled, skip")
+        return None
+    with app.app_context():
+        result = archive_cold_records(after_days, app.config['ARCHIVE_BATCH_SIZE'])
+    logger.info(f"Cold archive finished: {result}")
+    return result
 
 if __name__ == '__main__':
     # 启动Celery worker
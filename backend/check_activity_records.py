@@ -15,14 +15,14 @@ def check_activity_records():
     
     # 检查所有活动记录
     print("=== 所有活动记录 ===")
-    cursor.execute("SELECT id, task_id, target_user, timestamp, asset, side, size, price, created_at FROM activity_record ORDER BY created_at DESC LIMIT 10")
+    cursor.execute("SELECT r.id, r.task_id, w.address, r.timestamp, a.token_id, r.side, r.size, r.price, r.created_at FROM activity_record r LEFT JOIN wallet w ON w.id = r.wallet_id LEFT JOIN asset a ON a.id = r.asset_id ORDER BY r.created_at DESC LIMIT 10")
     records = cursor.fetchall()
     for record in records:
         print(f"ID: {record[0]}, task_id: {record[1]}, target_user: {record[2]}, timestamp: {record[3]}, asset: {record[4]}, side: {record[5]}, size: {record[6]}, price: {record[7]}, created_at: {record[8]}")
     
     # 检查有task_id的记录
     print("\n=== 有task_id的活动记录 ===")
-    cursor.execute("SELECT id, task_id, target_user, timestamp, asset, side, size, price, created_at FROM activity_record WHERE task_id IS NOT NULL ORDER BY created_at DESC")
+    cursor.execute("SELECT r.id, r.task_id, w.address, r.timestamp, a.token_id, r.side, r.size, r.price, r.created_at FROM activity_record r LEFT JOIN wallet w ON w.id = r.wallet_id LEFT JOIN asset a ON a.id = r.asset_id WHERE r.task_id IS NOT NULL ORDER BY r.created_at DESC")
     records = cursor.fetchall()
     print(f"总数: {len(records)}")
     for record in records:
@@ -30,7 +30,7 @@ def check_activity_records():
     
     # 检查有target_user的记录
     print("\n=== 有target_user的活动记录 ===")
-    cursor.execute("SELECT id, task_id, target_user, timestamp, asset, side, size, price, created_at FROM activity_record WHERE target_user IS NOT NULL ORDER BY created_at DESC LIMIT 10")
+    cursor.execute("SELECT r.id, r.task_id, w.address, r.timestamp, a.token_id, r.side, r.size, r.price, r.created_at FROM activity_record r LEFT JOIN wallet w ON w.id = r.wallet_id LEFT JOIN asset a ON a.id = r.asset_id WHERE w.address IS NOT NULL ORDER BY r.created_at DESC LIMIT 10")
     records = cursor.fetchall()
     print(f"总数: {len(records)}")
     for record in records:
@@ -50,14 +50,14 @@ def create_super_admin():
                 CREATE TABLE IF NOT EXISTS activity_record (
                     id INT PRIMARY KEY AUTO_INCREMENT,
                     task_id VARCHAR(100),
-                    target_user VARCHAR(100) NOT NULL,
+                    wallet_id INT NOT NULL,
                     transaction_hash VARCHAR(100),
                     timestamp INT NOT NULL,
-                    asset VARCHAR(50),
+                    asset_id INT,
                     side VARCHAR(10),
                     size FLOAT,
                     price FLOAT,
-                    unique_key VARCHAR(100) UNIQUE,
+                    unique_key BINARY(16) UNIQUE,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
             """
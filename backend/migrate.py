@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本
+
+用法：
+    python migrate.py              执行所有未执行的迁移
+    python migrate.py --status     查看迁移状态
+    python migrate.py --check      检查高频查询是否全表扫描（有问题时返回非0）
+"""
+import argparse
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from app.extensions import db
+from app.migrations import migration_status, run_migrations
+from app.migrations.plan_check import check_query_plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库迁移')
+    parser.add_argument('--status', action='store_true', help='查看迁移状态')
+    parser.add_argument('--check', action='store_true', help='检查高频查询的执行计划')
+    parser.add_argument('--target', type=int, help='只执行到指定版本')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.status:
+            for item in migration_status(db.engine):
+                mark = 'x' if item['applied'] else ' '
+                print(f"[{mark}] {item['name']}: {item['description']}")
+            return 0
+
+        if args.check:
+            with db.engine.connect() as conn:
+                failures = check_query_plans(conn)
+            for name, tables in failures.items():
+                print(f"全表扫描: {name} -> {', '.join(tables)}")
+            if failures:
+                return 1
+            print("高频查询均使用索引")
+            return 0
+
+        applied = run_migrations(db.engine, target=args.target)
+        for name in applied:
+            print(f"已执行迁移: {name}")
+        print("数据库已是最新版本" if not applied else f"共执行{len(applied)}个迁移")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
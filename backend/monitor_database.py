@@ -28,7 +28,7 @@ def monitor_database():
             task_count = cursor.fetchone()[0]
             
             # 检查最新的记录
-            cursor.execute("SELECT id, task_id, target_user, timestamp, created_at FROM activity_record ORDER BY created_at DESC LIMIT 1")
+            cursor.execute("SELECT r.id, r.task_id, w.address, r.timestamp, r.created_at FROM activity_record r LEFT JOIN wallet w ON w.id = r.wallet_id ORDER BY r.created_at DESC LIMIT 1")
             latest = cursor.fetchone()
             
             print(f"[{time.strftime('%H:%M:%S')}] 总记录数: {count}, 有task_id的记录数: {task_count}")
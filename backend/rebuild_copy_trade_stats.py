@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+跟单统计重建脚本
+
+用法：
+    python rebuild_copy_trade_stats.py                 从跟单记录重建全部任务的统计
+    python rebuild_copy_trade_stats.py --task ID       只重建指定任务
+    python rebuild_copy_trade_stats.py --check         只比较统计表与重新计算的结果（不一致时返回非0）
+"""
+import argparse
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from app.extensions import db
+from app.services.copy_trade_stats import rebuild_copy_trade_stats, check_copy_trade_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='重建跟单统计')
+    parser.add_argument('--task', help='只处理指定任务ID')
+    parser.add_argument('--check', action='store_true', help='只检查统计是否一致')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            if args.check:
+                mismatches = check_copy_trade_stats(conn, args.task)
+                for task_id, actual, expected in mismatches:
+                    print(f"统计不一致: {task_id}\n  统计表: {actual}\n  重新计算: {expected}")
+                if mismatches:
+                    return 1
+                print("跟单统计一致")
+                return 0
+
+            count = rebuild_copy_trade_stats(conn, args.task)
+            conn.commit()
+            print(f"已重建{count}个任务的统计")
+            return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
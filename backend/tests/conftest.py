@@ -0,0 +1,61 @@
+import os
+import sys
+import pytest
+from flask import Flask
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.config import EmbeddedConfig
+from app.extensions import db
+from tests.helpers import reset_process_caches
+
+@pytest.fixture
+def app(tmp_path):
+    """使用临时SQLite库的最小应用（不注册蓝图，不需要Redis）"""
+    app = Flask('tests', instance_path=str(tmp_path))
+    app.config.from_object(EmbeddedConfig)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        # 不可连接的地址，去重索引、限流器等退化为进程内实现
+        REDIS_URL='redis://127.0.0.1:1/0',
+        ARCHIVE_DIR=str(tmp_path / 'archive')
+    )
+    db.init_app(app)
+    # 导入模型以注册表结构
+    from app import models  # noqa: F401
+    reset_process_caches()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """完整应用（注册全部蓝图）的测试客户端，请求以超级管理员身份登录"""
+    pytest.importorskip('Crypto')
+    from app import create_app
+    from app.config import config
+    from app.models import User
+    from app.utils.auth_util import generate_tokens
+
+    class PytestConfig(EmbeddedConfig):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'api.db'}"
+        REDIS_URL = 'redis://127.0.0.1:1/0'
+        ARCHIVE_DIR = str(tmp_path / 'archive')
+
+    monkeypatch.setitem(config, 'pytest', PytestConfig)
+    reset_process_caches()
+    app = create_app('pytest')
+    with app.app_context():
+        user = User(username='admin', password='-', is_super_admin=True)
+        db.session.add(user)
+        db.session.commit()
+        client = app.test_client()
+        client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {generate_tokens(user.id, True)['access_token']}"
+        yield client
+        db.session.remove()
+        db.drop_all()
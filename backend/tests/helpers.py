@@ -0,0 +1,27 @@
+import os
+
+def trade(timestamp, n, **extra):
+    """构造上游/activity返回的交易；唯一标识取交易哈希前16字节，n不同的交易前缀不同"""
+    return dict({
+        'timestamp': timestamp,
+        'transactionHash': '0x' + f"{n:08x}" * 8,
+        'asset': '123',
+        'side': 'BUY',
+        'size': 1,
+        'price': 0.5
+    }, **extra)
+
+def reset_process_caches():
+    """清空进程内缓存（模拟进程重启；去重索引和维度id缓存不能跨测试数据库使用）"""
+    from app.services.dimensions import asset_ids, wallet_ids
+    from app.utils.cache_util import LRUCache
+    from app.utils.dedup_util import activity_index
+    activity_index.local = LRUCache(activity_index.local.maxsize, activity_index.local.ttl)
+    for cache in (wallet_ids, asset_ids):
+        with cache._lock:
+            cache._ids.clear()
+
+def crash(journal):
+    """模拟进程崩溃：不写检查点，释放槽位锁和分段文件"""
+    journal._lock_file.close()
+    os.close(journal._fd)
@@ -0,0 +1,56 @@
+from sqlalchemy.dialects import mysql
+from sqlalchemy.schema import CreateTable
+from app.extensions import db
+from app.models import ActivityRecord
+from app.services import partition_maintenance
+from app.utils.db_util import bulk_insert_ignore
+
+def test_mysql_schema_matches_partitioned_table():
+    ddl = str(CreateTable(ActivityRecord.__table__).compile(dialect=mysql.dialect()))
+    assert 'id INTEGER NOT NULL AUTO_INCREMENT' in ddl
+    assert 'PRIMARY KEY (id, timestamp)' in ddl
+    unique = [ix for ix in ActivityRecord.__table__.indexes if ix.unique]
+    assert [(ix.name, [c.name for c in ix.columns]) for ix in unique] == [('unique_key', ['unique_key', 'timestamp'])]
+
+def test_sqlite_keeps_autoincrement_id(app):
+    row = {'task_id': 't', 'wallet_id': 1, 'timestamp': 100, 'unique_key': b'k' * 16}
+    assert bulk_insert_ignore(ActivityRecord, [row, dict(row, unique_key=b'j' * 16)]) == 2
+    assert bulk_insert_ignore(ActivityRecord, [row]) == 0
+    db.session.commit()
+    assert sorted(r.id for r in ActivityRecord.query.all()) == [1, 2]
+
+class RecordingConn:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+
+class FakeInspector:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def has_table(self, name):
+        return name in self.tables
+
+def expire_with(monkeypatch, existing_tables):
+    conn = RecordingConn()
+    monkeypatch.setattr(partition_maintenance, 'list_partitions', lambda conn: [('p200001', 946684800), ('p_future', None)])
+    monkeypatch.setattr(partition_maintenance, 'inspect', lambda conn: FakeInspector(existing_tables))
+    assert partition_maintenance.expire_partitions(conn, retention_days=30, archive=True) == ['p200001']
+    return conn.statements
+
+def test_archive_removes_partitioning_from_new_archive_table(monkeypatch):
+    statements = expire_with(monkeypatch, set())
+    assert statements[:2] == [
+        'CREATE TABLE activity_record_archive_p200001 LIKE activity_record',
+        'ALTER TABLE activity_record_archive_p200001 REMOVE PARTITIONING'
+    ]
+    assert statements[-1] == 'ALTER TABLE activity_record DROP PARTITION p200001'
+
+def test_archive_reuses_existing_archive_table(monkeypatch):
+    statements = expire_with(monkeypatch, {'activity_record_archive_p200001'})
+    assert statements == [
+        'ALTER TABLE activity_record EXCHANGE PARTITION p200001 WITH TABLE activity_record_archive_p200001',
+        'ALTER TABLE activity_record DROP PARTITION p200001'
+    ]
@@ -0,0 +1,40 @@
+from app.services.backfill import BackfillRunner
+from tests.helpers import trade
+
+class FakeActivity:
+    """按/activity的start、end、offset、limit参数倒序返回交易"""
+
+    def __init__(self, trades):
+        self.trades = sorted(trades, key=lambda it: it['timestamp'], reverse=True)
+        self.requests = []
+
+    def __call__(self, params):
+        self.requests.append(dict(params))
+        rows = [it for it in self.trades if params['start'] <= it['timestamp'] <= params['end']]
+        offset = params.get('offset', 0)
+        return rows[offset:offset + params['limit']]
+
+def runner_with(app, trades, page_size):
+    app.config['BACKFILL_PAGE_SIZE'] = page_size
+    runner = BackfillRunner(app, 'job', '0xw')
+    runner._fetch = FakeActivity(trades)
+    return runner
+
+def hashes(trades):
+    return {it['transactionHash'] for it in trades}
+
+def test_fetch_window_pages_by_time_cursor(app):
+    trades = [trade(100 + i, i) for i in range(10)]
+    runner = runner_with(app, trades, page_size=4)
+    fetched, pages = runner._fetch_window('0xw', 100, 109)
+    assert hashes(fetched) == hashes(trades)
+    assert pages == len(runner._fetch.requests)
+
+def test_fetch_window_pages_within_a_busy_second(app):
+    # 同一秒内的交易多于一页，不能直接跳到上一秒
+    trades = [trade(105, i) for i in range(9)] + [trade(104, 20), trade(103, 21)]
+    runner = runner_with(app, trades, page_size=4)
+    fetched, _ = runner._fetch_window('0xw', 100, 105)
+    assert hashes(fetched) == hashes(trades)
+    assert [r['offset'] for r in runner._fetch.requests[:3]] == [0, 4, 8]
+    assert all(r['end'] == 105 for r in runner._fetch.requests[:3])
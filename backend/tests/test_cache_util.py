@@ -0,0 +1,103 @@
+import threading
+import time
+import pytest
+from app.utils import cache_util
+from app.utils.cache_util import TwoTierCache, normalize_cache_key
+
+class FakeRedis:
+    """只实现TwoTierCache用到的命令，多个缓存实例共用时模拟多个进程"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    def exists(self, key):
+        return key in self.data
+
+    def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+
+class Loader:
+    def __init__(self, value='v', gate=None):
+        self.value = value
+        self.gate = gate
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        return self.value
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(cache_util, 'get_redis', lambda: client)
+    return client
+
+@pytest.fixture
+def no_redis(monkeypatch):
+    monkeypatch.setattr(cache_util, 'get_redis', lambda: None)
+
+def test_local_tier_serves_repeated_lookups(no_redis):
+    cache, loader = TwoTierCache('t'), Loader()
+    assert cache.get_or_load('k', loader) == 'v'
+    assert cache.get_or_load('k', loader) == 'v'
+    assert loader.calls == 1
+    assert cache.stats()['local_hits'] == 1
+
+def test_concurrent_misses_are_coalesced_in_process(no_redis):
+    cache, gate = TwoTierCache('t'), threading.Event()
+    loader = Loader(gate=gate)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('k', loader))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()['coalesced_local'] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert results == ['v'] * 5
+    assert loader.calls == 1
+
+def test_loader_error_reaches_waiters_and_is_not_cached(no_redis):
+    cache = TwoTierCache('t')
+
+    def fail():
+        raise RuntimeError('upstream down')
+    with pytest.raises(RuntimeError):
+        cache.get_or_load('k', fail)
+    assert cache.get_or_load('k', Loader()) == 'v'
+
+def test_shared_tier_is_used_across_processes(redis):
+    loader = Loader(['trade'])
+    assert TwoTierCache('t').get_or_load('k', loader) == ['trade']
+    other = TwoTierCache('t')
+    assert other.get_or_load('k', loader) == ['trade']
+    assert loader.calls == 1
+    assert other.stats()['shared_hits'] == 1
+    # 加载完成后释放跨进程锁
+    assert 'cache:t:k:lock' not in redis.data
+
+def test_waiting_process_reads_result_of_lock_holder(redis):
+    redis.data['cache:t:k:lock'] = 'other'
+    cache, loader = TwoTierCache('t', lock_timeout=2), Loader()
+    threading.Timer(0.1, lambda: redis.data.update({'cache:t:k': '"shared"'})).start()
+    assert cache.get_or_load('k', loader) == 'shared'
+    assert loader.calls == 0
+    assert cache.stats()['coalesced_shared'] == 1
+
+def test_normalize_cache_key():
+    assert normalize_cache_key({'user': '0xAbC', 'side': None, 'fields': ['size', 'asset'], 'limit': 5}) == \
+        normalize_cache_key({'limit': 5, 'fields': ['asset', 'size'], 'user': '0xabc', 'offset': ''})
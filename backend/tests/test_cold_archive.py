@@ -0,0 +1,43 @@
+import pytest
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.models import ActivityRecord
+from app.services.activity_store import save_activity_records
+from app.services.cold_archive import archive_table, read_archive, with_archived
+from tests.helpers import trade
+
+pytest.importorskip('pyarrow')
+
+START = 86400
+
+@pytest.fixture
+def archived(app):
+    """归档10条交易记录（创建时间依次递增1秒），返回按(created_at, id)倒序的id"""
+    save_activity_records([trade(START + i, i + 1) for i in range(10)], '0xAbC', 'task')
+    base = datetime(2024, 1, 1)
+    for record in ActivityRecord.query.all():
+        record.created_at = base + timedelta(seconds=record.timestamp - START)
+    db.session.commit()
+    assert archive_table('activity_record', START + 100) == 10
+    return [record['id'] for record in sorted(
+        read_archive('activity_record'), key=lambda r: (r['created_at'], r['id']), reverse=True
+    )]
+
+def test_read_archive_returns_newest_rows_up_to_limit(archived):
+    rows = read_archive('activity_record', START, filters={'task_id': 'task'}, limit=3)
+    assert [row['id'] for row in rows] == archived[:3]
+
+def test_read_archive_applies_before_cursor(archived):
+    newest = read_archive('activity_record', START, limit=3)
+    cursor = (newest[-1]['created_at'], newest[-1]['id'])
+    rows = read_archive('activity_record', START, before=cursor, limit=3)
+    assert [row['id'] for row in rows] == archived[3:6]
+
+def test_read_archive_limit_larger_than_archive(archived):
+    assert [row['id'] for row in read_archive('activity_record', START, limit=20)] == archived
+    assert read_archive('activity_record', START, filters={'task_id': 'other'}, limit=3) == []
+
+def test_with_archived_merges_limited_page(archived):
+    merged = with_archived('activity_record', [], START, None, {'task_id': 'task'}, limit=4)
+    assert [record.id for record in merged] == archived[:4]
+    assert with_archived('activity_record', [], None, None, limit=4) == []
@@ -0,0 +1,45 @@
+from app.api import copy_trade
+from app.extensions import db
+from app.models import CopyTradeConfig
+from app.utils.encrypt_util import encrypt_str
+
+HWM = (100, '{"00": 100}')
+
+def save_config(target_user='0xTarget'):
+    config = CopyTradeConfig.query.first() or CopyTradeConfig(user_id=1, my_proxy_wallet='0xme', pk_encrypted=encrypt_str('pk'))
+    config.target_user = target_user
+    config.status = 'stopped'
+    config.hwm_timestamp, config.hwm_tx_hashes = HWM
+    db.session.add(config)
+    db.session.commit()
+
+def stored_hwm():
+    db.session.expire_all()
+    config = CopyTradeConfig.query.first()
+    return config.hwm_timestamp, config.hwm_tx_hashes
+
+def start(api, monkeypatch, **body):
+    monkeypatch.setattr(copy_trade, 'copy_trade_worker', lambda *args: None)
+    response = api.post('/api/v1/copy-trade/start', json=body or None)
+    assert response.get_json()['code'] == 200
+    return response.get_json()['data']['task_id']
+
+def test_start_and_stop_keep_high_water_mark(api, monkeypatch):
+    save_config()
+    start(api, monkeypatch)
+    assert stored_hwm() == HWM
+    assert api.post('/api/v1/copy-trade/stop').get_json()['code'] == 200
+    assert stored_hwm() == HWM
+    start(api, monkeypatch)
+    assert stored_hwm() == HWM
+
+def test_fresh_start_resets_high_water_mark(api, monkeypatch):
+    save_config()
+    start(api, monkeypatch, fresh=True)
+    assert stored_hwm() == (None, None)
+
+def test_changing_target_resets_high_water_mark(api):
+    save_config()
+    body = {'target_user': '0xOther', 'wallet_address': '0xme', 'private_key': 'pk'}
+    assert api.post('/api/v1/copy-trade/config', json=body).get_json()['code'] == 200
+    assert stored_hwm() == (None, None)
@@ -0,0 +1,53 @@
+import importlib
+from datetime import datetime
+from sqlalchemy import create_engine, text
+from app.services.copy_trade_stats import insert_copy_trade_records, get_copy_trade_stat
+from app.extensions import db
+
+m0008 = importlib.import_module('app.migrations.versions.m0008_copy_trade_record_unique')
+
+def record(target_tx_hash, tx_hash, status='success'):
+    return {
+        'task_id': 't1', 'wallet_id': 1, 'target_tx_hash': target_tx_hash, 'tx_hash': tx_hash,
+        'amount': 1.0, 'price': 0.5, 'size': 2, 'side': 'BUY', 'asset_id': 1,
+        'status': status, 'created_at': datetime.utcnow()
+    }
+
+def test_replayed_record_is_ignored(app):
+    assert insert_copy_trade_records([record('0xa', 'o1')]) == 1
+    assert insert_copy_trade_records([record('0xa', 'o1')]) == 0
+    db.session.commit()
+    assert get_copy_trade_stat('t1')['total_trades'] == 1
+
+def test_records_without_target_hash_do_not_collide(app):
+    assert insert_copy_trade_records([record(None, 'o1'), record(None, 'o2', 'failed')]) == 2
+    db.session.commit()
+    stat = get_copy_trade_stat('t1')
+    assert stat['total_trades'] == 2
+    assert stat['failed_trades'] == 1
+
+def test_m0008_keeps_records_without_hash(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'm0008.db'}")
+    with engine.connect() as conn:
+        conn.execute(text(
+            "CREATE TABLE copy_trade_record (id INTEGER PRIMARY KEY, task_id VARCHAR(100), "
+            "target_tx_hash VARCHAR(100), status VARCHAR(20), amount FLOAT)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE copy_trade_stat (task_id VARCHAR(100) PRIMARY KEY, total_trades INTEGER, "
+            "success_trades INTEGER, failed_trades INTEGER, volume FLOAT)"
+        ))
+        conn.execute(text(
+            "INSERT INTO copy_trade_record (task_id, target_tx_hash, status, amount) VALUES "
+            "('t1', '0xa', 'success', 1), ('t1', '0xa', 'success', 1), "
+            "('t1', '', 'failed', 0), ('t1', '', 'failed', 0), ('t1', NULL, 'success', 2)"
+        ))
+        conn.execute(text("INSERT INTO copy_trade_stat VALUES ('t1', 5, 3, 2, 4)"))
+        conn.commit()
+
+        m0008.upgrade(conn)
+
+        rows = conn.execute(text("SELECT target_tx_hash FROM copy_trade_record ORDER BY id")).scalars().all()
+        assert rows == ['0xa', None, None, None]
+        stat = conn.execute(text("SELECT total_trades, success_trades, failed_trades, volume FROM copy_trade_stat")).one()
+        assert tuple(stat) == (4, 2, 2, 3)
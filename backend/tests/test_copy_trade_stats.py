@@ -0,0 +1,53 @@
+import pytest
+from datetime import datetime
+from app.extensions import db
+from app.models import CopyTradeConfig, CopyTradeStat
+from app.services.copy_trade_stats import (
+    check_copy_trade_stats, get_copy_trade_stat, insert_copy_trade_records, rebuild_copy_trade_stats
+)
+
+def record(n, status='success', amount=1.0, task_id='t1', created_at=None):
+    return {
+        'task_id': task_id, 'wallet_id': 1, 'target_tx_hash': f"0x{n}", 'tx_hash': f"o{n}",
+        'amount': amount, 'price': 0.5, 'size': 2, 'side': 'BUY', 'asset_id': 1,
+        'status': status, 'created_at': created_at or datetime(2024, 1, 1, 0, 0, n)
+    }
+
+def test_counters_follow_inserted_records(app):
+    insert_copy_trade_records([record(1), record(2, amount=2.5), record(3, 'failed', 0)])
+    insert_copy_trade_records([record(4, task_id='t2')])
+    db.session.commit()
+    stat = get_copy_trade_stat('t1')
+    assert (stat['total_trades'], stat['success_trades'], stat['failed_trades'], stat['volume']) == (3, 2, 1, 3.5)
+    assert get_copy_trade_stat('t2')['total_trades'] == 1
+    assert get_copy_trade_stat('missing')['total_trades'] == 0
+    assert db.session.get(CopyTradeStat, 't1').last_trade_at == datetime(2024, 1, 1, 0, 0, 3)
+    assert check_copy_trade_stats(db.session) == []
+
+def test_rebuild_repairs_drifted_counters(app):
+    insert_copy_trade_records([record(1), record(2)])
+    db.session.get(CopyTradeStat, 't1').total_trades = 7
+    db.session.commit()
+    assert [task_id for task_id, _, _ in check_copy_trade_stats(db.session)] == ['t1']
+    assert rebuild_copy_trade_stats(db.session) == 1
+    db.session.commit()
+    assert check_copy_trade_stats(db.session) == []
+    assert get_copy_trade_stat('t1')['total_trades'] == 2
+
+def test_rebuild_counts_archived_records(app):
+    pytest.importorskip('pyarrow')
+    from app.services.cold_archive import archive_table
+    insert_copy_trade_records([record(1, created_at=datetime(2020, 1, 1)), record(2)])
+    db.session.commit()
+    assert archive_table('copy_trade_record', datetime(2021, 1, 1).timestamp()) == 1
+    assert check_copy_trade_stats(db.session) == []
+    rebuild_copy_trade_stats(db.session, 't1')
+    db.session.commit()
+    assert get_copy_trade_stat('t1')['total_trades'] == 2
+
+def test_stat_endpoint_reads_counters(api):
+    db.session.add(CopyTradeConfig(user_id=1, task_id='t1', target_user='0xt', my_proxy_wallet='0xme', pk_encrypted='-'))
+    insert_copy_trade_records([record(1), record(2, 'failed', 0)])
+    db.session.commit()
+    data = api.get('/api/v1/copy-trade/stat').get_json()['data']
+    assert (data['total_trades'], data['success_trades'], data['failed_trades'], data['volume']) == (2, 1, 1, 1.0)
@@ -0,0 +1,72 @@
+import pytest
+from flask import Flask
+from app.config import EmbeddedConfig
+from app.extensions import db
+from app.models import MonitorTask
+from app.utils import db_router
+from app.utils.db_router import ReplicaRouter, replica_reads
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    """主库和一个只读副本（两个SQLite文件，数据不同以区分查询走了哪个库）"""
+    app = Flask('tests', instance_path=str(tmp_path))
+    app.config.from_object(EmbeddedConfig)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+        SQLALCHEMY_BINDS={'replica_0': f"sqlite:///{tmp_path / 'replica.db'}"},
+        REDIS_URL='redis://127.0.0.1:1/0'
+    )
+    db.init_app(app)
+    router = ReplicaRouter()
+    monkeypatch.setattr(db_router, 'replica_router', router)
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines['replica_0'])
+        with db.engines['replica_0'].begin() as conn:
+            conn.execute(MonitorTask.__table__.insert().values(task_id='replica', target_user='0x0'))
+        db.session.add(MonitorTask(task_id='primary', target_user='0x0'))
+        db.session.commit()
+        db.session.remove()
+        yield router
+        db.session.remove()
+    # init_app为每个bind注册的元数据留在全局db上，其他用例的drop_all会找不到该bind
+    db.metadatas.pop('replica_0', None)
+
+def task_ids():
+    return [task.task_id for task in MonitorTask.query.all()]
+
+def test_reads_use_primary_outside_replica_scope(router):
+    assert task_ids() == ['primary']
+
+def test_reads_use_replica_inside_replica_scope(router):
+    with replica_reads():
+        assert task_ids() == ['replica']
+    assert router.stats()['replica_reads'] == 1
+
+def test_session_with_pending_changes_reads_primary(router):
+    with replica_reads():
+        db.session.add(MonitorTask(task_id='pending', target_user='0x0'))
+        assert sorted(task_ids()) == ['pending', 'primary']
+
+def test_lagging_replica_falls_back_to_primary(router, monkeypatch):
+    monkeypatch.setattr(router, '_measure_lag', lambda engine: 60)
+    with replica_reads():
+        assert task_ids() == ['primary']
+    assert router.stats()['lag_fallbacks'] == 1
+    assert router.stats()['replicas'] == {'replica_0': 60}
+
+def test_unreachable_replica_falls_back_to_primary(router, monkeypatch):
+    def fail(engine):
+        raise OSError('connection refused')
+    monkeypatch.setattr(router, '_measure_lag', fail)
+    with replica_reads():
+        assert task_ids() == ['primary']
+
+def test_user_reads_own_writes_from_primary(router, monkeypatch):
+    monkeypatch.setattr(router, '_current_user', lambda: 1)
+    with replica_reads():
+        db.session.add(MonitorTask(task_id='written', target_user='0x0'))
+        db.session.commit()
+        assert sorted(task_ids()) == ['primary', 'written']
+    assert router.stats()['read_your_writes'] == 1
@@ -0,0 +1,55 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.dialects import mysql
+from app.extensions import db
+from app.models import CopyTradeStat, Wallet
+from app.utils.db_util import bulk_insert_ignore, insert_ignore, upsert
+
+def add_counts(table, inserted):
+    return {'total_trades': table.c.total_trades + inserted.total_trades, 'volume': table.c.volume + inserted.volume}
+
+def stat_row(task_id, total, volume):
+    return {'task_id': task_id, 'total_trades': total, 'success_trades': 0, 'failed_trades': 0, 'volume': volume}
+
+def test_bulk_insert_ignore_skips_duplicates_on_sqlite(app):
+    now = datetime.utcnow()
+    rows = [{'address': f"0x{i}", 'created_at': now} for i in range(3)]
+    assert bulk_insert_ignore(Wallet, rows) == 3
+    db.session.commit()
+    assert bulk_insert_ignore(Wallet, rows + [{'address': '0x9', 'created_at': now}]) == 1
+    db.session.commit()
+    assert db.session.scalar(select(func.count()).select_from(Wallet)) == 4
+
+def test_bulk_insert_ignore_chunks_large_batches(app, monkeypatch):
+    from app.utils import db_util
+    monkeypatch.setattr(db_util, 'BULK_CHUNK_SIZE', 2)
+    now = datetime.utcnow()
+    assert bulk_insert_ignore(Wallet, [{'address': f"0x{i}", 'created_at': now} for i in range(5)]) == 5
+
+def test_upsert_accumulates_on_sqlite(app):
+    db.session.execute(upsert(CopyTradeStat, 'sqlite', [stat_row('a', 1, 2.0)], add_counts))
+    db.session.execute(upsert(CopyTradeStat, 'sqlite', [stat_row('a', 2, 3.0), stat_row('b', 1, 1.0)], add_counts))
+    db.session.commit()
+    stats = {stat.task_id: stat for stat in CopyTradeStat.query.all()}
+    assert stats['a'].total_trades == 3
+    assert stats['a'].volume == pytest.approx(5.0)
+    assert stats['b'].total_trades == 1
+
+def test_insert_ignore_compiles_for_mysql():
+    stmt = insert_ignore(Wallet, 'mysql').values([{'address': '0x1'}, {'address': '0x2'}])
+    sql = str(stmt.compile(dialect=mysql.dialect()))
+    assert sql.startswith('INSERT IGNORE INTO wallet')
+    assert sql.endswith('VALUES (%s, %s), (%s, %s)')
+
+def test_upsert_compiles_for_mysql():
+    stmt = upsert(CopyTradeStat, 'mysql', [stat_row('a', 1, 2.0)], add_counts)
+    sql = str(stmt.compile(dialect=mysql.dialect()))
+    assert 'ON DUPLICATE KEY UPDATE' in sql
+    assert 'total_trades = (copy_trade_stat.total_trades + VALUES(total_trades))' in sql
+
+def test_unsupported_dialect_raises():
+    with pytest.raises(ValueError):
+        insert_ignore(Wallet, 'oracle')
+    with pytest.raises(ValueError):
+        upsert(CopyTradeStat, 'oracle', [], add_counts)
@@ -0,0 +1,106 @@
+import json
+from app.utils.dedup_util import DedupUtil, HighWaterMark, KEY_BYTES
+from tests.helpers import trade
+
+def test_new_trades_advance_high_water_mark():
+    cursor = HighWaterMark.from_trades([trade(100, 1)])
+    assert cursor.timestamp == 100
+    assert not cursor.is_new(trade(100, 1))
+    assert cursor.is_new(trade(100, 2))
+    assert cursor.is_new(trade(101, 3))
+
+    cursor.advance([trade(100, 2), trade(105, 3)])
+    assert cursor.timestamp == 105
+    assert not cursor.is_new(trade(100, 2))
+    assert not cursor.is_new(trade(105, 3))
+
+def test_trades_inside_lookback_window_are_still_accepted():
+    cursor = HighWaterMark(lookback=30)
+    cursor.advance([trade(1000, 1)])
+    # 上游延迟索引、时间戳早于高水位但在窗口内的交易
+    assert cursor.floor == 970
+    assert cursor.is_new(trade(980, 2))
+    assert not cursor.is_new(trade(969, 3))
+
+def test_keys_before_floor_are_dropped():
+    cursor = HighWaterMark(lookback=10)
+    cursor.advance([trade(100, 1), trade(105, 2)])
+    cursor.advance([trade(112, 3)])
+    # 100早于新的floor(102)，不再需要保留
+    assert len(cursor.keys) == 2
+    assert not cursor.is_new(trade(100, 1))
+    assert not cursor.is_new(trade(105, 2))
+
+def test_max_keys_evicts_oldest_keys_without_moving_floor():
+    cursor = HighWaterMark(lookback=60, max_keys=3)
+    cursor.advance([trade(100 + i, i) for i in range(5)])
+    assert len(cursor.keys) == 3
+    assert cursor.floor == 44
+    assert cursor.evicted_through == 101
+    # 延迟索引、时间戳早于被淘汰标识的交易仍按新交易返回
+    assert cursor.is_new(trade(90, 10))
+    assert not cursor.is_new(trade(104, 4))
+
+def test_unverified_returns_trades_in_the_evicted_range():
+    cursor = HighWaterMark(lookback=60, max_keys=3)
+    assert cursor.unverified([trade(100, 0)]) == []
+    cursor.advance([trade(100 + i, i) for i in range(5)])
+    assert cursor.unverified([trade(90, 10), trade(101, 1), trade(103, 3)]) == [trade(90, 10), trade(101, 1)]
+
+def test_evicted_range_expires_with_the_window():
+    cursor = HighWaterMark(lookback=60, max_keys=3)
+    cursor.advance([trade(100 + i, i) for i in range(5)])
+    cursor.advance([trade(200, 5)])
+    assert cursor.unverified([trade(150, 6)]) == []
+    assert '"evicted"' not in cursor.to_columns()[1]
+
+def test_eviction_survives_round_trip_through_columns():
+    cursor = HighWaterMark(max_keys=3)
+    cursor.advance([trade(100 + i, i) for i in range(5)])
+    restored = HighWaterMark.from_columns(*cursor.to_columns())
+    assert restored.timestamp == cursor.timestamp
+    assert restored.floor == cursor.floor
+    assert restored.evicted_through == cursor.evicted_through
+    assert restored.keys == cursor.keys
+    assert not restored.is_new(trade(104, 4))
+
+def test_from_columns_returns_none_without_timestamp():
+    assert HighWaterMark.from_columns(None, None) is None
+
+def test_copied_target_tx_hashes_finds_existing_records(app):
+    from datetime import datetime
+    from app.services.copy_trade_stats import copied_target_tx_hashes, insert_copy_trade_records
+    from app.extensions import db
+    insert_copy_trade_records([{
+        'task_id': 't1', 'wallet_id': 1, 'target_tx_hash': '0xa', 'tx_hash': 'o1', 'amount': 1, 'price': 0.5,
+        'size': 2, 'side': 'BUY', 'asset_id': 1, 'status': 'success', 'created_at': datetime.utcnow()
+    }])
+    db.session.commit()
+    assert copied_target_tx_hashes('t1', ['0xa', '0xb', None]) == {'0xa'}
+    assert copied_target_tx_hashes('t2', ['0xa']) == set()
+
+def test_unique_key_is_first_16_bytes_of_tx_hash():
+    tx_hash = '0x' + 'ab' * 32
+    assert DedupUtil.get_unique_key({'transactionHash': tx_hash}) == bytes.fromhex('ab' * 16)
+    # 旧版十六进制标识按UNHEX(LEFT(...,32))转换为同一个标识
+    assert DedupUtil.key_from_text('ab' * 32) == bytes.fromhex('ab' * 16)
+
+def test_unique_key_without_tx_hash_digests_trade_fields():
+    fields = {'timestamp': 100, 'asset': '123', 'side': 'BUY', 'size': 1, 'price': 0.5}
+    key = DedupUtil.get_unique_key(fields)
+    assert len(key) == KEY_BYTES
+    assert key == DedupUtil.get_unique_key(dict(fields))
+    assert key != DedupUtil.get_unique_key(dict(fields, price=0.6))
+
+def test_batch_keys_keep_order_and_deduplicate():
+    trades = [trade(100, 1), trade(101, 2), trade(100, 1)]
+    keys = DedupUtil.get_unique_keys(trades)
+    assert keys == [DedupUtil.get_unique_key(it) for it in trades]
+    assert keys[0] == keys[2]
+    assert DedupUtil.deduplicate_data(trades) == trades[:2]
+
+def test_legacy_hex_keys_load_as_binary():
+    legacy = json.dumps(['0x' + '01' * 32])
+    cursor = HighWaterMark.from_columns(100, legacy)
+    assert set(cursor.keys) == {bytes.fromhex('01' * 16)}
+    assert json.loads(cursor.to_columns()[1]) == {'01' * 16: 100}
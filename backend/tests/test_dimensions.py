@@ -0,0 +1,33 @@
+from app.extensions import db
+from app.models import MonitorTask, Wallet
+from app.services.activity_store import save_activity_records
+from app.services.dimensions import wallet_ids, asset_ids
+from tests.helpers import trade, reset_process_caches
+
+CHECKSUMMED = '0xAbCdEf0000000000000000000000000000000001'
+
+def test_wallet_spellings_share_one_lowercase_row(app):
+    ids = wallet_ids.ids_for([CHECKSUMMED, CHECKSUMMED.lower()])
+    db.session.commit()
+    assert set(ids) == {CHECKSUMMED, CHECKSUMMED.lower()}
+    assert ids[CHECKSUMMED] == ids[CHECKSUMMED.lower()]
+    assert [w.address for w in Wallet.query.all()] == [CHECKSUMMED.lower()]
+
+def test_new_ids_are_cached_only_after_commit(app):
+    asset_ids.ids_for(['1'])
+    db.session.rollback()
+    assert asset_ids.stats()['size'] == 0
+    ids = asset_ids.ids_for(['1'])
+    db.session.commit()
+    assert asset_ids.stats()['size'] == 1
+    reset_process_caches()
+    assert asset_ids.ids_for(['1']) == ids
+
+def test_monitor_logs_return_lowercase_wallet(api):
+    db.session.add(MonitorTask(task_id='t1', target_user=CHECKSUMMED, status='stopped'))
+    save_activity_records([trade(100, 1)], CHECKSUMMED, 't1')
+    data = api.get('/api/v1/monitor/logs?task_id=t1').get_json()['data']
+    # 任务信息保留配置时的原始写法，日志中的地址来自维度表
+    assert data['target_user'] == CHECKSUMMED
+    assert [log['target_user'] for log in data['logs']] == [CHECKSUMMED.lower()]
+    assert data['logs'][0]['asset'] == '123'
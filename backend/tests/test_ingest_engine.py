@@ -0,0 +1,194 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.services.ingest_engine import IngestEngine, Subscription, WalletPoller
+from app.services.poll_scheduler import PollScheduler
+from app.utils.dedup_util import HighWaterMark
+from tests.helpers import trade
+
+class FakeClient:
+    """按/activity的参数（start、offset、limit、倒序）返回内存中的交易"""
+
+    def __init__(self, trades=()):
+        self.trades = list(trades)
+        self.requests = []
+
+    async def fetch_latest_trades(self, params, priority=None):
+        self.requests.append(dict(params))
+        rows = sorted(
+            (it for it in self.trades if it['timestamp'] >= params.get('start', 0)),
+            key=lambda it: it['timestamp'], reverse=True
+        )
+        offset = params.get('offset', 0)
+        return rows[offset:offset + params['limit']]
+
+def timestamps(trades):
+    return [it['timestamp'] for it in trades]
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not met in time')
+        time.sleep(0.02)
+
+# ---------- Subscription ----------
+
+def test_subscription_filters_by_own_cursor():
+    subscription = Subscription('a', '0xw', 1, cursor=HighWaterMark.from_trades([trade(100, 1)]))
+    subscription.deliver([trade(100, 1), trade(101, 2)])
+    subscription.deliver([trade(101, 2)])
+    assert timestamps(subscription.get(0)) == [101]
+
+def test_subscription_without_cursor_starts_at_first_batch():
+    subscription = Subscription('a', '0xw', 1)
+    subscription.deliver([trade(100, 1)])
+    assert subscription.cursor.timestamp == 100
+    assert timestamps(subscription.get(0)) == [100]
+
+def test_get_merges_backlog():
+    subscription = Subscription('a', '0xw', 1)
+    subscription.deliver([trade(100, 1)])
+    subscription.deliver([trade(101, 2)])
+    assert timestamps(subscription.get(0)) == [100, 101]
+    assert subscription.get(0) == []
+
+def test_sink_receives_batches():
+    received = []
+    subscription = Subscription('a', '0xw', 1, sink=lambda sub, trades: received.append(timestamps(trades)))
+    subscription.deliver([trade(100, 1)])
+    assert received == [[100]]
+
+def test_hold_buffers_until_release_and_keeps_order():
+    subscription = Subscription('a', '0xw', 1, cursor=HighWaterMark(90, {}, lookback=0))
+    subscription.hold()
+    # 轮询器在补拉完成前分发的新交易
+    subscription.deliver([trade(120, 3)])
+    assert subscription.get(0) == []
+    # 补拉到的交易（与暂存的批次有重叠）先投递
+    subscription.release([trade(100, 1), trade(110, 2), trade(120, 3)])
+    assert timestamps(subscription.get(0)) == [100, 110, 120]
+
+def test_release_without_catch_up_trades_flushes_held_batches():
+    subscription = Subscription('a', '0xw', 1)
+    subscription.hold()
+    subscription.deliver([trade(100, 1)])
+    subscription.release()
+    assert timestamps(subscription.get(0)) == [100]
+
+# ---------- WalletPoller ----------
+
+def test_first_poll_only_sets_high_water_mark():
+    poller = WalletPoller('0xw')
+    client = FakeClient([trade(100, 1), trade(101, 2)])
+    assert asyncio.run(poller.poll_once(client)) == []
+    assert poller.cursor.timestamp == 101
+
+def test_poll_returns_new_trades_ascending():
+    poller = WalletPoller('0xw', HighWaterMark.from_trades([trade(100, 1)]))
+    client = FakeClient([trade(100, 1), trade(103, 3), trade(102, 2)])
+    assert timestamps(asyncio.run(poller.poll_once(client))) == [102, 103]
+    assert asyncio.run(poller.poll_once(client)) == []
+
+def test_poll_pages_through_bursts():
+    poller = WalletPoller('0xw', HighWaterMark.from_trades([trade(100, 1)]))
+    client = FakeClient([trade(100, 1)] + [trade(200 + i, 10 + i) for i in range(30)])
+    new = asyncio.run(poller.poll_once(client))
+    assert timestamps(new) == [200 + i for i in range(30)]
+    assert len(client.requests) > 1
+
+def test_quiet_poll_is_a_single_small_request():
+    poller = WalletPoller('0xw', HighWaterMark.from_trades([trade(100, 1)]))
+    client = FakeClient([trade(100, 1)] + [trade(50 - i, 50 + i) for i in range(20)])
+    assert asyncio.run(poller.poll_once(client)) == []
+    assert [request['limit'] for request in client.requests] == [8]
+
+def test_poll_stops_at_first_page_reaching_high_water_mark():
+    seen = [trade(99, 2), trade(100, 1)]
+    poller = WalletPoller('0xw', HighWaterMark.from_trades(seen))
+    # 第一页已翻到高水位之前，即使整页已满、窗口内还有更早的交易也不再翻页
+    client = FakeClient(seen + [trade(101 + i, 10 + i) for i in range(6)] + [trade(98 - i, 50 + i) for i in range(20)])
+    assert timestamps(asyncio.run(poller.poll_once(client))) == [101 + i for i in range(6)]
+    assert len(client.requests) == 1
+
+def test_poll_doubles_limit_while_pages_are_all_new():
+    poller = WalletPoller('0xw', HighWaterMark.from_trades([trade(100, 1)]))
+    client = FakeClient([trade(100, 1)] + [trade(200 + i, 10 + i) for i in range(30)])
+    asyncio.run(poller.poll_once(client))
+    assert [(request['offset'], request['limit']) for request in client.requests] == [(0, 8), (8, 16), (24, 32)]
+
+def test_fetch_since_does_not_move_poller_cursor():
+    poller = WalletPoller('0xw', HighWaterMark.from_trades([trade(120, 3)]))
+    client = FakeClient([trade(100, 1), trade(110, 2), trade(120, 3)])
+    cursor = HighWaterMark.from_trades([trade(100, 1)])
+    assert timestamps(asyncio.run(poller.fetch_since(client, cursor))) == [110, 120]
+    assert poller.cursor.timestamp == 120
+
+# ---------- IngestEngine ----------
+
+@pytest.fixture
+def engine():
+    engine = IngestEngine()
+    engine.start()
+    engine._client = FakeClient()
+    engine._scheduler = PollScheduler(min_seconds=0.02, max_seconds=0.05, jitter=0)
+    engine._scheduler.initial_delay = lambda base: 0
+    yield engine
+    for subscriber_id in list(engine._subscriber_wallets):
+        engine.unsubscribe(subscriber_id)
+
+def test_subscribers_of_one_wallet_share_a_poller(engine):
+    engine._client.trades = [trade(100, 1)]
+    first = engine.subscribe('0xAbC', 'a', 0.02)
+    second = engine.subscribe('0xabc', 'b', 0.02)
+    assert list(engine._pollers) == ['0xabc']
+    assert set(engine._pollers['0xabc'].subscriptions) == {'a', 'b'}
+    wait_for(lambda: engine._pollers['0xabc'].cursor is not None)
+
+    engine._client.trades.append(trade(101, 2))
+    wait_for(lambda: first._queue.qsize() and second._queue.qsize())
+    assert timestamps(first.get(0)) == [101]
+    assert timestamps(second.get(0)) == [101]
+    # 每个tick只请求一次，与订阅者数量无关
+    assert all(request['user'] == '0xabc' for request in engine._client.requests)
+
+def test_last_unsubscribe_stops_poller(engine):
+    engine.subscribe('0xabc', 'a', 0.02)
+    engine.subscribe('0xabc', 'b', 0.02)
+    engine.unsubscribe('a')
+    assert set(engine._pollers['0xabc'].subscriptions) == {'b'}
+    engine.unsubscribe('b')
+    wait_for(lambda: '0xabc' not in engine._pollers)
+
+def test_late_subscriber_catches_up_from_its_cursor(engine):
+    engine._client.trades = [trade(100 + i, i) for i in range(10)]
+    engine.subscribe('0xabc', 'a', 0.02)
+    wait_for(lambda: engine._pollers['0xabc'].cursor is not None)
+
+    cursor = HighWaterMark(lookback=0)
+    cursor.advance([trade(104, 4)])
+    late = engine.subscribe('0xabc', 'b', 0.02, cursor=cursor)
+    wait_for(lambda: late._queue.qsize())
+    assert timestamps(late.get(0.5)) == [105, 106, 107, 108, 109]
+
+def test_many_wallets_share_one_event_loop_thread(engine):
+    engine._client.trades = [trade(100, 1)]
+    threads = threading.active_count()
+    for i in range(200):
+        engine.subscribe(f"0x{i:040x}", f"task-{i}", 0.02)
+    wait_for(lambda: all(poller.polls for poller in list(engine._pollers.values())))
+    stats = engine.stats()
+    assert stats['wallets'] == 200
+    assert all(stats['pollers'][wallet]['subscribers'] == 1 for wallet in stats['pollers'])
+    # 所有钱包的轮询协程都在引擎已有的事件循环线程中运行，不为钱包创建线程
+    assert threading.active_count() == threads
+
+def test_stopped_task_releases_its_poller(engine, monkeypatch):
+    monkeypatch.setattr(engine, 'start', lambda app=None: None)
+    engine.subscribe('0xabc', 'task', 0.02, sink=lambda sub, trades: None)
+    engine._tasks['task'] = {'target_user': '0xabc'}
+    assert engine.has_task('task')
+    engine.stop_task('task')
+    assert not engine.has_task('task')
+    wait_for(lambda: '0xabc' not in engine._pollers)
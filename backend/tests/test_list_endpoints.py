@@ -0,0 +1,58 @@
+from datetime import datetime
+from types import SimpleNamespace
+from app.extensions import db
+from app.models import CopyTradeConfig, MonitorTask, User
+from app.services.activity_store import save_activity_records
+from app.services.copy_trade_stats import insert_copy_trade_records
+from app.services.dimensions import intern_copy_trade_rows
+from app.utils.projection_util import Projection, epoch
+from tests.helpers import trade
+
+def test_projection_converts_configured_columns_only(app):
+    projection = Projection([User.id, User.username, User.created_at], {'created_at': epoch})
+    db.session.add(User(username='u1', password='-', created_at=datetime(2024, 1, 1)))
+    db.session.commit()
+    rows = projection.fetch(projection.select())
+    assert projection.to_dicts(rows) == [{'id': 1, 'username': 'u1', 'created_at': 1704067200}]
+    # 冷数据归档中的记录按属性取值
+    archived = SimpleNamespace(id=2, username='u2', created_at=None)
+    assert projection.to_dicts([archived]) == [{'id': 2, 'username': 'u2', 'created_at': None}]
+
+def test_user_list_pages_plain_rows(api):
+    for i in range(3):
+        db.session.add(User(username=f"user{i}", password='-', created_at=datetime(2024, 1, 1)))
+    db.session.commit()
+    data = api.get('/api/v1/user-manage/list?page=2&per_page=2').get_json()['data']
+    assert (data['total'], data['pages']) == (3, 2)
+    assert [user['username'] for user in data['users']] == ['user0']
+    assert data['users'][0]['created_at'] == 1704067200
+    assert 'password' not in data['users'][0]
+
+def test_copy_trade_records_are_projected_with_dimensions(api):
+    db.session.add(CopyTradeConfig(user_id=1, task_id='t1', target_user='0xT', my_proxy_wallet='0xme', pk_encrypted='-'))
+    rows = [{
+        'task_id': 't1', 'target_user': '0xT', 'target_tx_hash': f"0x{n}", 'tx_hash': f"o{n}",
+        'amount': 1.0, 'price': 0.5, 'size': 2, 'side': 'BUY', 'token_id': '123',
+        'event_title': 'Event', 'event_slug': 'event', 'status': 'success',
+        'created_at': datetime(2024, 1, 1, 0, 0, n)
+    } for n in range(3)]
+    insert_copy_trade_records(intern_copy_trade_rows(rows))
+    db.session.commit()
+    records = api.get('/api/v1/copy-trade/records?limit=2').get_json()['data']['records']
+    assert [record['target_tx_hash'] for record in records] == ['0x2', '0x1']
+    assert records[0]['token_id'] == '123'
+    assert records[0]['event_slug'] == 'event'
+    assert records[0]['created_at'] == records[0]['timestamp'] == 1704067202
+
+def test_monitor_logs_page_through_with_cursor(api):
+    db.session.add(MonitorTask(task_id='t1', target_user='0xabc', status='stopped'))
+    save_activity_records([trade(100 + i, i + 1) for i in range(5)], '0xabc', 't1')
+    seen, cursor = [], None
+    while True:
+        data = api.get('/api/v1/monitor/logs', query_string={'task_id': 't1', 'limit': 2, 'cursor': cursor}).get_json()['data']
+        seen += [log['id'] for log in data['logs']]
+        cursor = data['next_cursor']
+        if not data['has_more']:
+            break
+    assert seen == [5, 4, 3, 2, 1]
+    assert isinstance(api.get('/api/v1/monitor/logs?task_id=t1').get_json()['data']['logs'][0]['created_at'], int)
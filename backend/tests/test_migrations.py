@@ -0,0 +1,38 @@
+from sqlalchemy import text
+from app.extensions import db
+from app.migrations import discover_migrations, migration_status, run_migrations
+from app.migrations.helpers import add_index, column_exists, index_exists
+from app.migrations.plan_check import check_query_plans
+
+def test_migrations_are_numbered_and_documented():
+    versions = [version for version, _, _ in discover_migrations()]
+    assert versions == sorted(set(versions))
+    assert all(module.__doc__ for _, _, module in discover_migrations())
+
+def test_migrations_are_safe_on_a_fresh_schema(app):
+    # create_all()新建的库上执行全部迁移，再次执行时不重复
+    applied = run_migrations(db.engine)
+    assert applied == [name for _, name, _ in discover_migrations()]
+    assert run_migrations(db.engine) == []
+    assert all(status['applied'] for status in migration_status(db.engine))
+
+def test_run_migrations_stops_at_target(app):
+    assert run_migrations(db.engine, target=2) == [name for version, name, _ in discover_migrations() if version <= 2]
+    assert [status['applied'] for status in migration_status(db.engine)][:3] == [True, True, False]
+
+def test_add_index_skips_existing_prefix(app):
+    with db.engine.connect() as conn:
+        assert index_exists(conn, 'activity_record', ['task_id', 'created_at'])
+        assert not add_index(conn, 'activity_record', 'ix_dup', ['task_id'])
+        assert add_index(conn, 'activity_record', 'ix_activity_record_side', ['side'])
+        assert index_exists(conn, 'activity_record', ['side'])
+        assert column_exists(conn, 'activity_record', 'side')
+
+def test_hot_queries_use_indexes(app):
+    with db.engine.connect() as conn:
+        assert check_query_plans(conn) == {}
+
+def test_plan_check_reports_full_scans(app):
+    with db.engine.connect() as conn:
+        conn.execute(text("DROP INDEX ix_copy_trade_config_user"))
+        assert check_query_plans(conn) == {'copy_trade_config_by_user': ['SCAN copy_trade_config']}
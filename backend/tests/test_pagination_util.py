@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+from app.extensions import db
+from app.models import ActivityRecord
+from app.utils.pagination_util import decode_cursor, encode_cursor, keyset_before, record_key
+
+BASE = datetime(2026, 1, 1)
+
+@pytest.fixture
+def records(app):
+    """7条记录，部分created_at相同（需要用id区分先后）"""
+    offsets = [0, 0, 1, 1, 1, 2, 3]
+    db.session.add_all([
+        ActivityRecord(task_id='t', wallet_id=1, timestamp=1000 + i, unique_key=bytes([i]) * 16, created_at=BASE + timedelta(seconds=s))
+        for i, s in enumerate(offsets)
+    ])
+    db.session.commit()
+    return db.session.execute(select(ActivityRecord.id, ActivityRecord.created_at)).all()
+
+def page(before, limit):
+    query = select(ActivityRecord.id, ActivityRecord.created_at).where(ActivityRecord.task_id == 't')
+    if before is not None:
+        query = query.where(keyset_before(ActivityRecord, before))
+    rows = db.session.execute(query.order_by(ActivityRecord.created_at.desc(), ActivityRecord.id.desc()).limit(limit + 1)).all()
+    return rows[:limit], (encode_cursor(*record_key(rows[limit - 1])) if len(rows) > limit else None)
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 1, 2, 3, 4, 5, 678000)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+def test_invalid_cursor_raises_value_error():
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+def test_keyset_pages_cover_all_records_once(records):
+    seen = []
+    cursor = None
+    while True:
+        rows, next_cursor = page(decode_cursor(cursor) if cursor else None, 3)
+        seen.extend(row.id for row in rows)
+        if next_cursor is None:
+            break
+        cursor = next_cursor
+    expected = [row.id for row in sorted(records, key=lambda row: (row.created_at, row.id), reverse=True)]
+    assert seen == expected
+
+def test_keyset_page_is_stable_when_newer_records_arrive(records):
+    first, cursor = page(None, 3)
+    db.session.add(ActivityRecord(task_id='t', wallet_id=1, timestamp=2000, unique_key=b'\xff' * 16, created_at=BASE + timedelta(seconds=10)))
+    db.session.commit()
+    second, _ = page(decode_cursor(cursor), 3)
+    assert not {row.id for row in first} & {row.id for row in second}
+    assert max(row.created_at for row in second) <= min(row.created_at for row in first)
+
+def test_since_id_returns_only_newer_records_in_id_order(records):
+    since_id = records[2].id
+    rows = db.session.execute(
+        select(ActivityRecord.id).where(ActivityRecord.task_id == 't', ActivityRecord.id > since_id)
+        .order_by(ActivityRecord.id.asc()).limit(3)
+    ).scalars().all()
+    assert rows == [since_id + 1, since_id + 2, since_id + 3]
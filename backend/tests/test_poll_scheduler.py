@@ -0,0 +1,37 @@
+from app.services.poll_scheduler import PollScheduler
+from app.utils.rate_limit import PRIORITY_COPY_TRADE, PRIORITY_MONITOR
+
+def scheduler():
+    return PollScheduler(min_seconds=1, max_seconds=30, backoff=2, jitter=0, max_multiple=4)
+
+def test_new_trades_drop_to_min_interval():
+    assert scheduler().next_interval(20, 5, new_count=3) == 1
+    # 订阅间隔小于最小间隔时按订阅间隔
+    assert scheduler().next_interval(20, 0.5, new_count=3) == 0.5
+
+def test_first_poll_uses_base_interval():
+    assert scheduler().next_interval(None, 5, new_count=0) == 5
+
+def test_idle_monitor_wallet_backs_off_up_to_ceiling():
+    s = scheduler()
+    intervals, current = [], 5
+    for _ in range(5):
+        current = s.next_interval(current, 5, new_count=0)
+        intervals.append(current)
+    assert intervals == [10, 20, 20, 20, 20]
+
+def test_ceiling_is_capped_by_max_seconds():
+    s = scheduler()
+    assert s.next_interval(25, 10, new_count=0) == 30
+    # 订阅间隔本身超过max_seconds时不放慢
+    assert s.next_interval(60, 60, new_count=0) == 60
+
+def test_copy_trade_wallet_never_backs_off():
+    s = scheduler()
+    assert s.next_interval(1, 1, new_count=0, priority=PRIORITY_COPY_TRADE) == 1
+    assert s.next_interval(1, 1, new_count=0, priority=PRIORITY_MONITOR) == 2
+
+def test_jitter_stays_within_ratio():
+    s = PollScheduler(jitter=0.1)
+    assert all(9 <= s.with_jitter(10) <= 11 for _ in range(100))
+    assert 0 <= s.initial_delay(5) <= 5
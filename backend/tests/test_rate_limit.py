@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from app.utils import rate_limit, redis_util
+from app.utils.rate_limit import PRIORITY_COPY_TRADE, PRIORITY_MONITOR, PRIORITY_QUERY, RateLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    """固定时间的进程内令牌桶（不使用Redis）"""
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock)
+    monkeypatch.setattr(redis_util, 'get_redis', lambda: None)
+    return clock
+
+def limiter(rate=10, capacity=10):
+    return RateLimiter(rate, capacity, reserves={PRIORITY_COPY_TRADE: 0, PRIORITY_MONITOR: 0.2, PRIORITY_QUERY: 0.5})
+
+def test_bucket_allows_burst_up_to_capacity(clock):
+    bucket = limiter()
+    assert all(bucket.try_acquire(PRIORITY_COPY_TRADE) for _ in range(10))
+    assert not bucket.try_acquire(PRIORITY_COPY_TRADE)
+
+def test_bucket_refills_at_rate(clock):
+    bucket = limiter()
+    for _ in range(10):
+        bucket.try_acquire(PRIORITY_COPY_TRADE)
+    clock.now += 0.25
+    assert bucket.try_acquire(PRIORITY_COPY_TRADE)
+    assert bucket.try_acquire(PRIORITY_COPY_TRADE)
+    assert not bucket.try_acquire(PRIORITY_COPY_TRADE)
+
+def test_lower_priorities_leave_reserve_for_copy_trade(clock):
+    bucket = limiter()
+    # 查询只能用到一半容量，监控只能用到80%
+    assert sum(bucket.try_acquire(PRIORITY_QUERY) for _ in range(10)) == 5
+    assert sum(bucket.try_acquire(PRIORITY_MONITOR) for _ in range(10)) == 3
+    assert sum(bucket.try_acquire(PRIORITY_COPY_TRADE) for _ in range(10)) == 2
+
+def test_wait_time_until_next_token(clock):
+    bucket = limiter()
+    for _ in range(10):
+        bucket.try_acquire(PRIORITY_COPY_TRADE)
+    assert bucket._try_acquire(PRIORITY_COPY_TRADE) == pytest.approx(0.1)
+    assert bucket._try_acquire(PRIORITY_QUERY) == pytest.approx(0.6)
+
+def test_pause_blocks_all_priorities(clock):
+    bucket = limiter()
+    bucket.pause(2)
+    assert not bucket.try_acquire(PRIORITY_COPY_TRADE)
+    assert bucket._try_acquire(PRIORITY_COPY_TRADE) == pytest.approx(2)
+    clock.now += 2
+    assert bucket.try_acquire(PRIORITY_COPY_TRADE)
+
+def test_zero_rate_is_unlimited(monkeypatch):
+    monkeypatch.setattr(redis_util, 'get_redis', lambda: None)
+    bucket = RateLimiter(0)
+    assert all(bucket.try_acquire(PRIORITY_QUERY) for _ in range(100))
+
+def test_acquire_async_waits_for_token(monkeypatch):
+    monkeypatch.setattr(redis_util, 'get_redis', lambda: None)
+    bucket = RateLimiter(100, 1)
+    assert asyncio.run(bucket.acquire_async(PRIORITY_COPY_TRADE)) == 0
+    assert asyncio.run(bucket.acquire_async(PRIORITY_COPY_TRADE)) > 0
+    assert bucket.stats()['waits'] == 1
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from app.utils import request_util
+from app.utils.request_util import AsyncRequestUtil, PolymarketAPIError, RequestUtil
+from app.utils.resilience_util import CircuitBreaker
+
+class FakeLimiter:
+    def acquire(self, priority):
+        pass
+
+    async def acquire_async(self, priority):
+        pass
+
+    def pause(self, seconds):
+        pass
+
+class FakeResponse:
+    def __init__(self, status_code, body='[]'):
+        self.status_code = status_code
+        self.text = body
+        self.headers = {}
+
+    def json(self):
+        return []
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    breaker = CircuitBreaker('test', failure_threshold=100)
+    monkeypatch.setattr(request_util, 'get_circuit_breaker', lambda: breaker)
+    monkeypatch.setattr(request_util, 'get_rate_limiter', lambda: FakeLimiter())
+    monkeypatch.setattr(request_util, 'backoff_delay', lambda attempt, retry_after=None: 0)
+
+def test_fetch_latest_trades_uses_base_url():
+    client = RequestUtil(base_url='http://data-api.test')
+    urls = []
+    client._send = lambda method, url, *args: urls.append(url) or FakeResponse(200)
+    assert client.fetch_latest_trades({'user': '0xw'}) == []
+    assert urls == ['http://data-api.test/activity']
+
+def test_explicit_retries_are_respected():
+    client = RequestUtil(base_url='http://data-api.test')
+    calls = []
+    client._send = lambda *args: calls.append(args) or FakeResponse(503, 'down')
+    with pytest.raises(PolymarketAPIError):
+        client.make_request('/activity', retries=1)
+    assert len(calls) == 1
+
+def test_async_fetch_latest_trades_uses_base_url():
+    client = AsyncRequestUtil(base_url='http://data-api.test')
+    client.session = object()
+    urls = []
+
+    async def get(url, params, timeout, priority):
+        urls.append(url)
+        return 200, {}, '[]'
+    client._get = get
+
+    assert asyncio.run(client.fetch_latest_trades({'user': '0xw'})) == []
+    assert urls == ['http://data-api.test/activity']
@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from app.utils import request_util, resilience_util
+from app.utils.resilience_util import CircuitBreaker
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience_util.time, 'monotonic', clock)
+    return clock
+
+def half_open_breaker(clock, **kwargs):
+    breaker = CircuitBreaker('test', failure_threshold=1, recovery_seconds=5, max_recovery_seconds=60, **kwargs)
+    breaker.record_failure()
+    clock.now += 5
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    return breaker
+
+def test_opens_after_threshold_and_half_opens_after_recovery(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, recovery_seconds=5)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock.now += 5
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+def test_half_open_admits_a_single_probe(clock):
+    breaker = half_open_breaker(clock)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+def test_failed_probe_doubles_recovery(clock):
+    breaker = half_open_breaker(clock)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_in() == 10
+
+def test_release_probe_lets_the_next_caller_probe(clock):
+    breaker = half_open_breaker(clock)
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+def test_release_probe_does_not_reopen_a_closed_breaker(clock):
+    breaker = CircuitBreaker('test')
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_stale_probe_times_out_back_to_open(clock):
+    breaker = half_open_breaker(clock, probe_timeout_seconds=30)
+    assert breaker.allow()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_in() == 10
+    clock.now += 10
+    assert breaker.allow()
+
+class FakeLimiter:
+    async def acquire_async(self, priority):
+        pass
+
+def test_cancelled_async_probe_is_released(clock, monkeypatch):
+    breaker = half_open_breaker(clock)
+    monkeypatch.setattr(request_util, 'get_circuit_breaker', lambda: breaker)
+    monkeypatch.setattr(request_util, 'get_rate_limiter', lambda: FakeLimiter())
+    client = request_util.AsyncRequestUtil()
+
+    async def hang(url, params, timeout, priority):
+        await asyncio.Event().wait()
+    client._get = hang
+
+    async def cancel_probe():
+        task = asyncio.ensure_future(client.make_request('http://data-api.test/activity', retries=1, timeout=1))
+        await asyncio.sleep(0)
+        assert breaker._probing
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+def test_async_probe_success_closes_the_breaker(clock, monkeypatch):
+    breaker = half_open_breaker(clock)
+    monkeypatch.setattr(request_util, 'get_circuit_breaker', lambda: breaker)
+    monkeypatch.setattr(request_util, 'get_rate_limiter', lambda: FakeLimiter())
+    client = request_util.AsyncRequestUtil()
+
+    async def ok(url, params, timeout, priority):
+        return 200, {}, '[]'
+    client._get = ok
+
+    assert asyncio.run(client.make_request('http://data-api.test/activity', retries=1, timeout=1)) == []
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,40 @@
+import sqlite3
+from sqlalchemy import create_engine, text
+from app.extensions import db
+from app.models import MonitorTask
+
+def test_new_connections_get_wal_pragmas(app):
+    with db.engine.connect() as conn:
+        assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        # NORMAL
+        assert conn.execute(text('PRAGMA synchronous')).scalar() == 1
+        assert conn.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+        assert conn.execute(text('PRAGMA temp_store')).scalar() == 2
+
+def test_pragmas_follow_config(app):
+    app.config.update(SQLITE_SYNCHRONOUS='FULL', SQLITE_BUSY_TIMEOUT_MS=100)
+    engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+    with engine.connect() as conn:
+        assert conn.execute(text('PRAGMA synchronous')).scalar() == 2
+        assert conn.execute(text('PRAGMA busy_timeout')).scalar() == 100
+    engine.dispose()
+
+def test_readers_are_not_blocked_by_an_open_write(app, tmp_path):
+    db.session.add(MonitorTask(task_id='t1', target_user='0x0'))
+    db.session.commit()
+    writer = sqlite3.connect(str(tmp_path / 'test.db'))
+    writer.execute("UPDATE monitor_task SET status = 'stopped'")
+    try:
+        # WAL下写事务未提交时读取旧版本，不等待写锁
+        db.session.remove()
+        assert MonitorTask.query.one().status == 'running'
+    finally:
+        writer.rollback()
+        writer.close()
+
+def test_endpoints_write_and_read_in_embedded_mode(api):
+    assert db.engine.dialect.name == 'sqlite'
+    response = api.post('/api/v1/user-manage/add', json={'username': 'alice', 'password': 'secret'})
+    assert response.get_json()['code'] == 200
+    users = api.get('/api/v1/user-manage/list').get_json()['data']['users']
+    assert [user['username'] for user in users] == ['alice']
@@ -0,0 +1,93 @@
+import os
+from app.services.trade_journal import TradeJournal
+from tests.helpers import crash
+
+def open_journal(base_dir, **kwargs):
+    # fsync线程在测试期间不运行，崩溃模拟关闭分段文件后不会再访问
+    return TradeJournal(str(base_dir), fsync_interval=3600, **kwargs)
+
+def copy_trade(i):
+    return 'copy_trade', {'task_id': 't', 'i': i}
+
+def read_all(journal):
+    ops, position = journal.read_batch(1000, 0)
+    return [op[1]['i'] for op in ops], position
+
+def test_reads_back_appended_ops_in_order(tmp_path):
+    journal = open_journal(tmp_path)
+    for i in range(5):
+        journal.append(copy_trade(i))
+    assert read_all(journal)[0] == [0, 1, 2, 3, 4]
+    assert journal.pending == 0
+
+def test_read_batch_respects_row_weight(tmp_path):
+    journal = open_journal(tmp_path)
+    for i in range(5):
+        journal.append(copy_trade(i))
+    ops, _ = journal.read_batch(2, 0)
+    assert len(ops) == 2
+    assert journal.pending == 3
+
+def test_replays_from_checkpoint_after_crash(tmp_path):
+    journal = open_journal(tmp_path)
+    for i in range(5):
+        journal.append(copy_trade(i))
+    ops, position = journal.read_batch(2, 0)
+    journal.commit(position)
+    # 读出但未提交检查点的记录在重启后重放
+    journal.read_batch(2, 0)
+    journal.sync()
+    crash(journal)
+
+    restarted = open_journal(tmp_path)
+    assert restarted.directory == journal.directory
+    assert read_all(restarted)[0] == [2, 3, 4]
+
+def test_commit_removes_written_segments(tmp_path):
+    journal = open_journal(tmp_path, segment_bytes=64)
+    for i in range(10):
+        journal.append(copy_trade(i))
+    assert len(journal._segments()) > 1
+    ids, position = read_all(journal)
+    assert ids == list(range(10))
+    journal.commit(position)
+    assert journal._segments() == [position[0]]
+
+def test_skips_corrupt_tail_of_sealed_segment(tmp_path):
+    journal = open_journal(tmp_path)
+    for i in range(3):
+        journal.append(copy_trade(i))
+    journal.sync()
+    crash(journal)
+    # 最后一条记录只写了一半
+    path = journal._segment_path(0)
+    os.truncate(path, os.path.getsize(path) - 3)
+
+    restarted = open_journal(tmp_path)
+    assert read_all(restarted)[0] == [0, 1]
+    assert restarted.stats()['corrupt_tails'] == 1
+
+def test_adopts_records_of_orphaned_slot(tmp_path):
+    live = open_journal(tmp_path)
+    orphan = open_journal(tmp_path)
+    for i in range(4):
+        orphan.append(copy_trade(i))
+    _, position = orphan.read_batch(1, 0)
+    orphan.commit(position)
+    orphan.sync()
+    crash(orphan)
+    # 进程数减少后没有进程再认领该槽位编号
+    os.rename(orphan.directory, os.path.join(tmp_path, 'slot-9'))
+
+    journal = open_journal(tmp_path)
+    assert journal.directory not in (live.directory, os.path.join(tmp_path, 'slot-9'))
+    assert journal.stats()['adopted'] == 3
+    assert read_all(journal)[0] == [1, 2, 3]
+    assert not [name for name in os.listdir(os.path.join(tmp_path, 'slot-9')) if name.endswith('.seg')]
+
+def test_does_not_adopt_live_slot(tmp_path):
+    live = open_journal(tmp_path)
+    live.append(copy_trade(0))
+    journal = open_journal(tmp_path)
+    assert journal.stats()['adopted'] == 0
+    assert read_all(live)[0] == [0]
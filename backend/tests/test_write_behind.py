@@ -0,0 +1,121 @@
+import json
+from sqlalchemy import func, select
+from app.extensions import db
+from app.models import ActivityRecord, CopyTradeRecord, CopyTradeStat, MonitorTask
+from app.services.trade_journal import TradeJournal
+from app.services.write_behind import WriteBehindWriter, activity_op, cursor_op
+from app.utils.dedup_util import HighWaterMark
+from tests.helpers import crash, reset_process_caches, trade
+
+def writer_with_journal(journal_dir, **kwargs):
+    """不启动后台线程的写入器，测试中手动收集和写入"""
+    writer = WriteBehindWriter(**kwargs)
+    writer._journal = TradeJournal(str(journal_dir), fsync_interval=3600)
+    return writer
+
+def copy_trade_row(n, status='success', **extra):
+    return dict({
+        'task_id': 'copy', 'target_user': '0xAbC', 'target_tx_hash': f"0x{n}", 'tx_hash': f"order-{n}",
+        'amount': 2.0, 'price': 0.5, 'size': 4, 'side': 'BUY', 'token_id': '123',
+        'event_title': 'Event', 'event_slug': 'event', 'status': status
+    }, **extra)
+
+def count(model):
+    return db.session.scalar(select(func.count()).select_from(model))
+
+def submit_all(writer, trades):
+    cursor = HighWaterMark.from_trades(trades)
+    writer.submit(activity_op(trades, '0xAbC', 'monitor'))
+    writer.submit(cursor_op(MonitorTask, 'monitor', cursor.to_columns()))
+    writer.submit(('copy_trade', copy_trade_row(1)))
+    writer.submit(('copy_trade', copy_trade_row(2, status='failed')))
+
+def test_flush_writes_all_op_kinds(app, tmp_path):
+    db.session.add(MonitorTask(task_id='monitor', target_user='0xAbC'))
+    db.session.commit()
+    writer = writer_with_journal(tmp_path)
+    submit_all(writer, [trade(100, 1), trade(101, 2)])
+
+    batch, position = writer._collect()
+    assert writer._flush_with_retry(batch, position)
+
+    assert count(ActivityRecord) == 2
+    assert count(CopyTradeRecord) == 2
+    task = MonitorTask.query.filter_by(task_id='monitor').first()
+    assert task.hwm_timestamp == 101
+    stat = db.session.get(CopyTradeStat, 'copy')
+    assert (stat.total_trades, stat.success_trades, stat.failed_trades, stat.volume) == (2, 1, 1, 2.0)
+
+def test_replay_after_crash_does_not_duplicate(app, tmp_path):
+    db.session.add(MonitorTask(task_id='monitor', target_user='0xAbC'))
+    db.session.commit()
+    writer = writer_with_journal(tmp_path)
+    submit_all(writer, [trade(100, 1), trade(101, 2)])
+
+    # 写库成功，但在记录检查点之前崩溃
+    batch, _ = writer._collect()
+    writer._flush(batch)
+    db.session.remove()
+    writer._journal.sync()
+    crash(writer._journal)
+    reset_process_caches()
+
+    restarted = writer_with_journal(tmp_path)
+    batch, position = restarted._collect()
+    assert len(batch) == 4
+    assert restarted._flush_with_retry(batch, position)
+
+    assert count(ActivityRecord) == 2
+    assert count(CopyTradeRecord) == 2
+    stat = db.session.get(CopyTradeStat, 'copy')
+    assert (stat.total_trades, stat.success_trades, stat.failed_trades, stat.volume) == (2, 1, 1, 2.0)
+    assert restarted.stats()['copy_trades_inserted'] == 0
+    # 检查点已推进，再次重启没有需要重放的记录
+    crash(restarted._journal)
+    assert writer_with_journal(tmp_path)._collect()[0] == []
+
+def test_poison_op_is_dead_lettered(app, tmp_path):
+    dead_letter = tmp_path / 'dead_letter.jsonl'
+    writer = writer_with_journal(tmp_path / 'journal', max_attempts=1, dead_letter_path=str(dead_letter))
+    writer.submit(('copy_trade', copy_trade_row(1)))
+    # 多余的列，重试不会成功
+    writer.submit(('copy_trade', copy_trade_row(2, unknown_column=1)))
+    writer.submit(('copy_trade', copy_trade_row(3)))
+
+    batch, position = writer._collect()
+    assert writer._flush_with_retry(batch, position)
+
+    assert count(CopyTradeRecord) == 2
+    assert writer.stats()['dead_letters'] == 1
+    records = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert [record['op']['row']['target_tx_hash'] for record in records] == ['0x2']
+    # 跳过坏数据后检查点推进
+    assert writer._collect()[0] == []
+
+def test_collect_does_not_mix_queue_and_journal_ops(tmp_path):
+    writer = writer_with_journal(tmp_path)
+    writer.submit(('copy_trade', copy_trade_row(1)))
+    # 日志追加失败时退回内存队列
+    writer._queue.put(('copy_trade', copy_trade_row(2)))
+    writer.submit(('copy_trade', copy_trade_row(3)))
+
+    batch, position = writer._collect()
+    assert [op[1]['target_tx_hash'] for op in batch] == ['0x1', '0x3']
+    assert position is not None
+    writer._journal.commit(position)
+
+    batch, position = writer._collect()
+    assert [op[1]['target_tx_hash'] for op in batch] == ['0x2']
+    assert position is None
+
+def test_replayed_journal_ops_are_written_before_queued_ops(tmp_path):
+    writer = writer_with_journal(tmp_path)
+    writer.submit(('copy_trade', copy_trade_row(1)))
+    writer._journal.sync()
+    crash(writer._journal)
+
+    restarted = writer_with_journal(tmp_path)
+    restarted._queue.put(('copy_trade', copy_trade_row(2)))
+    assert restarted._journal.pending == 0
+    assert [op[1]['target_tx_hash'] for op in restarted._collect()[0]] == ['0x1']
+    assert [op[1]['target_tx_hash'] for op in restarted._collect()[0]] == ['0x2']